@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Throughput of the Python auth server (core/scripts/hysteria2/auth_server.py)
+under bursts of concurrent handshakes, with the user index being refreshed
+in the background the way the live server does it.
+
+Two modes are measured:
+  handler - the /auth handler awaited directly, `--concurrency` at a time;
+            isolates the request path from HTTP parsing and sockets.
+  http    - real POST /auth requests over loopback, `--concurrency` in flight.
+
+The index is filled with synthetic users and never touches a database. To
+compare against an older auth server, check it out next to this one and
+point --tree at it (any version that keeps its index in `users_data`):
+
+    git worktree add /tmp/panel-old <ref>
+    python3 benchmarks/auth_handshakes.py --tree /tmp/panel-old
+    python3 benchmarks/auth_handshakes.py
+"""
+
+import sys
+import json
+import time
+import random
+import asyncio
+import inspect
+import argparse
+import datetime
+import platform
+import statistics
+from pathlib import Path
+from typing import Any, Dict, List
+
+from backend import ROOT_DIR, panel_version
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+MODES = ("handler", "http")
+
+
+class HandshakeRequest:
+    """The part of an aiohttp request the /auth handler reads."""
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    async def json(self):
+        return self._payload
+
+
+def load_auth_server(tree: Path):
+    # The tree's modules must win over this checkout's, so they go first on sys.path.
+    for path in (tree / "core", tree / "core" / "scripts", tree / "core" / "scripts" / "hysteria2"):
+        sys.path.insert(0, str(path))
+    import auth_server
+    return auth_server
+
+
+def build_index(users: int, seed: int = 42) -> Dict[str, Dict[str, Any]]:
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    index = {}
+    for i in range(users):
+        used = rng.randint(0, 50 * 1073741824)
+        index[f"bench_{i:07d}"] = {
+            "_id": f"bench_{i:07d}",
+            "password": f"{rng.getrandbits(128):032x}",
+            "blocked": rng.random() < 0.05,
+            "expiration_days": rng.choice([0, 30, 90]),
+            "account_creation_date": (today - datetime.timedelta(days=rng.randint(0, 60))).strftime("%Y-%m-%d"),
+            "max_download_bytes": rng.choice([0, 100 * 1073741824]),
+            "upload_bytes": used // 10,
+            "download_bytes": used - used // 10,
+        }
+    return index
+
+
+def build_payloads(index: Dict[str, Dict[str, Any]], count: int, seed: int = 7) -> List[Dict[str, str]]:
+    """Mostly valid credentials, with some wrong passwords and unknown users mixed in."""
+    rng = random.Random(seed)
+    names = list(index)
+    payloads = []
+    for _ in range(count):
+        username = rng.choice(names)
+        roll = rng.random()
+        if roll < 0.05:
+            payloads.append({"auth": f"{username}:wrong"})
+        elif roll < 0.08:
+            payloads.append({"auth": f"nobody_{rng.randint(0, 10**6)}:x"})
+        else:
+            payloads.append({"auth": f"{username}:{index[username]['password']}"})
+    return payloads
+
+
+async def swap(auth_server, index):
+    result = auth_server.swap_users(index)
+    if inspect.isawaitable(result):
+        await result
+
+
+async def keep_swapping(auth_server, index, interval: float):
+    """Publishes a fresh copy of the index every `interval` seconds, like the refresh loop."""
+    while True:
+        await asyncio.sleep(interval)
+        await swap(auth_server, dict(index))
+
+
+async def run_handler(auth_server, payloads, concurrency: int) -> None:
+    for start in range(0, len(payloads), concurrency):
+        batch = payloads[start:start + concurrency]
+        await asyncio.gather(*(auth_server.authenticate(HandshakeRequest(payload)) for payload in batch))
+
+
+async def run_http(auth_server, payloads, concurrency: int) -> None:
+    from aiohttp import ClientSession, TCPConnector, web
+
+    app = web.Application()
+    app.router.add_post("/auth", auth_server.authenticate)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    url = f"http://127.0.0.1:{port}/auth"
+
+    queue = iter(payloads)
+
+    async def client(session):
+        for payload in queue:
+            async with session.post(url, json=payload) as response:
+                await response.read()
+
+    try:
+        async with ClientSession(connector=TCPConnector(limit=concurrency)) as session:
+            await asyncio.gather(*(client(session) for _ in range(concurrency)))
+    finally:
+        await runner.cleanup()
+
+
+async def measure(auth_server, mode: str, index, payloads, concurrency: int, repeat: int,
+                  swap_interval: float) -> Dict[str, Any]:
+    run = run_handler if mode == "handler" else run_http
+    await swap(auth_server, dict(index))
+    await run(auth_server, payloads[:concurrency], concurrency)  # warm-up
+
+    timings = []
+    for _ in range(repeat):
+        swapper = asyncio.create_task(keep_swapping(auth_server, index, swap_interval))
+        started = time.perf_counter()
+        try:
+            await run(auth_server, payloads, concurrency)
+        finally:
+            timings.append(time.perf_counter() - started)
+            swapper.cancel()
+    rates = [len(payloads) / elapsed for elapsed in timings]
+    return {
+        "mode": mode,
+        "handshakes": len(payloads),
+        "concurrency": concurrency,
+        "runs": timings,
+        "median_handshakes_per_s": statistics.median(rates),
+        "min_handshakes_per_s": min(rates),
+        "max_handshakes_per_s": max(rates),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark auth server throughput under concurrent handshakes.")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--users", type=int, default=10000, help="Users in the index (default: 10000).")
+    parser.add_argument("--concurrency", type=int, default=1000, help="Handshakes in flight (default: 1000).")
+    parser.add_argument("--handshakes", type=int, default=20000, help="Handshakes per timed run (default: 20000).")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per mode (default: 5).")
+    parser.add_argument("--swap-ms", type=float, default=50.0,
+                        help="Interval between background index swaps (default: 50).")
+    parser.add_argument("--tree", type=Path, default=ROOT_DIR, help="Panel checkout to run (default: this one).")
+    parser.add_argument("--output", type=Path,
+                        help="Result file (default: benchmarks/results/auth_handshakes-<version>-<timestamp>.json).")
+    args = parser.parse_args()
+
+    tree = args.tree.resolve()
+    try:
+        version = (tree / "VERSION").read_text().strip()
+    except OSError:
+        version = panel_version()
+    auth_server = load_auth_server(tree)
+
+    index = build_index(args.users)
+    payloads = build_payloads(index, args.handshakes)
+    if hasattr(auth_server, "verdict"):
+        # Servers with a verdict table index precomputed verdicts, not raw records.
+        index = {username: auth_server.verdict(user) for username, user in index.items()}
+
+    results = []
+    for mode in args.modes:
+        result = asyncio.run(measure(auth_server, mode, index, payloads, args.concurrency, args.repeat,
+                                     args.swap_ms / 1000))
+        results.append(result)
+        print(f"{mode:<8} {result['handshakes']} handshakes, {result['concurrency']} concurrent  "
+              f"median {result['median_handshakes_per_s']:9.0f}/s  "
+              f"(min {result['min_handshakes_per_s']:.0f}/s, max {result['max_handshakes_per_s']:.0f}/s)")
+
+    report = {
+        "meta": {
+            "version": version,
+            "tree": str(tree),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "users": args.users,
+            "repeat": args.repeat,
+            "swap_ms": args.swap_ms,
+        },
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"auth_handshakes-{version}-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""
+Shared setup for the benchmark scripts: puts the panel's modules on sys.path
+and opens the database the scenarios run against.
+
+Three backends are supported:
+  mongo   - a local MongoDB (the same server the panel uses), in a separate
+            database so production data is never touched.
+  memory  - an in-process mongomock stand-in (`pip install mongomock`). Useful
+            for quick relative comparisons; absolute numbers are not
+            representative of a real MongoDB.
+  sqlite  - the panel's embedded SQLite backend, in a scratch file under
+            benchmarks/results/ that is recreated on every run.
+"""
+
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+CORE_DIR = ROOT_DIR / "core"
+
+for path in (CORE_DIR, CORE_DIR / "scripts", CORE_DIR / "scripts" / "hysteria2"):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
+
+BACKENDS = ("mongo", "memory", "sqlite")
+DEFAULT_DB_NAME = "asgaroth_bench"
+
+
+def _use_mongomock():
+    try:
+        import mongomock
+        import mongomock.collection
+    except ImportError:
+        sys.exit("The 'memory' backend needs mongomock: pip install mongomock")
+    import pymongo
+
+    # mongomock does not accept the `sort` argument pymongo 4.x passes to UpdateOne/ReplaceOne.
+    builder = mongomock.collection.BulkOperationBuilder
+    for name in ("add_update", "add_replace"):
+        original = getattr(builder, name)
+
+        def without_sort(self, *args, sort=None, _original=original, **kwargs):
+            return _original(self, *args, **kwargs)
+
+        setattr(builder, name, without_sort)
+    pymongo.MongoClient = mongomock.MongoClient
+
+
+def open_database(backend: str, db_name: str = DEFAULT_DB_NAME):
+    """Returns a storage backend bound to `db_name` on the chosen backend."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    if backend == "sqlite":
+        from db.sqlite_database import SQLiteDatabase
+        path = ROOT_DIR / "benchmarks" / "results" / f"{db_name}.sqlite"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        for stale in path.parent.glob(f"{path.name}*"):
+            stale.unlink()
+        return SQLiteDatabase(path)
+    if backend == "memory":
+        _use_mongomock()
+    from db.database import Database
+    return Database(db_name=db_name)
+
+
+def panel_version() -> str:
+    try:
+        return (ROOT_DIR / "VERSION").read_text().strip()
+    except OSError:
+        return "unknown"
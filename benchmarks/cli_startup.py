@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Cold-start cost of common cli.py commands and panel scripts: each command is
+run as a fresh interpreter, the way the webpanel, the Telegram bot and cron
+invoke them, and its wall time is recorded.
+
+    python3 benchmarks/cli_startup.py
+    python3 benchmarks/cli_startup.py --repeat 20 --commands show-version list-users
+
+To compare against an older release, check it out next to this one and point
+--tree at it; the results of both runs land in benchmarks/results/:
+
+    git worktree add /tmp/panel-old <ref>
+    python3 benchmarks/cli_startup.py --tree /tmp/panel-old
+
+Commands that shell out to /etc/hysteria may fail on a machine without an
+installed panel; the time to reach that point is still the startup cost.
+"""
+
+import sys
+import json
+import time
+import argparse
+import datetime
+import platform
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List
+
+from backend import ROOT_DIR, panel_version
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+COMMANDS = {
+    "help": ["core/cli.py", "--help"],
+    "show-version": ["core/cli.py", "show-version"],
+    "get-webpanel-url": ["core/cli.py", "get-webpanel-url"],
+    "import-cli_api": ["-c", "import sys; sys.path.insert(0, 'core'); import cli_api"],
+    "list-users": ["core/scripts/hysteria2/list_users.py"],
+    "get-user": ["core/scripts/hysteria2/get_user.py", "-u", "bench_0000000"],
+}
+
+
+def time_command(tree: Path, args: List[str], repeat: int, timeout: float) -> Dict[str, Any]:
+    timings: List[float] = []
+    returncode = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        try:
+            returncode = subprocess.run(
+                [sys.executable, *args], cwd=tree, stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL, timeout=timeout,
+            ).returncode
+        except subprocess.TimeoutExpired:
+            returncode = "timeout"
+        timings.append(time.perf_counter() - started)
+    return {
+        "runs": timings,
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "max": max(timings),
+        "returncode": returncode,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cold-start time of panel commands.")
+    parser.add_argument("--commands", nargs="+", choices=list(COMMANDS), default=list(COMMANDS))
+    parser.add_argument("--repeat", type=int, default=10, help="Runs per command (default: 10).")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-run timeout in seconds (default: 60).")
+    parser.add_argument("--tree", type=Path, default=ROOT_DIR, help="Panel checkout to run (default: this one).")
+    parser.add_argument("--output", type=Path, help="Result file (default: benchmarks/results/cli_startup-<version>-<timestamp>.json).")
+    args = parser.parse_args()
+
+    tree = args.tree.resolve()
+    try:
+        version = (tree / "VERSION").read_text().strip()
+    except OSError:
+        version = panel_version()
+
+    results = []
+    for name in args.commands:
+        result = {"command": name, **time_command(tree, COMMANDS[name], args.repeat, args.timeout)}
+        results.append(result)
+        print(f"{name:<18} median {result['median'] * 1000:8.1f}ms  "
+              f"(min {result['min'] * 1000:.1f}ms, max {result['max'] * 1000:.1f}ms, exit {result['returncode']})")
+
+    report = {
+        "meta": {
+            "version": version,
+            "tree": str(tree),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"cli_startup-{version}-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Fake Hysteria2 traffic stats API: /traffic, /online and /kick, backed by a
+synthetic user list. Every /traffic call reports fresh random deltas for the
+online users, and an optional per-request latency simulates a remote node.
+
+Standalone:
+    python3 benchmarks/fake_stats_server.py --users 100000 --port 25414 --latency-ms 20
+"""
+
+import asyncio
+import argparse
+import random
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from aiohttp import web
+
+DEFAULT_SECRET = "bench-secret"
+
+
+class FakeStatsServer:
+    def __init__(self, usernames: Iterable[str], online_ratio: float = 0.2, latency: float = 0.0,
+                 secret: str = DEFAULT_SECRET, host: str = "127.0.0.1", port: int = 0, seed: int = 42):
+        self.rng = random.Random(seed)
+        self.online: Dict[str, int] = {
+            username: self.rng.randint(1, 3) for username in usernames if self.rng.random() < online_ratio
+        }
+        self.latency = latency
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.requests = 0
+        self.kicked: List[str] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def _guard(self, request: web.Request):
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if request.headers.get("Authorization") != self.secret:
+            raise web.HTTPUnauthorized(text="invalid secret")
+
+    async def handle_traffic(self, request: web.Request) -> web.Response:
+        await self._guard(request)
+        rng = self.rng
+        return web.json_response({
+            username: {"tx": rng.randint(0, 5_000_000), "rx": rng.randint(0, 50_000_000)}
+            for username in self.online
+        })
+
+    async def handle_online(self, request: web.Request) -> web.Response:
+        await self._guard(request)
+        return web.json_response(self.online)
+
+    async def handle_kick(self, request: web.Request) -> web.Response:
+        await self._guard(request)
+        usernames = await request.json()
+        for username in usernames:
+            self.online.pop(username, None)
+        self.kicked.extend(usernames)
+        return web.Response()
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/traffic", self.handle_traffic)
+        app.router.add_get("/online", self.handle_online)
+        app.router.add_post("/kick", self.handle_kick)
+        return app
+
+    async def _start(self):
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+
+    def start(self) -> str:
+        """Starts the server on a background thread and returns its base URL."""
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._start())
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def stop(self):
+        if not self._loop:
+            return
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Hysteria2 traffic stats API.")
+    parser.add_argument("--users", type=int, default=10000, help="Number of synthetic users (bench_0000000...).")
+    parser.add_argument("--online-ratio", type=float, default=0.2)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Delay added to every request.")
+    parser.add_argument("--secret", default=DEFAULT_SECRET)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=25414)
+    args = parser.parse_args()
+
+    server = FakeStatsServer(
+        (f"bench_{i:07d}" for i in range(args.users)),
+        online_ratio=args.online_ratio,
+        latency=args.latency_ms / 1000,
+        secret=args.secret,
+        host=args.host,
+        port=args.port,
+    )
+    print(f"Fake stats API for {len(server.online)} online users on {server.base_url}")
+    web.run_app(server.make_app(), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
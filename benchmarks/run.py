@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Timed scenarios for the traffic/enforcement cycle against synthetic users and
+the fake stats API. Results are written as JSON so runs from different
+releases can be compared.
+
+    python3 benchmarks/run.py --users 10000 100000 500000 --backend mongo
+    python3 benchmarks/run.py --users 10000 --backend memory --scenarios traffic_cycle
+
+Every run re-populates the benchmark database first (untimed), so scenarios
+that block users always start from the same state.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import datetime
+import tempfile
+import statistics
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from backend import BACKENDS, DEFAULT_DB_NAME, open_database, panel_version
+from fake_stats_server import FakeStatsServer, DEFAULT_SECRET
+from synthetic_users import populate
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+class BenchmarkContext:
+    def __init__(self, database, users: int, online_ratio: float, latency: float, workdir: str):
+        self.database = database
+        self.users = users
+        self.online_ratio = online_ratio
+        self.latency = latency
+        self.workdir = workdir
+        self.config_file = os.path.join(workdir, "config.json")
+        with open(self.config_file, "w") as f:
+            json.dump({"trafficStats": {"secret": DEFAULT_SECRET}}, f)
+        self.server = None
+
+    def reset(self):
+        """Restores the synthetic dataset and starts a fresh fake stats API."""
+        self.stop_server()
+        populated = populate(self.database, self.users, self.online_ratio)
+        self.server = FakeStatsServer(
+            (u["_id"] for u in populated if u["online_count"]),
+            online_ratio=1.0,
+            latency=self.latency,
+        )
+        self.server.start()
+
+    def stop_server(self):
+        if self.server:
+            self.server.stop()
+            self.server = None
+
+    def traffic_manager(self):
+        import traffic
+
+        traffic.CONFIG_FILE = self.config_file
+        traffic.SPOOL_FILE = os.path.join(self.workdir, "traffic_spool.jsonl")
+        traffic.NODES_FILE = os.path.join(self.workdir, "nodes.json")
+        traffic.PRESENCE_FILE = os.path.join(self.workdir, "presence.json")
+        for suffix in ("", ".committed", ".seq"):
+            try:
+                os.unlink(traffic.SPOOL_FILE + suffix)
+            except FileNotFoundError:
+                pass
+        return traffic.TrafficManager(db_conn=self.database, api_base_url=self.server.base_url)
+
+
+def scenario_traffic_cycle(ctx: BenchmarkContext) -> Callable[[], Dict[str, Any]]:
+    manager = ctx.traffic_manager()
+
+    def run():
+        manager.process_and_update_traffic()
+        return dict(manager.last_cycle)
+    return run
+
+
+def scenario_kick_expired_users(ctx: BenchmarkContext) -> Callable[[], Dict[str, Any]]:
+    manager = ctx.traffic_manager()
+
+    def run():
+        manager.kick_expired_users()
+        return {"kicked": len(ctx.server.kicked)}
+    return run
+
+
+def scenario_kick_script(ctx: BenchmarkContext) -> Callable[[], Dict[str, Any]]:
+    import kick
+
+    kick.db = ctx.database
+    kick.CONFIG_FILE = ctx.config_file
+    kick.API_BASE_URL = ctx.server.base_url
+    kick.LOCKFILE = os.path.join(ctx.workdir, "kick.lock")
+
+    def run():
+        try:
+            kick.main()
+        except SystemExit as e:
+            if e.code:
+                raise RuntimeError(f"kick.py exited with status {e.code}")
+        return {"kicked": len(ctx.server.kicked)}
+    return run
+
+
+SCENARIOS = {
+    "traffic_cycle": scenario_traffic_cycle,
+    "kick_expired_users": scenario_kick_expired_users,
+    "kick_script": scenario_kick_script,
+}
+
+
+def measure(ctx: BenchmarkContext, name: str, repeat: int) -> Dict[str, Any]:
+    timings: List[float] = []
+    details: List[Dict[str, Any]] = []
+    for _ in range(repeat):
+        ctx.reset()
+        run = SCENARIOS[name](ctx)
+        started = time.perf_counter()
+        details.append(run())
+        timings.append(time.perf_counter() - started)
+    ctx.stop_server()
+    return {
+        "scenario": name,
+        "users": ctx.users,
+        "runs": timings,
+        "median": statistics.median(timings),
+        "min": min(timings),
+        "max": max(timings),
+        "details": details[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the traffic and enforcement cycle.")
+    parser.add_argument("--users", type=int, nargs="+", default=[10000], help="User counts to benchmark (default: 10000).")
+    parser.add_argument("--scenarios", nargs="+", choices=sorted(SCENARIOS), default=sorted(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per scenario and size (default: 3).")
+    parser.add_argument("--online-ratio", type=float, default=0.2, help="Share of active users that are online (default: 0.2).")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latency added by the fake stats API.")
+    parser.add_argument("--backend", choices=BACKENDS, default="mongo")
+    parser.add_argument("--db-name", default=DEFAULT_DB_NAME)
+    parser.add_argument("--output", type=Path, help="Result file (default: benchmarks/results/<version>-<timestamp>.json).")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    database = open_database(args.backend, args.db_name)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="asgaroth-bench-") as workdir:
+        for users in args.users:
+            ctx = BenchmarkContext(database, users, args.online_ratio, args.latency_ms / 1000, workdir)
+            for name in args.scenarios:
+                result = measure(ctx, name, args.repeat)
+                results.append(result)
+                print(f"{name:<20} {users:>8} users  median {result['median']:.3f}s  "
+                      f"(min {result['min']:.3f}s, max {result['max']:.3f}s)")
+
+    version = panel_version()
+    report = {
+        "meta": {
+            "version": version,
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "backend": args.backend,
+            "python": platform.python_version(),
+            "online_ratio": args.online_ratio,
+            "latency_ms": args.latency_ms,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    output = args.output or RESULTS_DIR / f"{version}-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
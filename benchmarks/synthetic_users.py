@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Fills a benchmark database with synthetic users shaped like a real panel:
+a mix of on-hold, active, expired, over-quota and blocked accounts, with a
+configurable share of them online.
+
+    python3 benchmarks/synthetic_users.py --users 100000 --backend mongo
+"""
+
+import argparse
+import datetime
+import random
+from typing import Any, Dict, List
+
+from backend import BACKENDS, DEFAULT_DB_NAME, open_database
+
+GB = 1073741824
+INSERT_CHUNK = 10000
+
+
+def generate_users(count: int, online_ratio: float = 0.2, seed: int = 42) -> List[Dict[str, Any]]:
+    # Imported here so the backend is chosen before db.database connects.
+    from db.database import compute_expires_at
+
+    rng = random.Random(seed)
+    today = datetime.date.today()
+    users = []
+    for i in range(count):
+        roll = rng.random()
+        user = {
+            "_id": f"bench_{i:07d}",
+            "password": f"{rng.getrandbits(128):032x}",
+            "max_download_bytes": rng.choice([0, 10 * GB, 50 * GB, 100 * GB]),
+            "expiration_days": rng.choice([0, 30, 30, 90]),
+            "blocked": False,
+            "unlimited_user": False,
+            "status": "On-hold",
+            "max_ips": 0,
+            "plan": "premium" if rng.random() < 0.25 else "standard",
+            "upload_bytes": 0,
+            "download_bytes": 0,
+            "total_bytes": 0,
+            "online_count": 0,
+        }
+        if roll >= 0.2:
+            # Activated accounts; roughly a third of the limited ones are past their expiry.
+            created = today - datetime.timedelta(days=rng.randint(0, 120))
+            user["account_creation_date"] = created.strftime("%Y-%m-%d")
+            user["expires_at"] = compute_expires_at(user["account_creation_date"], user["expiration_days"])
+            limit = user["max_download_bytes"] or 100 * GB
+            used = int(limit * rng.uniform(0.0, 1.1))
+            user["upload_bytes"] = used // 10
+            user["download_bytes"] = used - used // 10
+            user["total_bytes"] = used
+            user["status"] = "Offline"
+            if roll >= 0.9:
+                user["blocked"] = True
+            elif rng.random() < online_ratio:
+                user["status"] = "Online"
+                user["online_count"] = rng.randint(1, 3)
+        users.append(user)
+    return users
+
+
+def populate(database, count: int, online_ratio: float = 0.2, seed: int = 42) -> List[Dict[str, Any]]:
+    """Replaces the benchmark database's users with `count` synthetic ones and returns them."""
+    users = generate_users(count, online_ratio, seed)
+    if database.backend == "sqlite":
+        database.connection.executescript("DELETE FROM users; DELETE FROM traffic_history; DELETE FROM server_stats;")
+        database.cache.clear()
+        for start in range(0, len(users), INSERT_CHUNK):
+            database.put_users([dict(u) for u in users[start:start + INSERT_CHUNK]])
+    else:
+        database.collection.drop()
+        database.traffic_history.drop()
+        database.server_stats.drop()
+        for start in range(0, len(users), INSERT_CHUNK):
+            database.collection.insert_many([dict(u) for u in users[start:start + INSERT_CHUNK]], ordered=False)
+    database.ensure_user_indexes()
+    database.ensure_traffic_history_indexes()
+    database.rebuild_server_stats()
+    return users
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic panel users for benchmarking.")
+    parser.add_argument("--users", type=int, default=10000, help="Number of users to generate (default: 10000).")
+    parser.add_argument("--online-ratio", type=float, default=0.2, help="Share of active users that are online (default: 0.2).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--backend", choices=BACKENDS, default="mongo")
+    parser.add_argument("--db-name", default=DEFAULT_DB_NAME, help=f"Database to fill (default: {DEFAULT_DB_NAME}).")
+    args = parser.parse_args()
+
+    database = open_database(args.backend, args.db_name)
+    users = populate(database, args.users, args.online_ratio, args.seed)
+    online = sum(1 for u in users if u["online_count"])
+    print(f"Inserted {len(users)} users ({online} online) into '{args.db_name}'.")
+
+
+if __name__ == "__main__":
+    main()
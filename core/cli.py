@@ -170,7 +170,7 @@ def bulk_user_add(traffic_gb: float, expiration_days: int, count: int, prefix: s
 def edit_user(username: str, new_username: str, new_password: str, new_traffic_limit: int, new_expiration_days: int, renew_password: bool, renew_creation_date: bool, blocked: bool | None, unlimited_ip: bool | None, note: str | None):
     try:
         cli_api.kick_users_by_name(username)
-        cli_api.traffic_status(display_output=False)
+        cli_api.flush_traffic()
         cli_api.edit_user(
             username=username, 
             new_username=new_username, 
@@ -209,7 +209,7 @@ def remove_user(usernames: tuple[str]):
     try:
         usernames_list = list(usernames)
         cli_api.kick_users_by_name(usernames_list)
-        cli_api.traffic_status(display_output=False)
+        cli_api.flush_traffic()
         cli_api.remove_users(usernames_list)
         click.echo(f"Пользователи '{', '.join(usernames)}' успешно удалены.")
     except Exception as e:
@@ -261,6 +261,40 @@ def show_user_uri_json(usernames: list[str]):
     except Exception as e:
         click.echo(f'{e}', err=True)
 
+
+@cli.command('archive-users')
+@click.option('--days', '-d', required=False, help='Archive users blocked or expired for more than this many days', type=int)
+def archive_users(days: int | None):
+    """Moves long-blocked and long-expired users to the archive."""
+    try:
+        if res := cli_api.archive_users(days):
+            click.echo(res)
+    except Exception as e:
+        click.echo(f'{e}', err=True)
+
+
+@cli.command('restore-user')
+@click.argument('usernames', nargs=-1, required=True)
+def restore_user(usernames: tuple[str]):
+    """Moves one or more archived users back to the user list."""
+    try:
+        if res := cli_api.restore_archived_users(list(usernames)):
+            click.echo(res)
+    except Exception as e:
+        click.echo(f'{e}', err=True)
+
+
+@cli.command('list-archived-users')
+def list_archived_users():
+    try:
+        res = cli_api.list_archived_users()
+        if res:
+            pretty_print(res)
+        else:
+            click.echo('Архив пуст.')
+    except Exception as e:
+        click.echo(f'{e}', err=True)
+
 # endregion
 
 # region Server
@@ -275,6 +309,26 @@ def traffic_status(no_gui):
         click.echo(f'{e}', err=True)
 
 
+@cli.command('user-traffic')
+@click.option('--username', '-u', required=True, help='Username to show traffic history for', type=str)
+@click.option('--days', '-d', default=7, help='Number of days to include (default: 7)', type=int)
+def user_traffic(username: str, days: int):
+    try:
+        pretty_print(cli_api.get_user_traffic_history(username, days))
+    except Exception as e:
+        click.echo(f'{e}', err=True)
+
+
+@cli.command('top-talkers')
+@click.option('--limit', '-n', default=10, help='Number of users to show (default: 10)', type=int)
+@click.option('--window', '-w', default=None, help='Average over the last N seconds (default: whole buffer)', type=float)
+def top_talkers(limit: int, window: float | None):
+    try:
+        pretty_print(cli_api.get_top_talkers(limit, window))
+    except Exception as e:
+        click.echo(f'{e}', err=True)
+
+
 @cli.command('server-info')
 def server_info():
     try:
@@ -359,7 +413,9 @@ def node():
     show_default=True,
     help='Node type (standard or premium).'
 )
-def add_node(name, ip, port, sni, pinsha256, obfs, insecure, node_type):
+@click.option('--stats-url', required=False, type=str, help="Optional: Base URL of the node's traffic stats API.")
+@click.option('--stats-secret', required=False, type=str, help="Optional: Secret of the node's traffic stats API.")
+def add_node(name, ip, port, sni, pinsha256, obfs, insecure, node_type, stats_url, stats_secret):
     """Add a new external node."""
     try:
         output = cli_api.add_node(
@@ -371,6 +427,8 @@ def add_node(name, ip, port, sni, pinsha256, obfs, insecure, node_type):
             obfs=obfs,
             insecure=insecure,
             node_type=node_type,   # <<< ВАЖНО
+            stats_url=stats_url,
+            stats_secret=stats_secret,
         )
         click.echo(output.strip())
     except Exception as e:
@@ -1,4 +1,5 @@
 import os
+import sys
 import subprocess
 from enum import Enum
 from datetime import datetime
@@ -6,10 +7,10 @@ import json
 from typing import Any, Optional
 from dotenv import dotenv_values
 
-import traffic
-
 DEBUG = False
 SCRIPT_DIR = '/etc/hysteria/core/scripts'
+# Shared helper modules (collector_client, db, paths) live next to the scripts.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
 CONFIG_FILE = '/etc/hysteria/config.json'
 CONFIG_ENV_FILE = '/etc/hysteria/.configs.env'
 WEBPANEL_ENV_FILE = '/etc/hysteria/core/scripts/webpanel/.env'
@@ -32,6 +33,7 @@ class Command(Enum):
     EDIT_USER = os.path.join(SCRIPT_DIR, 'hysteria2', 'edit_user.py')
     RESET_USER = os.path.join(SCRIPT_DIR, 'hysteria2', 'reset_user.py')
     REMOVE_USER = os.path.join(SCRIPT_DIR, 'hysteria2', 'remove_user.py')
+    ARCHIVE_USERS = os.path.join(SCRIPT_DIR, 'hysteria2', 'archive_users.py')
     SHOW_USER_URI = os.path.join(SCRIPT_DIR, 'hysteria2', 'show_user_uri.py')
     WRAPPER_URI = os.path.join(SCRIPT_DIR, 'hysteria2', 'wrapper_uri.py')
     IP_ADD = os.path.join(SCRIPT_DIR, 'hysteria2', 'ip.py')
@@ -118,6 +120,14 @@ def run_cmd(command: list[str]) -> str:
         raise CommandExecutionError(f"OS error while trying to run command '{' '.join(command)}': {e}")
 
 
+def config_changed(section: str):
+    '''
+    Tells running services (normalsub, the webpanel, the auth server) that part of the panel configuration changed.
+    '''
+    from db import events
+    events.publish(events.CONFIG_CHANGED, section=section)
+
+
 def generate_password() -> str:
     '''
     Generates a random password using pwgen for user.
@@ -177,6 +187,7 @@ def change_hysteria2_port(port: int):
     Changes the port for Hysteria2.
     '''
     run_cmd(['python3', Command.CHANGE_PORT_HYSTERIA2.value, str(port)])
+    config_changed('hysteria2')
 
 
 def get_hysteria2_sni() -> str | None:
@@ -192,6 +203,7 @@ def change_hysteria2_sni(sni: str):
     Changes the SNI for Hysteria2.
     '''
     run_cmd(['python3', Command.CHANGE_SNI_HYSTERIA2.value, sni])
+    config_changed('sni')
 
 
 def backup_hysteria2():
@@ -208,6 +220,7 @@ def restore_hysteria2(backup_file_path: str):
     '''Restores Hysteria configuration from the given backup file.'''
     try:
         run_cmd(['python3', Command.RESTORE_HYSTERIA2.value, backup_file_path])
+        config_changed('restore')
     except subprocess.CalledProcessError as e:
         raise Exception(f"Restore failed: {e}")
     except Exception as ex:
@@ -217,11 +230,13 @@ def restore_hysteria2(backup_file_path: str):
 def enable_hysteria2_obfs():
     '''Generates 'obfs' in Hysteria2 configuration.'''
     run_cmd(['python3', Command.MANAGE_OBFS.value, '--generate'])
+    config_changed('hysteria2')
 
 
 def disable_hysteria2_obfs():
     '''Removes 'obfs' from Hysteria2 configuration.'''
     run_cmd(['python3', Command.MANAGE_OBFS.value, '--remove'])
+    config_changed('hysteria2')
 
 
 def check_hysteria2_obfs():
@@ -233,11 +248,13 @@ def check_hysteria2_obfs():
 def enable_hysteria2_masquerade(domain: str):
     '''Enables masquerade for Hysteria2.'''
     run_cmd(['python3', Command.MASQUERADE_SCRIPT.value, '1', domain])
+    config_changed('hysteria2')
 
 
 def disable_hysteria2_masquerade():
     '''Disables masquerade for Hysteria2.'''
     run_cmd(['python3', Command.MASQUERADE_SCRIPT.value, '2'])
+    config_changed('hysteria2')
 
 
 def get_hysteria2_config_file() -> dict[str, Any]:
@@ -250,6 +267,7 @@ def set_hysteria2_config_file(data: dict[str, Any]):
 
     with open(CONFIG_FILE, 'w') as f:
         f.write(content)
+    config_changed('hysteria2')
 # endregion
 
 # region User
@@ -429,6 +447,35 @@ def remove_users(usernames: list[str]):
     run_cmd(['python3', Command.REMOVE_USER.value, *usernames])
 
 
+def archive_users(days: int | None = None) -> str | None:
+    '''
+    Moves users blocked or expired for more than `days` (USER_ARCHIVE_AFTER_DAYS by default) to the archive.
+    '''
+    command = ['python3', Command.ARCHIVE_USERS.value, 'archive']
+    if days is not None:
+        if days < 1:
+            raise InvalidInputError('Error: days must be a positive number.')
+        command.extend(['--days', str(days)])
+    return run_cmd(command)
+
+
+def restore_archived_users(usernames: list[str]) -> str | None:
+    '''
+    Moves archived users back to the live user list (still blocked).
+    '''
+    if not usernames:
+        raise InvalidInputError('Username(s) must be provided to restore.')
+    return run_cmd(['python3', Command.ARCHIVE_USERS.value, 'restore', *usernames])
+
+
+def list_archived_users() -> list[dict[str, Any]] | None:
+    '''
+    Lists archived users.
+    '''
+    if res := run_cmd(['python3', Command.ARCHIVE_USERS.value, 'list']):
+        return json.loads(res)
+
+
 def kick_users_by_name(usernames: list[str]):
     '''Kicks one or more users by username.'''
     if not usernames:
@@ -488,6 +535,9 @@ def show_user_uri_json(usernames: list[str]) -> list[dict[str, Any]] | None:
 
 
 def traffic_status(no_gui=False, display_output=True):
+    # Imported here: traffic pulls in pymongo and aiohttp, which most commands never need.
+    import traffic
+
     if no_gui:
         data = traffic.traffic_status(no_gui=True)
         traffic.kick_expired_users()
@@ -497,6 +547,46 @@ def traffic_status(no_gui=False, display_output=True):
     return data
 
 
+def flush_traffic() -> dict[str, Any] | None:
+    '''
+    Asks the resident traffic collector to run a cycle now.
+    Falls back to an in-process traffic update when the collector is not running.
+    '''
+    import collector_client
+
+    try:
+        return collector_client.request_flush()
+    except collector_client.CollectorUnavailableError:
+        import traffic
+        traffic.traffic_status(no_gui=True)
+        return None
+
+
+def get_top_talkers(limit: int = 10, window: float | None = None) -> list[dict[str, Any]]:
+    '''
+    Returns the users currently using the most bandwidth (bytes per second),
+    averaged over the last `window` seconds of collector polls.
+    '''
+    import collector_client
+
+    if limit < 1:
+        raise InvalidInputError('Error: limit must be a positive number.')
+    if window is not None and window <= 0:
+        raise InvalidInputError('Error: window must be a positive number of seconds.')
+    try:
+        return collector_client.top_talkers(limit, window)
+    except collector_client.CollectorUnavailableError as e:
+        raise CommandExecutionError(f'Live bandwidth is only available while the traffic collector is running: {e}')
+
+
+def get_user_traffic_history(username: str, days: int = 7) -> dict[str, Any]:
+    '''Returns per-day/per-hour usage of a user from the traffic history buckets.'''
+    if days < 1:
+        raise InvalidInputError('Error: days must be a positive number.')
+    import traffic
+    return traffic.get_traffic_history(username, days)
+
+
 # Next Update:
 # TODO: it's better to return json
 # TODO: After json todo need fix Telegram Bot and WebPanel
@@ -519,6 +609,7 @@ def add_ip_address():
     Adds IP addresses from the environment to the .configs.env file.
     '''
     run_cmd(['python3', Command.IP_ADD.value, 'add'])
+    config_changed('ip')
 
 
 def edit_ip_address(ipv4: str, ipv6: str):
@@ -536,6 +627,7 @@ def edit_ip_address(ipv4: str, ipv6: str):
         run_cmd(['python3', Command.IP_ADD.value, 'edit', '-4', ipv4])
     if ipv6:
         run_cmd(['python3', Command.IP_ADD.value, 'edit', '-6', ipv6])
+    config_changed('ip')
 
 
 def add_node(
@@ -547,6 +639,8 @@ def add_node(
     obfs: Optional[str] = None,
     insecure: Optional[bool] = None,
     node_type: Optional[str] = None,
+    stats_url: Optional[str] = None,
+    stats_secret: Optional[str] = None,
 ):
     """
     Adds a new external node.
@@ -573,15 +667,23 @@ def add_node(
         command.append('--insecure')
     if node_type:
         command.extend(['--type', node_type])
+    if stats_url:
+        command.extend(['--stats-url', stats_url])
+    if stats_secret:
+        command.extend(['--stats-secret', stats_secret])
 
-    return run_cmd(command)
+    result = run_cmd(command)
+    config_changed('nodes')
+    return result
 
 
 def delete_node(name: str):
     """
     Deletes an external node by name.
     """
-    return run_cmd(['python3', Command.NODE_MANAGER.value, 'delete', '--name', name])
+    result = run_cmd(['python3', Command.NODE_MANAGER.value, 'delete', '--name', name])
+    config_changed('nodes')
+    return result
 
 
 def list_nodes():
@@ -631,12 +733,16 @@ def add_extra_config(name: str, uri: str, plan: str = "standard") -> str:
         '--uri', uri,
         '--plan', plan_norm,
     ]
-    return run_cmd(cmd)
+    result = run_cmd(cmd)
+    config_changed('extra')
+    return result
 
 
 def delete_extra_config(name: str) -> str:
     """Deletes an extra proxy configuration."""
-    return run_cmd(['python3', Command.EXTRA_CONFIG_SCRIPT.value, 'delete', '--name', name])
+    result = run_cmd(['python3', Command.EXTRA_CONFIG_SCRIPT.value, 'delete', '--name', name])
+    config_changed('extra')
+    return result
 
 
 def list_extra_configs() -> str:
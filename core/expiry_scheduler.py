@@ -0,0 +1,87 @@
+import heapq
+import asyncio
+import datetime
+import logging
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("ExpiryScheduler")
+
+
+class ExpiryScheduler:
+    '''
+    Timer heap of user expiry instants, so an account is blocked the moment
+    its paid period ends instead of on the next enforcement scan.
+
+    The heap is rebuilt from the DB at startup and updated per user when an
+    account is edited or activated. Superseded heap entries are not removed;
+    they are skipped when popped because they no longer match the current
+    instant recorded for the user.
+    '''
+
+    def __init__(self, on_expire: Callable[[str], Awaitable[None]]):
+        self.on_expire = on_expire
+        self._heap: List[Tuple[float, str]] = []
+        self._due: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def rebuild(self, schedule: List[Tuple[str, datetime.datetime]]):
+        with self._lock:
+            self._due = {username: expires_at.timestamp() for username, expires_at in schedule}
+            self._heap = [(due, username) for username, due in self._due.items()]
+            heapq.heapify(self._heap)
+        self._wake()
+
+    def update(self, username: str, expires_at: Optional[datetime.datetime]):
+        """Sets or clears a user's expiry instant. Safe to call from any thread."""
+        with self._lock:
+            if expires_at is None:
+                self._due.pop(username, None)
+            else:
+                due = expires_at.timestamp()
+                if self._due.get(username) == due:
+                    return
+                self._due[username] = due
+                heapq.heappush(self._heap, (due, username))
+        self._wake()
+
+    def _wake(self):
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _pop_due(self, now: float) -> Tuple[List[str], Optional[float]]:
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due, username = heapq.heappop(self._heap)
+                if self._due.get(username) == due:
+                    del self._due[username]
+                    expired.append(username)
+            next_due = self._heap[0][0] if self._heap else None
+        return expired, next_due
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        while True:
+            # Cleared before popping so an update racing with this pass still wakes us.
+            self._wakeup.clear()
+            expired, next_due = self._pop_due(datetime.datetime.now().timestamp())
+            for username in expired:
+                try:
+                    await self.on_expire(username)
+                except Exception:
+                    logger.exception(f"Failed to expire user {username}")
+            if expired:
+                continue
+
+            timeout = None if next_due is None else max(next_due - datetime.datetime.now().timestamp(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
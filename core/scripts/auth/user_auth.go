@@ -23,16 +23,55 @@ const (
 	collectionName = "users"
 )
 
+// User holds the fields a handshake is judged on. ExpiresAt and TotalBytes are
+// maintained by the panel on every write, so no date is parsed per request.
+// Records written before those fields existed (e.g. restored from an old
+// backup and not yet migrated) fall back to the raw fields they derive from.
 type User struct {
-	ID                  string `bson:"_id"`
-	Password            string `bson:"password"`
-	MaxDownloadBytes    int64  `bson:"max_download_bytes"`
-	ExpirationDays      int    `bson:"expiration_days"`
-	AccountCreationDate string `bson:"account_creation_date"`
-	Blocked             bool   `bson:"blocked"`
-	UploadBytes         int64  `bson:"upload_bytes"`
-	DownloadBytes       int64  `bson:"download_bytes"`
-	UnlimitedUser       bool   `bson:"unlimited_user"`
+	ID                  string    `bson:"_id"`
+	Password            string    `bson:"password"`
+	MaxDownloadBytes    int64     `bson:"max_download_bytes"`
+	ExpiresAt           time.Time `bson:"expires_at"`
+	TotalBytes          *int64    `bson:"total_bytes"`
+	ExpirationDays      int       `bson:"expiration_days"`
+	AccountCreationDate string    `bson:"account_creation_date"`
+	UploadBytes         int64     `bson:"upload_bytes"`
+	DownloadBytes       int64     `bson:"download_bytes"`
+	Blocked             bool      `bson:"blocked"`
+	UnlimitedUser       bool      `bson:"unlimited_user"`
+}
+
+var userProjection = bson.M{
+	"password":              1,
+	"max_download_bytes":    1,
+	"expires_at":            1,
+	"total_bytes":           1,
+	"expiration_days":       1,
+	"account_creation_date": 1,
+	"upload_bytes":          1,
+	"download_bytes":        1,
+	"blocked":               1,
+	"unlimited_user":        1,
+}
+
+// expired reports whether the account's term has run out; the zero time means it never does.
+func (u *User) expired(now time.Time) bool {
+	expiresAt := u.ExpiresAt
+	if expiresAt.IsZero() && u.ExpirationDays > 0 {
+		creationDate, err := time.Parse("2006-01-02", u.AccountCreationDate)
+		if err != nil {
+			return false
+		}
+		expiresAt = creationDate.AddDate(0, 0, u.ExpirationDays)
+	}
+	return !expiresAt.IsZero() && now.After(expiresAt)
+}
+
+func (u *User) usedBytes() int64 {
+	if u.TotalBytes != nil {
+		return *u.TotalBytes
+	}
+	return u.UploadBytes + u.DownloadBytes
 }
 
 type httpAuthRequest struct {
@@ -70,7 +109,7 @@ func authHandler(w http.ResponseWriter, r *http.Request) {
 	ctx, cancel := context.WithTimeout(context.Background(), 5*time.Second)
 	defer cancel()
 
-	err := userCollection.FindOne(ctx, bson.M{"_id": username}).Decode(&user)
+	err := userCollection.FindOne(ctx, bson.M{"_id": username}, options.FindOne().SetProjection(userProjection)).Decode(&user)
 	if err != nil {
 		json.NewEncoder(w).Encode(httpAuthResponse{OK: false})
 		return
@@ -93,15 +132,12 @@ func authHandler(w http.ResponseWriter, r *http.Request) {
 		return
 	}
 
-	if user.ExpirationDays > 0 {
-		creationDate, err := time.Parse("2006-01-02", user.AccountCreationDate)
-		if err == nil && time.Now().After(creationDate.AddDate(0, 0, user.ExpirationDays)) {
-			json.NewEncoder(w).Encode(httpAuthResponse{OK: false})
-			return
-		}
+	if user.expired(time.Now()) {
+		json.NewEncoder(w).Encode(httpAuthResponse{OK: false})
+		return
 	}
 
-	if user.MaxDownloadBytes > 0 && (user.DownloadBytes+user.UploadBytes) >= user.MaxDownloadBytes {
+	if user.MaxDownloadBytes > 0 && user.usedBytes() >= user.MaxDownloadBytes {
 		json.NewEncoder(w).Encode(httpAuthResponse{OK: false})
 		return
 	}
@@ -0,0 +1,71 @@
+import json
+import socket
+from typing import Any
+
+from paths import COLLECTOR_SOCKET
+
+
+class CollectorUnavailableError(Exception):
+    '''Raised when the traffic collector socket cannot be reached.'''
+    pass
+
+
+class CollectorCommandError(Exception):
+    '''Raised when the traffic collector rejects or fails a command.'''
+    pass
+
+
+def send_command(command: str, timeout: float = 30.0, **params: Any) -> Any:
+    '''
+    Sends one JSON command to the resident traffic collector and returns its result.
+    '''
+    payload = dict(params, command=command)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(COLLECTOR_SOCKET))
+        except OSError as e:
+            raise CollectorUnavailableError(f"Traffic collector is not reachable at {COLLECTOR_SOCKET}: {e}")
+
+        sock.sendall(json.dumps(payload).encode() + b"\n")
+        with sock.makefile('rb') as stream:
+            line = stream.readline()
+
+    if not line:
+        raise CollectorCommandError(f"Traffic collector closed the connection without answering '{command}'.")
+
+    response = json.loads(line)
+    if not response.get('ok'):
+        raise CollectorCommandError(response.get('error') or f"Command '{command}' failed.")
+    return response.get('result')
+
+
+def is_running(timeout: float = 1.0) -> bool:
+    try:
+        send_command('ping', timeout=timeout)
+        return True
+    except (CollectorUnavailableError, CollectorCommandError, OSError, ValueError):
+        return False
+
+
+def request_flush(timeout: float = 30.0) -> dict[str, Any]:
+    '''Asks the collector to run a traffic cycle now and returns its cycle report.'''
+    return send_command('flush', timeout=timeout)
+
+
+def top_talkers(limit: int = 10, window: float | None = None, timeout: float = 5.0) -> list[dict[str, Any]]:
+    '''Returns the users with the highest recent bandwidth, as measured by the collector.'''
+    return send_command('top', timeout=timeout, limit=limit, window=window)
+
+
+def reschedule_expiry(*usernames: str, timeout: float = 2.0):
+    '''
+    Tells the collector to re-read the expiry instant of the given users.
+    Best effort: when the collector is not running there is nothing to update.
+    '''
+    if not usernames:
+        return
+    try:
+        send_command('reschedule', timeout=timeout, usernames=[u.lower() for u in usernames])
+    except (CollectorUnavailableError, CollectorCommandError, OSError, ValueError):
+        pass
@@ -0,0 +1,195 @@
+import asyncio
+import datetime
+
+from pymongo import AsyncMongoClient
+from pymongo.errors import DuplicateKeyError
+
+from .database import (
+    BLOCKED_FIELDS,
+    BULK_CHUNK_SIZE,
+    DEFAULT_PLAN,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_URI,
+    SERVER_STATS_ID,
+    USAGE_FIELDS,
+    BulkResult,
+    _membership_increments,
+    _notify_bulk,
+    chunked,
+    _plan_count_increments,
+    _server_stats_update,
+    _user_update_operations,
+    db,
+    stamped,
+)
+from .events import USER_CHANGED, USER_DELETED, notify
+from .user_cache import UserCache
+
+_client = None
+
+
+def get_async_client():
+    """
+    Returns the process-wide AsyncMongoClient, creating it on first use. It is
+    bound to the event loop of its first call, so share it only within one loop.
+    """
+    global _client
+    if _client is None:
+        _client = AsyncMongoClient(
+            MONGO_URI,
+            maxPoolSize=MONGO_MAX_POOL_SIZE,
+            connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        )
+    return _client
+
+
+class AsyncDatabase:
+    '''
+    asyncio counterpart of `Database` for the aiohttp and FastAPI services, so
+    a slow query suspends only the request waiting on it instead of the whole
+    event loop. Method names and results match `Database`.
+    '''
+
+    def __init__(self, db_name="asgaroth_panel", collection_name="users", client=None, cache=None):
+        self.db_name = db_name
+        self.collection_name = collection_name
+        self._client = client
+        self.cache = cache if cache is not None else UserCache()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_async_client()
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self.db_name]
+
+    @property
+    def collection(self):
+        return self.db[self.collection_name]
+
+    @property
+    def server_stats(self):
+        return self.db["server_stats"]
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    async def get_user(self, username):
+        username = username.lower()
+        user = self.cache.get(username)
+        if user is None:
+            user = await self.collection.find_one({"_id": username})
+            if user is not None:
+                self.cache.put(user)
+        return user
+
+    async def get_user_by_password(self, password, projection=None):
+        """See `Database.get_user_by_password`; cached the same way."""
+        user = self.cache.get_by_password(password)
+        if user is None:
+            user = await self.collection.find_one({"password": password})
+            if user is not None:
+                self.cache.put(user)
+        return user
+
+    async def get_all_users(self):
+        return await self.collection.find({}).to_list(None)
+
+    async def get_users_by_names(self, usernames, projection=None):
+        return await self.collection.find({"_id": {"$in": [u.lower() for u in usernames]}}, projection).to_list(None)
+
+    async def update_user(self, username, updates):
+        previous_plan = None
+        if "plan" in updates:
+            previous = await self.collection.find_one({"_id": username.lower()}, {"plan": 1})
+            previous_plan = (previous.get("plan") or DEFAULT_PLAN) if previous else None
+
+        result = await self.collection.update_one({"_id": username.lower()}, {"$set": stamped(updates)})
+        notify(self.cache, USER_CHANGED, [username])
+
+        new_plan = updates.get("plan") or DEFAULT_PLAN
+        if previous_plan and result.modified_count and previous_plan != new_plan:
+            await self.adjust_plan_counts({previous_plan: -1, new_plan: 1})
+        return result
+
+    async def bulk_apply(self, changes, ordered=False, seq=None, chunk_size=BULK_CHUNK_SIZE):
+        """See `Database.bulk_apply`."""
+        changes = list(changes)
+        result = BulkResult()
+        try:
+            # Each chunk is stamped just before it is written, so a long apply never
+            # commits a stamp older than the auth server's watermark overlap.
+            for chunk in chunked([change for change in changes if change[1] or change[2]], chunk_size):
+                operations = _user_update_operations(chunk, seq)
+                result.add(await self.collection.bulk_write(operations, ordered=ordered))
+        finally:
+            _notify_bulk(self.cache, changes)
+        return result
+
+    async def block_users(self, usernames, chunk_size=BULK_CHUNK_SIZE):
+        """See `Database.block_users`."""
+        blocked = stamped(dict(BLOCKED_FIELDS, blocked_at=datetime.datetime.now()))
+        result = BulkResult()
+        for names in chunked([u.lower() for u in usernames], chunk_size):
+            result.add(await self.collection.update_many(
+                {"_id": {"$in": names}, "blocked": {"$ne": True}}, {"$set": blocked}
+            ))
+            notify(self.cache, USER_CHANGED, names)
+        return result
+
+    async def update_server_stats(self, upload_bytes=0, download_bytes=0, online_users=None, seq=None):
+        query, update = _server_stats_update(upload_bytes, download_bytes, online_users, seq)
+        try:
+            return await self.server_stats.update_one(query, update, upsert=True)
+        except DuplicateKeyError:
+            # The guarded stats document already absorbed entry `seq`.
+            return None
+
+    async def adjust_server_stats(self, increments):
+        if not increments:
+            return None
+        return await self.server_stats.update_one({"_id": SERVER_STATS_ID}, {"$inc": increments}, upsert=True)
+
+    async def adjust_plan_counts(self, deltas):
+        return await self.adjust_server_stats(_plan_count_increments(deltas))
+
+    async def delete_users(self, usernames):
+        users = await self.collection.find(
+            {"_id": {"$in": usernames}}, {"plan": 1, **dict.fromkeys(USAGE_FIELDS, 1)}
+        ).to_list(None)
+        result = await self.collection.delete_many({"_id": {"$in": usernames}})
+        notify(self.cache, USER_DELETED, usernames)
+        if result.deleted_count:
+            await self.adjust_server_stats(_membership_increments(users, -1))
+        return result
+
+
+class ThreadedDatabase:
+    '''
+    Async facade over a synchronous backend (SQLite has no async driver):
+    every method call runs in a worker thread, so the event loop keeps
+    serving other requests meanwhile.
+    '''
+
+    def __init__(self, database):
+        self.database = database
+
+    def cache_stats(self):
+        return self.database.cache_stats()
+
+    def __getattr__(self, name):
+        method = getattr(self.database, name)
+
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(method, *args, **kwargs)
+
+        return call
+
+
+async_db = AsyncDatabase() if db.backend == "mongo" else ThreadedDatabase(db)
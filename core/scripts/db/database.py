@@ -1,44 +1,785 @@
+import os
+import datetime
+import threading
+from dataclasses import dataclass
 import pymongo
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from bson.objectid import ObjectId
 
-class Database:
-    def __init__(self, db_name="asgaroth_panel", collection_name="users"):
-        try:
-            self.client = pymongo.MongoClient("mongodb://localhost:27017/")
-            self.db = self.client[db_name]
-            self.collection = self.db[collection_name]
-            self.client.server_info()
-        except pymongo.errors.ConnectionFailure as e:
-            print(f"Could not connect to MongoDB: {e}")
+from .events import QUIET_FIELDS, USER_ADDED, USER_CHANGED, USER_DELETED, notify, publish
+from .user_cache import UserCache
+
+HOURLY_RETENTION_DAYS = 31
+DAILY_RETENTION_DAYS = 400
+SERVER_STATS_ID = "totals"
+DEFAULT_PLAN = "standard"
+DUPLICATE_KEY_ERROR = 11000
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "1000"))
+BLOCKED_FIELDS = {"blocked": True, "status": "Offline", "online_count": 0}
+ARCHIVE_AFTER_DAYS = int(os.getenv("USER_ARCHIVE_AFTER_DAYS", "90"))
+RESET_FIELDS = {"status": "On-hold", "blocked": False}
+RESET_UNSET_FIELDS = ("account_creation_date", "download_bytes", "upload_bytes", "total_bytes", "expires_at",
+                      "blocked_at")
+USAGE_FIELDS = ("upload_bytes", "download_bytes")
+
+CONFIG_ENV_FILE = "/etc/hysteria/.configs.env"
+BACKENDS = ("mongo", "sqlite")
+DEFAULT_SQLITE_PATH = "/etc/hysteria/panel.db"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the process-wide MongoClient, creating it on first use. pymongo
+    opens connections in the background, so this does no network I/O; an
+    unreachable server surfaces as ServerSelectionTimeoutError on the first
+    query, after MONGO_SERVER_SELECTION_TIMEOUT_MS.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = pymongo.MongoClient(
+                    MONGO_URI,
+                    maxPoolSize=MONGO_MAX_POOL_SIZE,
+                    connectTimeoutMS=MONGO_CONNECT_TIMEOUT_MS,
+                    serverSelectionTimeoutMS=MONGO_SERVER_SELECTION_TIMEOUT_MS,
+                )
+    return _client
+
+
+@dataclass
+class BulkResult:
+    """Counts summed over every chunk of a bulk mutation."""
+    matched_count: int = 0
+    modified_count: int = 0
+    upserted_count: int = 0
+    chunks: int = 0
+
+    def add(self, result):
+        """Adds one pymongo write result (or one chunk's BulkResult); None counts as an empty chunk."""
+        if result is not None:
+            self.matched_count += result.matched_count
+            self.modified_count += result.modified_count
+            self.upserted_count += getattr(result, "upserted_count", 0) or 0
+        self.chunks += 1
+        return self
+
+
+def chunked(items, size=BULK_CHUNK_SIZE):
+    """Splits a list into consecutive slices of at most `size` items."""
+    size = max(1, size)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _setting(name, default):
+    """Reads a storage setting from the environment, then from the panel's .configs.env."""
+    value = os.getenv(name)
+    if value is None and os.path.exists(CONFIG_ENV_FILE):
+        from dotenv import dotenv_values
+        value = dotenv_values(CONFIG_ENV_FILE).get(name)
+    return value or default
+
+
+def selected_backend():
+    backend = _setting("DB_BACKEND", "mongo").lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown DB_BACKEND '{backend}', expected one of {', '.join(BACKENDS)}")
+    return backend
+
+
+def _seq_guard(query, seq):
+    """Restricts `query` to documents that have not yet absorbed traffic spool entry `seq`."""
+    if seq is not None:
+        query["last_traffic_seq"] = {"$not": {"$gte": seq}}
+    return query
+
+
+def _ignore_replayed_upserts(write):
+    """
+    Runs an upserting write whose filter carries a sequence guard. When the
+    guarded document already absorbed the entry, the upsert collides with the
+    existing _id; those duplicate-key errors mean "already applied".
+    """
+    try:
+        return write()
+    except DuplicateKeyError:
+        return None
+    except BulkWriteError as e:
+        if any(err.get("code") != DUPLICATE_KEY_ERROR for err in e.details.get("writeErrors", [])) \
+                or e.details.get("writeConcernErrors"):
             raise
+        return None
+
+
+def stamped(set_fields=None):
+    """
+    Adds `updated_at` to a user's $set fields. Every user write stamps it, so
+    readers such as the auth server can fetch just the users changed since
+    their last look.
+    """
+    return dict(set_fields or {}, updated_at=datetime.datetime.now())
+
+
+def _user_update_operations(changes, seq=None):
+    """
+    Builds the UpdateOne operations for bulk (username, set_fields, inc_fields)
+    changes. Changes limited to QUIET_FIELDS leave `updated_at` alone.
+    """
+    operations = []
+    for username, set_fields, inc_fields in changes:
+        update = {}
+        if set_fields:
+            update["$set"] = set_fields
+        if inc_fields:
+            update["$inc"] = inc_fields
+        if inc_fields or set(set_fields or ()) - QUIET_FIELDS:
+            update["$set"] = stamped(set_fields)
+        if update:
+            if seq is not None:
+                update["$set"] = dict(update.get("$set", {}), last_traffic_seq=seq)
+            operations.append(UpdateOne(_seq_guard({"_id": username.lower()}, seq), update))
+    return operations
+
+
+def _server_stats_update(upload_bytes, download_bytes, online_users=None, seq=None):
+    """Returns the (query, update) pair that adds traffic deltas to the server-wide totals."""
+    update = {"$inc": {"upload_bytes": upload_bytes, "download_bytes": download_bytes}}
+    set_fields = {}
+    if online_users is not None:
+        set_fields["online_users"] = online_users
+    if seq is not None:
+        set_fields["last_traffic_seq"] = seq
+    if set_fields:
+        update["$set"] = set_fields
+    return _seq_guard({"_id": SERVER_STATS_ID}, seq), update
+
+
+def _plan_count_increments(deltas):
+    return {f"plans.{plan}": delta for plan, delta in deltas.items() if delta}
+
+
+def _membership_increments(users, sign, plans=True):
+    """
+    Server-stats $inc for `users` joining (sign 1) or leaving (sign -1) the
+    users collection, so the totals stay the sum over live users: their usage
+    and, with `plans`, their plan counts. A reset passes plans=False.
+    """
+    increments = {}
+    for user in users:
+        if plans:
+            plan_key = f"plans.{user.get('plan') or DEFAULT_PLAN}"
+            increments[plan_key] = increments.get(plan_key, 0) + sign
+        for field in USAGE_FIELDS:
+            increments[field] = increments.get(field, 0) + sign * (user.get(field) or 0)
+    return {field: delta for field, delta in increments.items() if delta}
+
+
+def _reset_modifies(user):
+    """Whether resetting `user` (the document before the reset) changes anything."""
+    return any(user.get(field) != value for field, value in RESET_FIELDS.items()) \
+        or any(field in user for field in RESET_UNSET_FIELDS)
+
+
+def _notify_bulk(cache, changes):
+    """
+    Drops every changed user from the local cache, but broadcasts only the
+    changes that touch more than usage counters and online state, which move
+    for every online user on every traffic cycle.
+    """
+    cache.invalidate(username for username, _, _ in changes)
+    significant = [username.lower() for username, set_fields, _ in changes if set(set_fields or ()) - QUIET_FIELDS]
+    if significant:
+        publish(USER_CHANGED, significant)
+
+
+def _named_users(filter):
+    """The usernames an `{"_id": {"$in": [...]}}` filter names, or None for any other filter."""
+    condition = (filter or {}).get("_id")
+    return condition.get("$in") if isinstance(condition, dict) else None
+
+
+def _archive_query(older_than):
+    """
+    Users blocked, or expired, at or before `older_than`. A restored user's
+    expiry counts from its `restored_at`, so it is not archived straight away.
+    """
+    return {"$or": [
+        {"blocked": True, "blocked_at": {"$lte": older_than}},
+        {"expires_at": {"$lte": older_than}, "restored_at": {"$not": {"$gt": older_than}}},
+    ]}
+
+
+def _restarted_archive_clock(user, now):
+    """Prepares an archived document for `users` again, with its archive clock restarted at `now`."""
+    user.pop("archived_at", None)
+    user["restored_at"] = now
+    if user.get("blocked"):
+        user["blocked_at"] = now
+    return user
+
+
+def compute_expires_at(account_creation_date, expiration_days):
+    """Returns the datetime a user expires at, or None if the account never expires."""
+    if not account_creation_date or not expiration_days or expiration_days <= 0:
+        return None
+    try:
+        created = datetime.datetime.strptime(account_creation_date, "%Y-%m-%d")
+    except (ValueError, TypeError):
+        return None
+    return created + datetime.timedelta(days=expiration_days)
+
+
+class Database:
+    '''
+    MongoDB storage backend and the reference for the storage interface:
+    `SQLiteDatabase` implements the same methods with the same results.
+    '''
+
+    backend = "mongo"
+
+    def __init__(self, db_name="asgaroth_panel", collection_name="users", client=None, cache=None):
+        self.db_name = db_name
+        self.collection_name = collection_name
+        self._client = client
+        self.cache = cache if cache is not None else UserCache()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+
+    @property
+    def db(self):
+        return self.client[self.db_name]
+
+    @property
+    def collection(self):
+        return self.db[self.collection_name]
+
+    @property
+    def traffic_history(self):
+        return self.db["traffic_history"]
+
+    @property
+    def server_stats(self):
+        return self.db["server_stats"]
+
+    @property
+    def meta(self):
+        return self.db["meta"]
+
+    @property
+    def archive(self):
+        return self.db["users_archive"]
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def ping(self):
+        """Round-trips to the server; raises pymongo.errors.ConnectionFailure if it is unreachable."""
+        self.client.admin.command("ping")
 
     def add_user(self, user_data):
         username = user_data.pop('username', None)
         if not username:
             raise ValueError("Username is required")
 
-        if self.collection.find_one({"_id": username.lower()}):
+        if self.collection.find_one({"_id": username.lower()}) or self.archive.find_one({"_id": username.lower()}):
             return None
 
         user_data['_id'] = username.lower()
-        return self.collection.insert_one(user_data)
+        user_data['updated_at'] = datetime.datetime.now()
+        result = self.collection.insert_one(user_data)
+        notify(self.cache, USER_ADDED, [user_data['_id']])
+        self.adjust_server_stats(_membership_increments([user_data], 1))
+        return result
+
+    def add_users(self, users):
+        """Inserts prepared user documents (with `_id` set) in one unordered batch."""
+        for user in users:
+            user["updated_at"] = datetime.datetime.now()
+        result = self.collection.insert_many(users, ordered=False)
+        notify(self.cache, USER_ADDED, [user["_id"] for user in users])
+        self.adjust_server_stats(_membership_increments(users, 1))
+        return result
 
     def get_user(self, username):
-        return self.collection.find_one({"_id": username.lower()})
+        username = username.lower()
+        user = self.cache.get(username)
+        if user is None:
+            user = self.collection.find_one({"_id": username})
+            if user is not None:
+                self.cache.put(user)
+        return user
+
+    def iter_users(self, fields=None, filter=None, batch_size=1000):
+        """
+        Streams users matching `filter` from a server-side cursor, fetching
+        `batch_size` documents per round trip, so memory stays flat however many
+        users exist. `fields` limits each document to those fields (plus _id).
+        """
+        projection = {field: 1 for field in fields} if fields is not None else None
+        cursor = self.collection.find(filter or {}, projection, batch_size=batch_size)
+        try:
+            yield from cursor
+        finally:
+            cursor.close()
 
     def get_all_users(self):
-        return list(self.collection.find({}))
+        return list(self.iter_users())
+
+    def get_user_by_password(self, password, projection=None):
+        """
+        Returns the user with this password. Served from the user cache when
+        possible, in which case the whole document is returned regardless of
+        `projection`; on a miss the whole document is fetched and cached.
+        """
+        user = self.cache.get_by_password(password)
+        if user is None:
+            user = self.collection.find_one({"password": password})
+            if user is not None:
+                self.cache.put(user)
+        return user
+
+    def get_users_by_names(self, usernames, projection=None):
+        return list(self.collection.find({"_id": {"$in": [u.lower() for u in usernames]}}, projection))
+
+    def get_users_for_traffic(self, usernames, fields=None):
+        """
+        Returns only the users a traffic cycle can change: those present in the
+        live traffic/online maps plus those the DB still considers online.
+        """
+        return list(self.iter_users(fields, {
+            "$or": [
+                {"_id": {"$in": list(usernames)}},
+                {"online_count": {"$gt": 0}},
+                {"status": "Online"},
+            ]
+        }))
+
+    def ensure_user_indexes(self):
+        self.collection.create_index("expires_at", sparse=True)
+        self.collection.create_index("total_bytes", sparse=True)
+        self.collection.create_index("blocked_at", sparse=True)
+        self.collection.create_index("updated_at", sparse=True)
+
+    def iter_users_updated_since(self, since, fields=None, batch_size=1000):
+        """Streams the users written after `since`, by their `updated_at` stamp."""
+        return self.iter_users(fields, {"updated_at": {"$gt": since}}, batch_size)
+
+    def find_expired_users(self, now, projection=None):
+        """Returns unblocked users whose `expires_at` is at or before `now`."""
+        return list(self.collection.find(
+            {"expires_at": {"$lte": now}, "blocked": {"$ne": True}},
+            projection,
+        ))
+
+    def find_over_quota_users(self, projection=None):
+        """
+        Returns unblocked users whose `total_bytes` reached `max_download_bytes`.
+        The `total_bytes` index narrows the scan to users that have used traffic.
+        """
+        return list(self.collection.find(
+            {
+                "total_bytes": {"$gt": 0},
+                "max_download_bytes": {"$gt": 0},
+                "blocked": {"$ne": True},
+                "$expr": {"$gte": ["$total_bytes", "$max_download_bytes"]},
+            },
+            projection,
+        ))
+
+    def get_expiry_schedule(self):
+        """Returns (username, expires_at) for every unblocked user that has an expiry instant."""
+        users = self.iter_users(["expires_at"], {"expires_at": {"$ne": None}, "blocked": {"$ne": True}})
+        return [(user["_id"], user["expires_at"]) for user in users]
+
+    def get_user_expiry(self, username):
+        """Returns the user's expires_at, or None if they are missing, blocked or never expire."""
+        user = self.collection.find_one({"_id": username.lower()}, {"expires_at": 1, "blocked": 1})
+        if not user or user.get("blocked"):
+            return None
+        return user.get("expires_at")
+
+    def block_if_expired(self, username, now):
+        """Blocks the user only if they are still unblocked and past expires_at; returns True if blocked."""
+        result = self.collection.update_one(
+            {"_id": username.lower(), "blocked": {"$ne": True}, "expires_at": {"$lte": now}},
+            {"$set": stamped(dict(BLOCKED_FIELDS, blocked_at=now))},
+        )
+        if result.modified_count:
+            notify(self.cache, USER_CHANGED, [username])
+        return result.modified_count > 0
+
+    def backfill_enforcement_fields(self, query=None):
+        """Derives `total_bytes` and `expires_at` for every user matching `query` in one pipeline update."""
+        created = {"$dateFromString": {
+            "dateString": "$account_creation_date",
+            "format": "%Y-%m-%d",
+            "onError": None,
+            "onNull": None,
+        }}
+        result = self.collection.update_many(query or {}, [
+            {"$set": {
+                "total_bytes": {"$add": [{"$ifNull": ["$upload_bytes", 0]}, {"$ifNull": ["$download_bytes", 0]}]},
+                "expires_at": {"$cond": [
+                    {"$and": [{"$gt": [{"$ifNull": ["$expiration_days", 0]}, 0]}, {"$ne": [created, None]}]},
+                    {"$add": [created, {"$multiply": ["$expiration_days", 86400000]}]},
+                    None,
+                ]},
+                "updated_at": datetime.datetime.now(),
+            }},
+        ])
+        notify(self.cache, USER_CHANGED, _named_users(query))
+        return result
 
     def update_user(self, username, updates):
-        return self.collection.update_one({"_id": username.lower()}, {"$set": updates})
+        previous_plan = None
+        if "plan" in updates:
+            previous = self.collection.find_one({"_id": username.lower()}, {"plan": 1})
+            previous_plan = (previous.get("plan") or DEFAULT_PLAN) if previous else None
+
+        result = self.collection.update_one({"_id": username.lower()}, {"$set": stamped(updates)})
+        notify(self.cache, USER_CHANGED, [username])
+
+        new_plan = updates.get("plan") or DEFAULT_PLAN
+        if previous_plan and result.modified_count and previous_plan != new_plan:
+            self.adjust_plan_counts({previous_plan: -1, new_plan: 1})
+        return result
+
+    def upsert_user(self, user_doc):
+        """Creates or overwrites the fields of a prepared user document (with `_id` set)."""
+        result = self.collection.update_one({"_id": user_doc["_id"]}, {"$set": stamped(user_doc)}, upsert=True)
+        notify(self.cache, USER_CHANGED, [user_doc["_id"]])
+        return result
+
+    def put_users(self, users):
+        """Writes whole user documents, replacing any with the same _id; used to copy users between backends."""
+        users = list(users)
+        if not users:
+            return None
+        result = self.collection.bulk_write(
+            [ReplaceOne({"_id": user["_id"]}, stamped(user), upsert=True) for user in users], ordered=False
+        )
+        notify(self.cache, USER_CHANGED, [user["_id"] for user in users])
+        return result
+
+    def reset_user(self, username):
+        """
+        Puts a user back on hold: unblocked, with no usage and no activation
+        date. The usage cleared is taken off the server totals.
+        """
+        previous = self.collection.find_one_and_update(
+            {"_id": username.lower()},
+            {
+                "$set": stamped(RESET_FIELDS),
+                "$unset": {field: "" for field in RESET_UNSET_FIELDS},
+            },
+            projection={field: 1 for field in (*RESET_FIELDS, *RESET_UNSET_FIELDS)},
+            return_document=ReturnDocument.BEFORE,
+        )
+        notify(self.cache, USER_CHANGED, [username])
+        if previous is None:
+            return BulkResult()
+        self.adjust_server_stats(_membership_increments([previous], -1, plans=False))
+        return BulkResult(matched_count=1, modified_count=int(_reset_modifies(previous)))
+
+    def rename_user(self, username, new_username):
+        user_data = self.collection.find_one({"_id": username.lower()})
+        if not user_data:
+            return None
+        user_data["_id"] = new_username.lower()
+        user_data["updated_at"] = datetime.datetime.now()
+        result = self.collection.insert_one(user_data)
+        self.collection.delete_one({"_id": username.lower()})
+        notify(self.cache, USER_DELETED, [username])
+        notify(self.cache, USER_ADDED, [new_username])
+        return result
+
+    def bulk_apply(self, changes, ordered=False, seq=None, chunk_size=BULK_CHUNK_SIZE):
+        """
+        Applies many per-user changes with one bulk_write round trip per chunk.
+
+        Args:
+            changes: iterable of (username, set_fields, inc_fields) tuples.
+            ordered: whether MongoDB should stop at the first failed operation.
+            seq: traffic spool sequence number; when given, users that already
+                absorbed this entry are skipped so a replay is idempotent.
+            chunk_size: changes per bulk_write (BULK_CHUNK_SIZE by default).
+
+        Returns:
+            BulkResult with the counts summed over all chunks.
+        """
+        changes = list(changes)
+        result = BulkResult()
+        try:
+            # Each chunk is stamped just before it is written, so a long apply never
+            # commits a stamp older than the auth server's watermark overlap.
+            for chunk in chunked([change for change in changes if change[1] or change[2]], chunk_size):
+                operations = _user_update_operations(chunk, seq)
+                result.add(self.collection.bulk_write(operations, ordered=ordered))
+        finally:
+            _notify_bulk(self.cache, changes)
+        return result
+
+    def update_users_many(self, filter, set_fields):
+        """
+        Sets the same fields on every user matching `filter` with one update_many.
+        The change is announced for the users named by an `_id` `$in` filter,
+        or for everyone otherwise.
+        """
+        result = BulkResult().add(self.collection.update_many(filter, {"$set": stamped(set_fields)}))
+        notify(self.cache, USER_CHANGED, _named_users(filter))
+        return result
+
+    def block_users(self, usernames, chunk_size=BULK_CHUNK_SIZE):
+        """Blocks and marks offline the named users that are not blocked yet, `chunk_size` per update_many."""
+        blocked = dict(BLOCKED_FIELDS, blocked_at=datetime.datetime.now())
+        result = BulkResult()
+        for names in chunked([u.lower() for u in usernames], chunk_size):
+            result.add(self.update_users_many({"_id": {"$in": names}, "blocked": {"$ne": True}}, blocked))
+        return result
+
+    def archive_users(self, older_than, chunk_size=BULK_CHUNK_SIZE):
+        """
+        Moves users blocked, or expired, since before `older_than` from `users`
+        into `users_archive`, `chunk_size` at a time, so the scans every cycle
+        makes only walk live accounts. Each chunk is copied before it is
+        deleted, so an interrupted run loses nothing and can simply be repeated.
+        Returns the number of users archived.
+        """
+        archived = 0
+        while True:
+            users = list(self.collection.find(_archive_query(older_than)).limit(chunk_size))
+            if not users:
+                return archived
+            now = datetime.datetime.now()
+            self.archive.bulk_write(
+                [ReplaceOne({"_id": user["_id"]}, dict(user, archived_at=now), upsert=True) for user in users],
+                ordered=False,
+            )
+            usernames = [user["_id"] for user in users]
+            self.collection.delete_many({"_id": {"$in": usernames}})
+            notify(self.cache, USER_DELETED, usernames)
+            self.adjust_server_stats(_membership_increments(users, -1))
+            archived += len(users)
+
+    def restore_user(self, username):
+        """
+        Moves an archived user back into `users` (so still blocked). Its archive
+        clock restarts, giving an admin the full grace period to edit or reset
+        it before `archive_users` would move it out again.
+        Returns the restored document, or None if the user is not archived.
+        Raises ValueError if a live user has taken the name meanwhile.
+        """
+        user = self.archive.find_one({"_id": username.lower()})
+        if user is None:
+            return None
+        if self.collection.find_one({"_id": user["_id"]}, {"_id": 1}):
+            raise ValueError(f"User '{user['_id']}' exists and cannot be restored over")
+        now = datetime.datetime.now()
+        user = _restarted_archive_clock(user, now)
+        user["updated_at"] = now
+        self.collection.insert_one(user)
+        self.archive.delete_one({"_id": user["_id"]})
+        notify(self.cache, USER_ADDED, [user["_id"]])
+        self.adjust_server_stats(_membership_increments([user], 1))
+        return user
+
+    def get_archived_user(self, username):
+        return self.archive.find_one({"_id": username.lower()})
+
+    def iter_archived_users(self, fields=None):
+        projection = {field: 1 for field in fields} if fields is not None else None
+        yield from self.archive.find({}, projection)
+
+    def put_archived_users(self, users):
+        """Writes whole archived user documents, replacing any with the same _id; used to copy the archive."""
+        operations = [ReplaceOne({"_id": user["_id"]}, user, upsert=True) for user in users]
+        if not operations:
+            return None
+        return self.archive.bulk_write(operations, ordered=False)
+
+    def ensure_traffic_history_indexes(self):
+        self.traffic_history.create_index([("username", pymongo.ASCENDING), ("day", pymongo.ASCENDING)])
+        self.traffic_history.create_index("expire_at", expireAfterSeconds=0)
+
+    def record_traffic_buckets(self, samples, when, seq=None, per_node=None):
+        """
+        Adds per-user byte deltas to the hourly slot of each user's daily bucket.
+
+        Args:
+            samples: mapping of username -> (upload_bytes, download_bytes).
+            when: datetime the deltas belong to.
+            seq: traffic spool sequence number used to make replays idempotent.
+            per_node: optional mapping of username -> {node name: (upload, download)}
+                stored under `nodes.<name>` in the bucket for per-node reporting.
+        """
+        day = datetime.datetime(when.year, when.month, when.day)
+        hour = when.hour
+        operations = []
+        for username, (upload, download) in samples.items():
+            if not upload and not download:
+                continue
+            update = {
+                "$setOnInsert": {
+                    "username": username,
+                    "day": day,
+                    "expire_at": day + datetime.timedelta(days=DAILY_RETENTION_DAYS),
+                },
+                "$inc": {
+                    f"hours.{hour}.tx": upload,
+                    f"hours.{hour}.rx": download,
+                    "tx": upload,
+                    "rx": download,
+                },
+            }
+            for node_name, (node_upload, node_download) in (per_node or {}).get(username, {}).items():
+                node_key = node_name.replace(".", "_").lstrip("$")
+                update["$inc"][f"nodes.{node_key}.tx"] = node_upload
+                update["$inc"][f"nodes.{node_key}.rx"] = node_download
+            if seq is not None:
+                update["$set"] = {"last_traffic_seq": seq}
+            operations.append(UpdateOne(_seq_guard({"_id": f"{username}:{day:%Y-%m-%d}"}, seq), update, upsert=True))
+        if not operations:
+            return None
+        return _ignore_replayed_upserts(lambda: self.traffic_history.bulk_write(operations, ordered=False))
+
+    def downsample_traffic_history(self, older_than):
+        """
+        Collapses the hourly slots of buckets older than `older_than` into their
+        daily totals, keeping only the busiest hour.
+        """
+        hours = {"$objectToArray": "$hours"}
+        slot_bytes = {"$add": [{"$ifNull": ["$$this.v.tx", 0]}, {"$ifNull": ["$$this.v.rx", 0]}]}
+        return self.traffic_history.update_many(
+            {"day": {"$lt": older_than}, "hours": {"$exists": True}},
+            [
+                {"$set": {
+                    "peak": {"$reduce": {
+                        "input": hours,
+                        "initialValue": {"hour": None, "bytes": 0},
+                        "in": {"$cond": [
+                            {"$gt": [slot_bytes, "$$value.bytes"]},
+                            {"hour": {"$toInt": "$$this.k"}, "bytes": slot_bytes},
+                            "$$value",
+                        ]},
+                    }},
+                }},
+                {"$set": {"peak_hour": "$peak.hour", "downsampled": True}},
+                {"$unset": ["hours", "peak"]},
+            ],
+        )
+
+    def iter_traffic_buckets(self):
+        """Streams every traffic history bucket; used to copy history between backends."""
+        yield from self.traffic_history.find({})
+
+    def put_traffic_buckets(self, buckets):
+        """Writes whole traffic history buckets, replacing any with the same _id."""
+        operations = [ReplaceOne({"_id": bucket["_id"]}, bucket, upsert=True) for bucket in buckets]
+        if not operations:
+            return None
+        return self.traffic_history.bulk_write(operations, ordered=False)
+
+    def get_traffic_history(self, username, start_day, end_day):
+        return list(self.traffic_history.find(
+            {"username": username.lower(), "day": {"$gte": start_day, "$lte": end_day}}
+        ).sort("day", pymongo.ASCENDING))
+
+    def update_server_stats(self, upload_bytes=0, download_bytes=0, online_users=None, seq=None):
+        """Adds traffic deltas to the server-wide totals and records the current online count."""
+        query, update = _server_stats_update(upload_bytes, download_bytes, online_users, seq)
+        return _ignore_replayed_upserts(lambda: self.server_stats.update_one(query, update, upsert=True))
+
+    def adjust_server_stats(self, increments):
+        """Applies $inc `increments` (usage and `plans.<name>` counts) to the server totals."""
+        if not increments:
+            return None
+        return self.server_stats.update_one({"_id": SERVER_STATS_ID}, {"$inc": increments}, upsert=True)
+
+    def adjust_plan_counts(self, deltas):
+        return self.adjust_server_stats(_plan_count_increments(deltas))
+
+    def rebuild_server_stats(self):
+        """Recomputes the aggregates document from the users collection with one aggregation."""
+        stats = {"_id": SERVER_STATS_ID, "upload_bytes": 0, "download_bytes": 0, "online_users": 0, "plans": {}}
+        pipeline = [{"$group": {
+            "_id": {"$ifNull": ["$plan", DEFAULT_PLAN]},
+            "count": {"$sum": 1},
+            "upload_bytes": {"$sum": {"$ifNull": ["$upload_bytes", 0]}},
+            "download_bytes": {"$sum": {"$ifNull": ["$download_bytes", 0]}},
+            "online_users": {"$sum": {"$ifNull": ["$online_count", 0]}},
+        }}]
+        for group in self.collection.aggregate(pipeline):
+            stats["plans"][group["_id"]] = group["count"]
+            stats["upload_bytes"] += group["upload_bytes"]
+            stats["download_bytes"] += group["download_bytes"]
+            stats["online_users"] += group["online_users"]
+        self.server_stats.replace_one({"_id": SERVER_STATS_ID}, stats, upsert=True)
+        return stats
+
+    def put_server_stats(self, stats):
+        self.server_stats.replace_one({"_id": SERVER_STATS_ID}, dict(stats, _id=SERVER_STATS_ID), upsert=True)
+
+    def get_server_stats(self):
+        stats = self.server_stats.find_one({"_id": SERVER_STATS_ID})
+        if stats is None:
+            stats = self.rebuild_server_stats()
+        return stats
 
     def delete_user(self, username):
-        return self.collection.delete_one({"_id": username.lower()})
+        return self.delete_users([username.lower()])
 
     def delete_users(self, usernames):
-        return self.collection.delete_many({"_id": {"$in": usernames}})
+        users = list(self.collection.find({"_id": {"$in": usernames}}, {"plan": 1, **dict.fromkeys(USAGE_FIELDS, 1)}))
+        result = self.collection.delete_many({"_id": {"$in": usernames}})
+        notify(self.cache, USER_DELETED, usernames)
+        if result.deleted_count:
+            self.adjust_server_stats(_membership_increments(users, -1))
+        return result
+
+
+def open_database(backend=None, sqlite_path=None):
+    """
+    Returns the storage backend selected by DB_BACKEND (mongo or sqlite); the
+    SQLite file lives at SQLITE_PATH. Neither backend does I/O until first use.
+    """
+    backend = backend or selected_backend()
+    if backend == "sqlite":
+        from .sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(sqlite_path or _setting("SQLITE_PATH", DEFAULT_SQLITE_PATH))
+    if backend != "mongo":
+        raise ValueError(f"Unknown backend '{backend}', expected one of {', '.join(BACKENDS)}")
+    return Database()
+
+
+def connection_error(database=None):
+    """
+    Pings `database` (the shared `db` by default). Returns None if it answers,
+    otherwise the message the CLI scripts print before giving up.
+    """
+    database = database if database is not None else db
+    try:
+        database.ping()
+    except Exception as e:
+        if database.backend == "sqlite":
+            return f"Database connection failed. Cannot open {database.path}: {e}."
+        return "Database connection failed. Please ensure MongoDB is running."
+    return None
+
 
-try:
-    db = Database()
-except pymongo.errors.ConnectionFailure:
-    db = None
\ No newline at end of file
+# Connects lazily on first use, so importing this module costs no round trip.
+db = open_database()
@@ -0,0 +1,245 @@
+import os
+import json
+import stat
+import time
+import socket
+import logging
+import threading
+
+# Only this user may create sockets here: subscribers trust what arrives and
+# publishers send usernames to whatever socket they find.
+EVENTS_DIR = os.getenv("PANEL_EVENTS_DIR", "/run/hysteria/events")
+USERS_PER_MESSAGE = 500
+MAX_MESSAGE_BYTES = 256 * 1024
+CHANGE_STREAM_RETRY_SECONDS = 5
+
+USER_ADDED = "user.added"
+USER_CHANGED = "user.changed"
+USER_DELETED = "user.deleted"
+CONFIG_CHANGED = "config.changed"
+USER_EVENTS = (USER_ADDED, USER_CHANGED, USER_DELETED)
+
+# Fields every traffic cycle rewrites; changes limited to these are not broadcast.
+QUIET_FIELDS = frozenset({"status", "online_count", "last_traffic_seq"})
+# What a traffic cycle's $inc writes besides them: usage counters and the `updated_at` stamp.
+TRAFFIC_FIELDS = frozenset({"upload_bytes", "download_bytes", "total_bytes", "updated_at"})
+
+logger = logging.getLogger(__name__)
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _is_private_dir(path):
+    """True if `path` is a real directory owned by this user and closed to everyone else."""
+    try:
+        st = os.lstat(path)
+    except FileNotFoundError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and st.st_uid == os.geteuid() and not st.st_mode & 0o077
+
+
+def _messages(event, usernames, data):
+    base = {"event": event, "pid": os.getpid(), "ts": time.time(), **data}
+    if usernames is None:
+        return [json.dumps(dict(base, usernames=None)).encode()]
+    usernames = list(usernames)
+    return [
+        json.dumps(dict(base, usernames=usernames[start:start + USERS_PER_MESSAGE])).encode()
+        for start in range(0, len(usernames), USERS_PER_MESSAGE)
+    ]
+
+
+def publish(event, usernames=None, **data):
+    """
+    Sends `event` to every subscriber socket in EVENTS_DIR and returns how many
+    received it. `usernames` lists the users concerned; None means any user.
+
+    Delivery is fire-and-forget: with no subscribers this is a directory
+    listing, and a subscriber whose queue is full simply misses the event and
+    falls back on its cache TTL. Sockets left behind by dead processes are
+    removed on the way. Nothing is sent into a directory other users can write.
+    """
+    try:
+        targets = os.listdir(EVENTS_DIR)
+    except FileNotFoundError:
+        return 0
+    if not targets:
+        return 0
+    if not _is_private_dir(EVENTS_DIR):
+        logger.warning(f"Not publishing {event}: {EVENTS_DIR} is not private to uid {os.geteuid()}")
+        return 0
+
+    messages = _messages(event, usernames, data)
+    delivered = 0
+    with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+        sock.setblocking(False)
+        for target in targets:
+            path = os.path.join(EVENTS_DIR, target)
+            try:
+                for message in messages:
+                    sock.sendto(message, path)
+                delivered += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                _unlink(path)
+            except OSError as e:
+                logger.debug(f"Dropped {event} for {path}: {e}")
+    return delivered
+
+
+def notify(cache, event, usernames):
+    """Drops `usernames` (None: everyone) from this process's cache, then tells the other processes."""
+    usernames = None if usernames is None else [username.lower() for username in usernames]
+    if usernames is None:
+        cache.clear()
+    else:
+        cache.invalidate(usernames)
+    publish(event, usernames)
+
+
+class Subscription:
+    '''
+    Receives published events on a datagram socket named after this process
+    and hands each one, as a dict, to `callback` on a background thread. If
+    EVENTS_DIR exists but other users can write to it, the subscription stays
+    idle (as it does if the directory cannot be created) and the process
+    relies on its cache TTL alone.
+    '''
+
+    def __init__(self, callback, name="subscriber"):
+        self.callback = callback
+        self.name = name
+        self.path = os.path.join(EVENTS_DIR, f"{name}-{os.getpid()}.sock")
+        self._sock = None
+
+    def start(self):
+        try:
+            os.makedirs(EVENTS_DIR, mode=0o700, exist_ok=True)
+        except OSError as e:
+            logger.error(f"Not subscribing to events: cannot create {EVENTS_DIR}: {e}")
+            return self
+        if not _is_private_dir(EVENTS_DIR):
+            logger.error(f"Not subscribing to events: {EVENTS_DIR} must be owned by uid {os.geteuid()} "
+                         f"and closed to other users")
+            return self
+        _unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        os.chmod(self.path, 0o600)
+        threading.Thread(target=self._run, name=f"events-{self.name}", daemon=True).start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                message = self._sock.recv(MAX_MESSAGE_BYTES)
+            except OSError:
+                return
+            try:
+                event = json.loads(message)
+            except ValueError:
+                continue
+            try:
+                self.callback(event)
+            except Exception:
+                logger.exception(f"Event handler failed for {event.get('event')}")
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            _unlink(self.path)
+
+
+def _is_replica_set(database):
+    try:
+        return bool(database.client.admin.command("hello").get("setName"))
+    except Exception:
+        return False
+
+
+_CHANGE_STREAM_EVENTS = {
+    "insert": USER_ADDED,
+    "update": USER_CHANGED,
+    "replace": USER_CHANGED,
+    "delete": USER_DELETED,
+}
+
+
+def change_stream_pipeline():
+    """
+    Drops updates that only touch QUIET_FIELDS and TRAFFIC_FIELDS, like the
+    ones every traffic cycle makes, so the change stream announces the same
+    writes the bus does.
+    """
+    quiet = sorted(QUIET_FIELDS | TRAFFIC_FIELDS)
+    significant = {"$filter": {
+        "input": {"$objectToArray": "$updateDescription.updatedFields"},
+        "as": "field",
+        "cond": {"$eq": [{"$in": ["$$field.k", quiet]}, False]},
+    }}
+    return [{"$match": {"$or": [
+        {"operationType": {"$ne": "update"}},
+        {"updateDescription.removedFields.0": {"$exists": True}},
+        {"$expr": {"$gt": [{"$size": significant}, 0]}},
+    ]}}]
+
+
+def start_change_stream(database, callback):
+    """
+    Also feeds `callback` from a MongoDB change stream on the users
+    collection, which sees writes from every host and from tools that bypass
+    `Database`; updates limited to traffic counters and online state are
+    filtered out server-side. Change streams need a replica set: the watcher
+    thread checks for one first and quietly exits without it. Returns the
+    thread, or None for a non-MongoDB backend.
+    """
+    if getattr(database, "backend", None) != "mongo":
+        return None
+
+    def watch():
+        if not _is_replica_set(database):
+            return
+        resume_after = None
+        while True:
+            try:
+                with database.collection.watch(change_stream_pipeline(), resume_after=resume_after) as stream:
+                    for change in stream:
+                        resume_after = stream.resume_token
+                        event = _CHANGE_STREAM_EVENTS.get(change["operationType"])
+                        if event:
+                            callback({"event": event, "usernames": [change["documentKey"]["_id"]],
+                                      "source": "change_stream"})
+            except Exception:
+                logger.exception("User change stream failed, reconnecting")
+                time.sleep(CHANGE_STREAM_RETRY_SECONDS)
+
+    thread = threading.Thread(target=watch, name="events-change-stream", daemon=True)
+    thread.start()
+    return thread
+
+
+def follow(cache, name, on_event=None, change_stream=None):
+    """
+    Keeps `cache` coherent with writes made by other processes: user events
+    evict the users named (or everyone), then every event is passed on to
+    `on_event`. `change_stream` is a sync MongoDB `Database` to watch as well.
+    Returns the Subscription.
+    """
+    def handle(event):
+        if event.get("event") in USER_EVENTS:
+            if event.get("usernames") is None:
+                cache.clear()
+            else:
+                cache.invalidate(event["usernames"])
+        if on_event is not None:
+            on_event(event)
+
+    subscription = Subscription(handle, name).start()
+    if change_stream is not None:
+        start_change_stream(change_stream, handle)
+    return subscription
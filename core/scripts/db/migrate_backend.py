@@ -0,0 +1,107 @@
+import sys
+import os
+import argparse
+from itertools import islice
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db.database import BACKENDS, CONFIG_ENV_FILE, DEFAULT_SQLITE_PATH, open_database
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def _batches(items, size):
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+def copy_database(source, target, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Copies users, archived users, traffic history and the server totals from
+    `source` to `target`, replacing documents with the same _id. Safe to run
+    again after an interruption. Returns (users, archived users, buckets) copied.
+    """
+    users = 0
+    for batch in _batches(source.iter_users(batch_size=batch_size), batch_size):
+        target.put_users(batch)
+        users += len(batch)
+
+    archived = 0
+    for batch in _batches(source.iter_archived_users(), batch_size):
+        target.put_archived_users(batch)
+        archived += len(batch)
+
+    buckets = 0
+    for batch in _batches(source.iter_traffic_buckets(), batch_size):
+        target.put_traffic_buckets(batch)
+        buckets += len(batch)
+
+    target.put_server_stats(source.get_server_stats())
+    return users, archived, buckets
+
+
+def _ids(documents):
+    return {document["_id"] for document in documents}
+
+
+def verify_copy(source, target):
+    """Returns a description of every collection whose _ids differ between `source` and `target`."""
+    problems = []
+    for name, read in (
+        ("users", lambda database: database.iter_users(["_id"])),
+        ("archived users", lambda database: database.iter_archived_users(["_id"])),
+        ("traffic history buckets", lambda database: database.iter_traffic_buckets()),
+    ):
+        missing = _ids(read(source)) - _ids(read(target))
+        if missing:
+            problems.append(f"{len(missing)} {name} missing from the target")
+    return problems
+
+
+def activate(backend, sqlite_path):
+    from dotenv import set_key
+    set_key(CONFIG_ENV_FILE, "DB_BACKEND", backend)
+    if backend == "sqlite":
+        set_key(CONFIG_ENV_FILE, "SQLITE_PATH", sqlite_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy the panel's data between the MongoDB and SQLite backends.")
+    parser.add_argument("--from", dest="source", choices=BACKENDS, required=True, help="Backend to copy from.")
+    parser.add_argument("--to", dest="target", choices=BACKENDS, required=True, help="Backend to copy to.")
+    parser.add_argument("--sqlite-path", default=DEFAULT_SQLITE_PATH,
+                        help=f"SQLite database file (default: {DEFAULT_SQLITE_PATH}).")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Documents per write batch (default: {DEFAULT_BATCH_SIZE}).")
+    parser.add_argument("--activate", action="store_true",
+                        help=f"Switch the panel to the target backend in {CONFIG_ENV_FILE} after copying.")
+    args = parser.parse_args()
+
+    if args.source == args.target:
+        parser.error("--from and --to must name different backends")
+
+    try:
+        source = open_database(args.source, args.sqlite_path)
+        target = open_database(args.target, args.sqlite_path)
+        users, archived, buckets = copy_database(source, target, args.batch_size)
+        problems = verify_copy(source, target)
+    except Exception as e:
+        print(f"Error copying data from {args.source} to {args.target}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if problems:
+        print(f"Copy from {args.source} to {args.target} is incomplete: {'; '.join(problems)}. "
+              f"The panel still uses {args.source}; rerun the copy.", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Copied {users} users, {archived} archived users and {buckets} traffic history buckets "
+          f"from {args.source} to {args.target}.")
+    if args.activate:
+        activate(args.target, args.sqlite_path)
+        print(f"DB_BACKEND set to '{args.target}'. Restart the panel services to use it.")
+    else:
+        print(f"Set DB_BACKEND={args.target} in {CONFIG_ENV_FILE} (or rerun with --activate) to switch.")
+
+
+if __name__ == "__main__":
+    main()
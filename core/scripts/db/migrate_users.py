@@ -4,7 +4,7 @@ import sys
 import os
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from db.database import db
+from db.database import db, connection_error, compute_expires_at
 
 def migrate():
     users_json_path = Path("/etc/hysteria/users.json")
@@ -13,8 +13,9 @@ def migrate():
         print("users.json not found, no migration needed.")
         return
 
-    if db is None:
-        print("Error: Database connection failed. Cannot perform migration.", file=sys.stderr)
+    error = connection_error()
+    if error:
+        print(f"Error: {error} Cannot perform migration.", file=sys.stderr)
         sys.exit(1)
 
     try:
@@ -41,16 +42,14 @@ def migrate():
                 "upload_bytes": data.get("upload_bytes", 0),
                 "download_bytes": data.get("download_bytes", 0),
             }
+            user_doc["total_bytes"] = user_doc["upload_bytes"] + user_doc["download_bytes"]
+            user_doc["expires_at"] = compute_expires_at(user_doc["account_creation_date"], user_doc["expiration_days"])
             
             if user_doc["password"] is None:
                 print(f"Warning: User '{username}' has no password, skipping.", file=sys.stderr)
                 continue
 
-            db.collection.update_one(
-                {'_id': user_doc['_id']},
-                {'$set': user_doc},
-                upsert=True
-            )
+            db.upsert_user(user_doc)
             migrated_count += 1
             print(f"  - Migrated user: {username}")
         
@@ -58,6 +57,7 @@ def migrate():
             print(f"Error migrating user '{username}': {e}", file=sys.stderr)
 
     print(f"Migration complete. {migrated_count} users successfully migrated to MongoDB.")
+    db.rebuild_server_stats()
     
     try:
         migrated_file_path = users_json_path.with_name("users.json.migrated")
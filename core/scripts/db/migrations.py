@@ -0,0 +1,184 @@
+import sys
+import os
+import argparse
+import datetime
+from dataclasses import dataclass
+from typing import Callable, List
+
+import pymongo
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from db.database import db, connection_error
+
+DEFAULT_BATCH_SIZE = 1000
+SCHEMA_VERSION_ID = "schema_version"
+PROGRESS_ID = "migration_progress"
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: Callable[["MigrationRun"], None]
+
+
+class MigrationRun:
+    '''
+    State shared with one migration while it runs: the database, the batch
+    size and a checkpoint in the meta collection, so a backfill interrupted
+    halfway resumes after the last batch it finished instead of starting over.
+    '''
+
+    def __init__(self, database, migration: Migration, batch_size: int):
+        self.database = database
+        self.migration = migration
+        self.batch_size = batch_size
+
+    def resume_after(self):
+        progress = self.database.meta.find_one({"_id": PROGRESS_ID})
+        if progress and progress.get("version") == self.migration.version:
+            return progress.get("last_id")
+        return None
+
+    def checkpoint(self, last_id):
+        self.database.meta.update_one(
+            {"_id": PROGRESS_ID},
+            {"$set": {"version": self.migration.version, "last_id": last_id}},
+            upsert=True,
+        )
+
+    def user_batches(self, query=None):
+        """Yields lists of user _ids matching `query`, in _id order, resuming after the last checkpoint."""
+        last_id = self.resume_after()
+        while True:
+            batch_query = dict(query or {})
+            if last_id is not None:
+                batch_query["_id"] = {"$gt": last_id}
+            ids = [doc["_id"] for doc in self.database.collection.find(batch_query, {"_id": 1})
+                   .sort("_id", 1).limit(self.batch_size)]
+            if not ids:
+                return
+            yield ids
+            last_id = ids[-1]
+            self.checkpoint(last_id)
+
+
+# A migration's indexes are spelled out rather than taken from ensure_*_indexes(),
+# whose lists grow over time; a new index gets a new numbered migration.
+def _enforcement_indexes(run: MigrationRun):
+    run.database.collection.create_index("expires_at", sparse=True)
+    run.database.collection.create_index("total_bytes", sparse=True)
+
+
+def _traffic_history_indexes(run: MigrationRun):
+    run.database.traffic_history.create_index([("username", pymongo.ASCENDING), ("day", pymongo.ASCENDING)])
+    run.database.traffic_history.create_index("expire_at", expireAfterSeconds=0)
+
+
+def _password_index(run: MigrationRun):
+    # normalsub resolves subscription tokens by password on every request.
+    run.database.collection.create_index("password")
+
+
+def _backfill_enforcement_fields(run: MigrationRun):
+    for ids in run.user_batches():
+        run.database.backfill_enforcement_fields({"_id": {"$in": ids}})
+
+
+def _blocked_at(run: MigrationRun):
+    # Users blocked before blocked_at existed start their archive clock now.
+    run.database.collection.create_index("blocked_at", sparse=True)
+    now = datetime.datetime.now()
+    for ids in run.user_batches({"blocked": True, "blocked_at": {"$exists": False}}):
+        run.database.collection.update_many({"_id": {"$in": ids}}, {"$set": {"blocked_at": now}})
+
+
+def _updated_at_index(run: MigrationRun):
+    # The auth server polls for users written since its last refresh.
+    run.database.collection.create_index("updated_at", sparse=True)
+
+
+def _rebuild_server_stats(run: MigrationRun):
+    # Totals are maintained by deltas from here on; start them from the users collection.
+    run.database.rebuild_server_stats()
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Indexes on users.expires_at and users.total_bytes", _enforcement_indexes),
+    Migration(2, "Indexes on traffic_history (username/day lookups, bucket TTL)", _traffic_history_indexes),
+    Migration(3, "Index on users.password for subscription lookups", _password_index),
+    Migration(4, "Derive expires_at/total_bytes for existing users", _backfill_enforcement_fields),
+    Migration(5, "Index users.blocked_at and stamp already-blocked users", _blocked_at),
+    Migration(6, "Index on users.updated_at for incremental reloads", _updated_at_index),
+    Migration(7, "Rebuild the server totals and plan counts from users", _rebuild_server_stats),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(database) -> int:
+    meta = database.meta.find_one({"_id": SCHEMA_VERSION_ID})
+    return meta.get("version", 0) if meta else 0
+
+
+def migrate(database, batch_size: int = DEFAULT_BATCH_SIZE, target: int = LATEST_VERSION) -> List[Migration]:
+    """
+    Applies every migration newer than the recorded schema version, up to
+    `target`, in order. Each one is recorded as soon as it finishes, so a
+    failed run can simply be repeated. Returns the migrations applied.
+    """
+    applied = []
+    version = current_version(database)
+    for migration in MIGRATIONS:
+        if migration.version <= version or migration.version > target:
+            continue
+        migration.apply(MigrationRun(database, migration, batch_size))
+        database.meta.update_one(
+            {"_id": SCHEMA_VERSION_ID},
+            {
+                "$set": {"version": migration.version},
+                "$push": {"history": {
+                    "version": migration.version,
+                    "description": migration.description,
+                    "applied_at": datetime.datetime.now(),
+                }},
+            },
+            upsert=True,
+        )
+        database.meta.delete_one({"_id": PROGRESS_ID, "version": migration.version})
+        applied.append(migration)
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bring the panel's MongoDB schema and indexes up to date.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Documents per backfill batch (default: {DEFAULT_BATCH_SIZE}).")
+    parser.add_argument("--status", action="store_true", help="Only print the current and latest schema version.")
+    args = parser.parse_args()
+
+    error = connection_error()
+    if error:
+        print(f"Error: {error} Cannot run migrations.", file=sys.stderr)
+        sys.exit(1)
+
+    if db.backend != "mongo":
+        print(f"The {db.backend} backend creates its schema and indexes when it is opened; nothing to migrate.")
+        return
+
+    try:
+        version = current_version(db)
+        if args.status:
+            print(f"Schema version {version} (latest {LATEST_VERSION}).")
+            return
+        for migration in migrate(db, args.batch_size):
+            print(f"  - Applied migration {migration.version}: {migration.description}")
+    except Exception as e:
+        print(f"Error running migrations: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Schema is at version {LATEST_VERSION}.")
+
+
+if __name__ == "__main__":
+    main()
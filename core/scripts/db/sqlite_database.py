@@ -0,0 +1,741 @@
+import json
+import sqlite3
+import datetime
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any
+
+from .database import (
+    BLOCKED_FIELDS,
+    BULK_CHUNK_SIZE,
+    DAILY_RETENTION_DAYS,
+    DEFAULT_PLAN,
+    QUIET_FIELDS,
+    RESET_FIELDS,
+    RESET_UNSET_FIELDS,
+    SERVER_STATS_ID,
+    BulkResult,
+    _membership_increments,
+    _named_users,
+    _notify_bulk,
+    _reset_modifies,
+    _restarted_archive_clock,
+    chunked,
+    compute_expires_at,
+    stamped,
+)
+from .events import USER_ADDED, USER_CHANGED, USER_DELETED, notify
+from .user_cache import UserCache
+
+SQLITE_BUSY_TIMEOUT_MS = 5000
+USER_DATETIME_FIELDS = ("expires_at", "blocked_at", "archived_at", "restored_at", "updated_at")
+BUCKET_DATETIME_FIELDS = ("day", "expire_at")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    doc TEXT NOT NULL,
+    password TEXT GENERATED ALWAYS AS (json_extract(doc, '$.password')) VIRTUAL,
+    plan TEXT GENERATED ALWAYS AS (coalesce(json_extract(doc, '$.plan'), 'standard')) VIRTUAL,
+    status TEXT GENERATED ALWAYS AS (json_extract(doc, '$.status')) VIRTUAL,
+    blocked INTEGER GENERATED ALWAYS AS (coalesce(json_extract(doc, '$.blocked'), 0)) VIRTUAL,
+    online_count INTEGER GENERATED ALWAYS AS (coalesce(json_extract(doc, '$.online_count'), 0)) VIRTUAL,
+    expires_at TEXT GENERATED ALWAYS AS (json_extract(doc, '$.expires_at')) VIRTUAL,
+    total_bytes INTEGER GENERATED ALWAYS AS (json_extract(doc, '$.total_bytes')) VIRTUAL,
+    max_download_bytes INTEGER GENERATED ALWAYS AS (json_extract(doc, '$.max_download_bytes')) VIRTUAL
+);
+CREATE INDEX IF NOT EXISTS users_password ON users (password);
+CREATE INDEX IF NOT EXISTS users_expires_at ON users (expires_at) WHERE expires_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS users_total_bytes ON users (total_bytes) WHERE total_bytes > 0;
+CREATE INDEX IF NOT EXISTS users_online ON users (online_count) WHERE online_count > 0 OR status = 'Online';
+CREATE INDEX IF NOT EXISTS users_blocked_at ON users (json_extract(doc, '$.blocked_at'))
+    WHERE json_extract(doc, '$.blocked_at') IS NOT NULL;
+CREATE INDEX IF NOT EXISTS users_updated_at ON users (json_extract(doc, '$.updated_at'))
+    WHERE json_extract(doc, '$.updated_at') IS NOT NULL;
+
+CREATE TABLE IF NOT EXISTS users_archive (
+    id TEXT PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS traffic_history (
+    id TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    day TEXT NOT NULL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS traffic_history_username_day ON traffic_history (username, day);
+CREATE INDEX IF NOT EXISTS traffic_history_day ON traffic_history (day);
+
+CREATE TABLE IF NOT EXISTS server_stats (
+    id TEXT PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+"""
+
+
+@dataclass
+class WriteResult:
+    """The subset of pymongo's write results the panel reads."""
+    matched_count: int = 0
+    modified_count: int = 0
+    deleted_count: int = 0
+    inserted_id: Any = None
+
+
+def _json_default(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode(doc):
+    return json.dumps(doc, default=_json_default, separators=(",", ":"))
+
+
+def _decode(text, datetime_fields=USER_DATETIME_FIELDS):
+    doc = json.loads(text)
+    for field in datetime_fields:
+        value = doc.get(field)
+        if isinstance(value, str):
+            try:
+                doc[field] = datetime.datetime.fromisoformat(value)
+            except ValueError:
+                pass
+    return doc
+
+
+def _timestamp(value):
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+
+def _project(doc, projection):
+    """Applies a MongoDB-style inclusion or exclusion projection to a decoded document."""
+    if not projection:
+        return doc
+    fields = {field: wanted for field, wanted in projection.items() if field != "_id"}
+    if not any(fields.values()) and (fields or not projection["_id"]):
+        return {key: value for key, value in doc.items() if key not in projection}
+    return {key: value for key, value in doc.items()
+            if fields.get(key) or (key == "_id" and projection.get("_id", 1))}
+
+
+def _where(filter):
+    """
+    Translates the subset of MongoDB filters the panel uses on users into SQL:
+    equality, $ne and $in on top-level fields (including _id).
+    """
+    clauses, params = ["1"], []
+    for field, condition in (filter or {}).items():
+        if field.startswith("$"):
+            raise ValueError(f"SQLite backend does not support {field!r} filters")
+        column = "id" if field == "_id" else "json_extract(doc, ?)"
+        column_params = [] if field == "_id" else [f"$.{field}"]
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator == "$eq":
+                clauses.append(f"{column} IS ?")
+                params.extend(column_params + [_timestamp(value)])
+            elif operator == "$ne":
+                clauses.append(f"{column} IS NOT ?")
+                params.extend(column_params + [_timestamp(value)])
+            elif operator == "$in":
+                clauses.append(f"{column} IN (SELECT value FROM json_each(?))")
+                params.extend(column_params + [_encode(list(value))])
+            else:
+                raise ValueError(f"SQLite backend does not support {operator!r} on {field!r}")
+    return " AND ".join(clauses), params
+
+
+def _inc_path(doc, path, delta):
+    *parents, leaf = path.split(".")
+    for key in parents:
+        doc = doc.setdefault(key, {})
+    doc[leaf] = doc.get(leaf, 0) + delta
+
+
+def _apply_changes(doc, set_fields=None, inc_fields=None, unset_fields=()):
+    """Applies $set/$inc/$unset style changes in place; dotted $inc paths create nested documents."""
+    for field, value in (set_fields or {}).items():
+        doc[field] = value
+    for path, delta in (inc_fields or {}).items():
+        _inc_path(doc, path, delta)
+    for field in unset_fields:
+        doc.pop(field, None)
+
+
+def _absorbed(doc, seq):
+    """True if `doc` already absorbed traffic spool entry `seq`."""
+    return seq is not None and doc.get("last_traffic_seq") is not None and doc["last_traffic_seq"] >= seq
+
+
+class SQLiteDatabase:
+    '''
+    Embedded storage backend with the same methods and results as `Database`,
+    for single-server installs that would rather not run MongoDB.
+
+    Each document is stored whole as JSON; the fields the panel filters on
+    (password, expiry, usage, online state) are exposed as generated columns
+    with their own indexes. The file runs in WAL mode, so the CLI scripts,
+    the collector and the web services read concurrently while one of them
+    writes. Connections are per thread.
+    '''
+
+    backend = "sqlite"
+
+    def __init__(self, path, cache=None):
+        self.path = str(path)
+        self.cache = cache if cache is not None else UserCache()
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    @property
+    def connection(self):
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = conn
+            self._ensure_schema(conn)
+        return conn
+
+    def _ensure_schema(self, conn):
+        with self._schema_lock:
+            if not self._schema_ready:
+                conn.executescript(SCHEMA)
+                self._schema_ready = True
+
+    @contextmanager
+    def _write(self):
+        """Runs the block in one IMMEDIATE transaction so read-modify-write cycles cannot interleave."""
+        conn = self.connection
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _select_users(self, where="1", params=(), conn=None):
+        rows = (conn or self.connection).execute(f"SELECT doc FROM users WHERE {where}", params)
+        return [_decode(text) for text, in rows]
+
+    def _load_user(self, conn, username):
+        row = conn.execute("SELECT doc FROM users WHERE id = ?", (username,)).fetchone()
+        return _decode(row[0]) if row else None
+
+    def _store_user(self, conn, doc, stamp=True):
+        """Writes a whole user document, stamping `updated_at` unless `stamp` is false."""
+        if stamp:
+            doc = stamped(doc)
+        conn.execute("INSERT OR REPLACE INTO users (id, doc) VALUES (?, ?)", (doc["_id"], _encode(doc)))
+
+    def cache_stats(self):
+        return self.cache.stats()
+
+    def ping(self):
+        self.connection.execute("SELECT 1")
+
+    def add_user(self, user_data):
+        username = user_data.pop('username', None)
+        if not username:
+            raise ValueError("Username is required")
+
+        user_data['_id'] = username.lower()
+        user_data['updated_at'] = datetime.datetime.now()
+        with self._write() as conn:
+            if conn.execute("SELECT 1 FROM users_archive WHERE id = ?", (user_data['_id'],)).fetchone():
+                return None
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO users (id, doc) VALUES (?, ?)", (user_data['_id'], _encode(user_data))
+            ).rowcount
+            if not inserted:
+                return None
+            self._adjust_server_stats(conn, _membership_increments([user_data], 1))
+        notify(self.cache, USER_ADDED, [user_data['_id']])
+        return WriteResult(inserted_id=user_data['_id'])
+
+    def add_users(self, users):
+        """Inserts prepared user documents (with `_id` set); existing usernames are skipped."""
+        inserted = []
+        with self._write() as conn:
+            for user in users:
+                user["updated_at"] = datetime.datetime.now()
+                if conn.execute("INSERT OR IGNORE INTO users (id, doc) VALUES (?, ?)",
+                                (user["_id"], _encode(user))).rowcount:
+                    inserted.append(user)
+            self._adjust_server_stats(conn, _membership_increments(inserted, 1))
+        notify(self.cache, USER_ADDED, [user["_id"] for user in users])
+        return WriteResult(matched_count=len(inserted))
+
+    def get_user(self, username):
+        username = username.lower()
+        user = self.cache.get(username)
+        if user is None:
+            user = self._load_user(self.connection, username)
+            if user is not None:
+                self.cache.put(user)
+        return user
+
+    def iter_users(self, fields=None, filter=None, batch_size=1000):
+        """
+        Streams users in batches of `batch_size`. `filter` supports equality,
+        $ne and $in on top-level fields, e.g. {"status": "Online"}.
+        """
+        where, params = _where(filter)
+        projection = {field: 1 for field in fields} if fields is not None else None
+        cursor = self.connection.execute(f"SELECT doc FROM users WHERE {where}", params)
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for text, in rows:
+                    yield _project(_decode(text), projection)
+        finally:
+            cursor.close()
+
+    def get_all_users(self):
+        return list(self.iter_users())
+
+    def get_user_by_password(self, password, projection=None):
+        """See `Database.get_user_by_password`; cached the same way."""
+        user = self.cache.get_by_password(password)
+        if user is None:
+            users = self._select_users("password = ? LIMIT 1", (password,))
+            user = users[0] if users else None
+            if user is not None:
+                self.cache.put(user)
+        return user
+
+    def get_users_by_names(self, usernames, projection=None):
+        names = json.dumps([u.lower() for u in usernames])
+        users = self._select_users("id IN (SELECT value FROM json_each(?))", (names,))
+        return [_project(user, projection) for user in users]
+
+    def get_users_for_traffic(self, usernames, fields=None):
+        """See `Database.get_users_for_traffic`."""
+        projection = {field: 1 for field in fields} if fields is not None else None
+        users = self._select_users(
+            "id IN (SELECT value FROM json_each(?)) OR online_count > 0 OR status = 'Online'",
+            (json.dumps(list(usernames)),),
+        )
+        return [_project(user, projection) for user in users]
+
+    def ensure_user_indexes(self):
+        self._ensure_schema(self.connection)
+
+    def iter_users_updated_since(self, since, fields=None, batch_size=1000):
+        """Streams the users written after `since`, by their `updated_at` stamp."""
+        projection = {field: 1 for field in fields} if fields is not None else None
+        cursor = self.connection.execute(
+            "SELECT doc FROM users WHERE json_extract(doc, '$.updated_at') > ?", (_timestamp(since),)
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for text, in rows:
+                    yield _project(_decode(text), projection)
+        finally:
+            cursor.close()
+
+    def find_expired_users(self, now, projection=None):
+        """Returns unblocked users whose `expires_at` is at or before `now`."""
+        users = self._select_users("expires_at <= ? AND blocked = 0", (_timestamp(now),))
+        return [_project(user, projection) for user in users]
+
+    def find_over_quota_users(self, projection=None):
+        """Returns unblocked users whose `total_bytes` reached `max_download_bytes`."""
+        users = self._select_users(
+            "total_bytes > 0 AND max_download_bytes > 0 AND blocked = 0 AND total_bytes >= max_download_bytes"
+        )
+        return [_project(user, projection) for user in users]
+
+    def get_expiry_schedule(self):
+        """Returns (username, expires_at) for every unblocked user that has an expiry instant."""
+        rows = self.connection.execute(
+            "SELECT id, expires_at FROM users WHERE expires_at IS NOT NULL AND blocked = 0"
+        )
+        return [(username, datetime.datetime.fromisoformat(expires_at)) for username, expires_at in rows]
+
+    def get_user_expiry(self, username):
+        """Returns the user's expires_at, or None if they are missing, blocked or never expire."""
+        user = self._load_user(self.connection, username.lower())
+        if not user or user.get("blocked"):
+            return None
+        return user.get("expires_at")
+
+    def block_if_expired(self, username, now):
+        """Blocks the user only if they are still unblocked and past expires_at; returns True if blocked."""
+        with self._write() as conn:
+            user = self._load_user(conn, username.lower())
+            expires_at = user.get("expires_at") if user else None
+            if not expires_at or user.get("blocked") or expires_at > now:
+                return False
+            _apply_changes(user, dict(BLOCKED_FIELDS, blocked_at=now))
+            self._store_user(conn, user)
+        notify(self.cache, USER_CHANGED, [username])
+        return True
+
+    def backfill_enforcement_fields(self, query=None):
+        """
+        Derives `total_bytes` and `expires_at` for every user, or only for
+        `{"_id": {"$in": [...]}}` when a query is given.
+        """
+        modified = 0
+        with self._write() as conn:
+            if query:
+                users = self._select_users("id IN (SELECT value FROM json_each(?))",
+                                           (json.dumps(query["_id"]["$in"]),), conn)
+            else:
+                users = self._select_users(conn=conn)
+            for user in users:
+                user["total_bytes"] = (user.get("upload_bytes") or 0) + (user.get("download_bytes") or 0)
+                user["expires_at"] = compute_expires_at(user.get("account_creation_date"), user.get("expiration_days"))
+                self._store_user(conn, user)
+                modified += 1
+        notify(self.cache, USER_CHANGED, _named_users(query))
+        return WriteResult(matched_count=modified, modified_count=modified)
+
+    def update_user(self, username, updates):
+        with self._write() as conn:
+            user = self._load_user(conn, username.lower())
+            if user is None:
+                return WriteResult()
+            previous_plan = user.get("plan") or DEFAULT_PLAN
+            _apply_changes(user, updates)
+            self._store_user(conn, user)
+            new_plan = updates.get("plan") or DEFAULT_PLAN
+            if "plan" in updates and previous_plan != new_plan:
+                self._adjust_plan_counts(conn, {previous_plan: -1, new_plan: 1})
+        notify(self.cache, USER_CHANGED, [username])
+        return WriteResult(matched_count=1, modified_count=1)
+
+    def upsert_user(self, user_doc):
+        """Creates or overwrites the fields of a prepared user document (with `_id` set)."""
+        with self._write() as conn:
+            user = self._load_user(conn, user_doc["_id"]) or {}
+            user.update(user_doc)
+            self._store_user(conn, user)
+        notify(self.cache, USER_CHANGED, [user_doc["_id"]])
+        return WriteResult(matched_count=1, modified_count=1)
+
+    def put_users(self, users):
+        """Writes whole user documents, replacing any with the same _id; used to copy users between backends."""
+        written = []
+        with self._write() as conn:
+            for user in users:
+                self._store_user(conn, user)
+                written.append(user["_id"])
+        notify(self.cache, USER_CHANGED, written)
+        return WriteResult(matched_count=len(written), modified_count=len(written)) if written else None
+
+    def reset_user(self, username):
+        """See `Database.reset_user`."""
+        with self._write() as conn:
+            user = self._load_user(conn, username.lower())
+            if user is None:
+                return WriteResult()
+            modified = _reset_modifies(user)
+            if modified:
+                self._adjust_server_stats(conn, _membership_increments([user], -1, plans=False))
+                _apply_changes(user, RESET_FIELDS, unset_fields=RESET_UNSET_FIELDS)
+                self._store_user(conn, user)
+        notify(self.cache, USER_CHANGED, [username])
+        return WriteResult(matched_count=1, modified_count=int(modified))
+
+    def rename_user(self, username, new_username):
+        with self._write() as conn:
+            user = self._load_user(conn, username.lower())
+            if not user:
+                return None
+            user["_id"] = new_username.lower()
+            user["updated_at"] = datetime.datetime.now()
+            conn.execute("INSERT INTO users (id, doc) VALUES (?, ?)", (user["_id"], _encode(user)))
+            conn.execute("DELETE FROM users WHERE id = ?", (username.lower(),))
+        notify(self.cache, USER_DELETED, [username])
+        notify(self.cache, USER_ADDED, [new_username])
+        return WriteResult(inserted_id=user["_id"])
+
+    def bulk_apply(self, changes, ordered=False, seq=None, chunk_size=BULK_CHUNK_SIZE):
+        """See `Database.bulk_apply`; each chunk commits in its own transaction."""
+        changes = list(changes)
+        result = BulkResult()
+        try:
+            for chunk in chunked([change for change in changes if change[1] or change[2]], chunk_size):
+                applied = WriteResult()
+                with self._write() as conn:
+                    for username, set_fields, inc_fields in chunk:
+                        user = self._load_user(conn, username.lower())
+                        if user is None or _absorbed(user, seq):
+                            continue
+                        _apply_changes(user, set_fields, inc_fields)
+                        if seq is not None:
+                            user["last_traffic_seq"] = seq
+                        quiet = not inc_fields and set(set_fields or ()) <= QUIET_FIELDS
+                        self._store_user(conn, user, stamp=not quiet)
+                        applied.matched_count += 1
+                        applied.modified_count += 1
+                result.add(applied)
+        finally:
+            _notify_bulk(self.cache, changes)
+        return result
+
+    def update_users_many(self, filter, set_fields):
+        """See `Database.update_users_many`; `filter` is limited to what `_where` translates."""
+        where, params = _where(filter)
+        with self._write() as conn:
+            users = self._select_users(where, params, conn)
+            for user in users:
+                _apply_changes(user, set_fields)
+                self._store_user(conn, user)
+        notify(self.cache, USER_CHANGED, _named_users(filter))
+        return BulkResult().add(WriteResult(matched_count=len(users), modified_count=len(users)))
+
+    def block_users(self, usernames, chunk_size=BULK_CHUNK_SIZE):
+        """See `Database.block_users`."""
+        blocked = dict(BLOCKED_FIELDS, blocked_at=datetime.datetime.now())
+        result = BulkResult()
+        for names in chunked([u.lower() for u in usernames], chunk_size):
+            result.add(self.update_users_many({"_id": {"$in": names}, "blocked": {"$ne": True}}, blocked))
+        return result
+
+    def archive_users(self, older_than, chunk_size=BULK_CHUNK_SIZE):
+        """See `Database.archive_users`; each chunk moves in one transaction."""
+        cutoff = _timestamp(older_than)
+        archived = 0
+        while True:
+            with self._write() as conn:
+                users = self._select_users(
+                    "(blocked = 1 AND json_extract(doc, '$.blocked_at') <= ?)"
+                    " OR (expires_at <= ? AND COALESCE(json_extract(doc, '$.restored_at'), '') <= ?) LIMIT ?",
+                    (cutoff, cutoff, cutoff, chunk_size), conn,
+                )
+                if not users:
+                    return archived
+                now = datetime.datetime.now()
+                for user in users:
+                    conn.execute("INSERT OR REPLACE INTO users_archive (id, doc) VALUES (?, ?)",
+                                 (user["_id"], _encode(dict(user, archived_at=now))))
+                    conn.execute("DELETE FROM users WHERE id = ?", (user["_id"],))
+                self._adjust_server_stats(conn, _membership_increments(users, -1))
+            notify(self.cache, USER_DELETED, [user["_id"] for user in users])
+            archived += len(users)
+
+    def restore_user(self, username):
+        """See `Database.restore_user`."""
+        with self._write() as conn:
+            user = self.get_archived_user(username, conn)
+            if user is None:
+                return None
+            if self._load_user(conn, user["_id"]):
+                raise ValueError(f"User '{user['_id']}' exists and cannot be restored over")
+            user = _restarted_archive_clock(user, datetime.datetime.now())
+            self._store_user(conn, user)
+            conn.execute("DELETE FROM users_archive WHERE id = ?", (user["_id"],))
+            self._adjust_server_stats(conn, _membership_increments([user], 1))
+        notify(self.cache, USER_ADDED, [user["_id"]])
+        return user
+
+    def get_archived_user(self, username, conn=None):
+        row = (conn or self.connection).execute(
+            "SELECT doc FROM users_archive WHERE id = ?", (username.lower(),)
+        ).fetchone()
+        return _decode(row[0]) if row else None
+
+    def iter_archived_users(self, fields=None):
+        projection = {field: 1 for field in fields} if fields is not None else None
+        for text, in self.connection.execute("SELECT doc FROM users_archive"):
+            yield _project(_decode(text), projection)
+
+    def put_archived_users(self, users):
+        """See `Database.put_archived_users`."""
+        written = 0
+        with self._write() as conn:
+            for user in users:
+                conn.execute("INSERT OR REPLACE INTO users_archive (id, doc) VALUES (?, ?)",
+                             (user["_id"], _encode(user)))
+                written += 1
+        return WriteResult(matched_count=written, modified_count=written) if written else None
+
+    def ensure_traffic_history_indexes(self):
+        self._ensure_schema(self.connection)
+
+    def _load_bucket(self, conn, bucket_id):
+        row = conn.execute("SELECT doc FROM traffic_history WHERE id = ?", (bucket_id,)).fetchone()
+        return _decode(row[0], BUCKET_DATETIME_FIELDS) if row else None
+
+    def _store_bucket(self, conn, bucket):
+        conn.execute(
+            "INSERT OR REPLACE INTO traffic_history (id, username, day, doc) VALUES (?, ?, ?, ?)",
+            (bucket["_id"], bucket["username"], _timestamp(bucket["day"]), _encode(bucket)),
+        )
+
+    def record_traffic_buckets(self, samples, when, seq=None, per_node=None):
+        """See `Database.record_traffic_buckets`."""
+        day = datetime.datetime(when.year, when.month, when.day)
+        modified = 0
+        with self._write() as conn:
+            for username, (upload, download) in samples.items():
+                if not upload and not download:
+                    continue
+                bucket_id = f"{username}:{day:%Y-%m-%d}"
+                bucket = self._load_bucket(conn, bucket_id) or {
+                    "_id": bucket_id,
+                    "username": username,
+                    "day": day,
+                    "expire_at": day + datetime.timedelta(days=DAILY_RETENTION_DAYS),
+                }
+                if _absorbed(bucket, seq):
+                    continue
+                increments = {
+                    f"hours.{when.hour}.tx": upload,
+                    f"hours.{when.hour}.rx": download,
+                    "tx": upload,
+                    "rx": download,
+                }
+                for node_name, (node_upload, node_download) in (per_node or {}).get(username, {}).items():
+                    node_key = node_name.replace(".", "_").lstrip("$")
+                    increments[f"nodes.{node_key}.tx"] = node_upload
+                    increments[f"nodes.{node_key}.rx"] = node_download
+                _apply_changes(bucket, {"last_traffic_seq": seq} if seq is not None else None, increments)
+                self._store_bucket(conn, bucket)
+                modified += 1
+        return WriteResult(matched_count=modified, modified_count=modified) if modified else None
+
+    def downsample_traffic_history(self, older_than):
+        """
+        See `Database.downsample_traffic_history`. Also drops buckets past their
+        `expire_at`, which MongoDB leaves to its TTL index.
+        """
+        modified = 0
+        with self._write() as conn:
+            conn.execute("DELETE FROM traffic_history WHERE json_extract(doc, '$.expire_at') <= ?",
+                         (datetime.datetime.now().isoformat(),))
+            rows = conn.execute(
+                "SELECT doc FROM traffic_history WHERE day < ? AND json_extract(doc, '$.hours') IS NOT NULL",
+                (_timestamp(older_than),),
+            ).fetchall()
+            for text, in rows:
+                bucket = _decode(text, BUCKET_DATETIME_FIELDS)
+                peak_hour, peak_bytes = None, 0
+                for hour, slot in bucket.pop("hours").items():
+                    slot_bytes = (slot.get("tx") or 0) + (slot.get("rx") or 0)
+                    if slot_bytes > peak_bytes:
+                        peak_hour, peak_bytes = int(hour), slot_bytes
+                bucket["peak_hour"] = peak_hour
+                bucket["downsampled"] = True
+                self._store_bucket(conn, bucket)
+                modified += 1
+        return WriteResult(matched_count=modified, modified_count=modified)
+
+    def iter_traffic_buckets(self):
+        """Streams every traffic history bucket; used to copy history between backends."""
+        for text, in self.connection.execute("SELECT doc FROM traffic_history"):
+            yield _decode(text, BUCKET_DATETIME_FIELDS)
+
+    def put_traffic_buckets(self, buckets):
+        """Writes whole traffic history buckets, replacing any with the same _id."""
+        written = 0
+        with self._write() as conn:
+            for bucket in buckets:
+                self._store_bucket(conn, bucket)
+                written += 1
+        return WriteResult(matched_count=written, modified_count=written) if written else None
+
+    def get_traffic_history(self, username, start_day, end_day):
+        rows = self.connection.execute(
+            "SELECT doc FROM traffic_history WHERE username = ? AND day >= ? AND day <= ? ORDER BY day",
+            (username.lower(), _timestamp(start_day), _timestamp(end_day)),
+        )
+        return [_decode(text, BUCKET_DATETIME_FIELDS) for text, in rows]
+
+    def _load_stats(self, conn):
+        row = conn.execute("SELECT doc FROM server_stats WHERE id = ?", (SERVER_STATS_ID,)).fetchone()
+        return json.loads(row[0]) if row else {"_id": SERVER_STATS_ID}
+
+    def _store_stats(self, conn, stats):
+        conn.execute("INSERT OR REPLACE INTO server_stats (id, doc) VALUES (?, ?)", (SERVER_STATS_ID, _encode(stats)))
+
+    def update_server_stats(self, upload_bytes=0, download_bytes=0, online_users=None, seq=None):
+        """Adds traffic deltas to the server-wide totals and records the current online count."""
+        with self._write() as conn:
+            stats = self._load_stats(conn)
+            if _absorbed(stats, seq):
+                return None
+            set_fields = {}
+            if online_users is not None:
+                set_fields["online_users"] = online_users
+            if seq is not None:
+                set_fields["last_traffic_seq"] = seq
+            _apply_changes(stats, set_fields, {"upload_bytes": upload_bytes, "download_bytes": download_bytes})
+            self._store_stats(conn, stats)
+        return WriteResult(matched_count=1, modified_count=1)
+
+    def _adjust_plan_counts(self, conn, deltas):
+        return self._adjust_server_stats(conn, {f"plans.{plan}": delta for plan, delta in deltas.items() if delta})
+
+    def _adjust_server_stats(self, conn, increments):
+        if not increments:
+            return None
+        stats = self._load_stats(conn)
+        _apply_changes(stats, inc_fields=increments)
+        self._store_stats(conn, stats)
+        return WriteResult(matched_count=1, modified_count=1)
+
+    def adjust_plan_counts(self, deltas):
+        with self._write() as conn:
+            return self._adjust_plan_counts(conn, deltas)
+
+    def adjust_server_stats(self, increments):
+        with self._write() as conn:
+            return self._adjust_server_stats(conn, increments)
+
+    def rebuild_server_stats(self):
+        """Recomputes the aggregates document from the users table with one GROUP BY."""
+        stats = {"_id": SERVER_STATS_ID, "upload_bytes": 0, "download_bytes": 0, "online_users": 0, "plans": {}}
+        with self._write() as conn:
+            rows = conn.execute(
+                "SELECT plan, count(*), "
+                "sum(coalesce(json_extract(doc, '$.upload_bytes'), 0)), "
+                "sum(coalesce(json_extract(doc, '$.download_bytes'), 0)), "
+                "sum(online_count) "
+                "FROM users GROUP BY plan"
+            ).fetchall()
+            for plan, count, upload, download, online in rows:
+                stats["plans"][plan] = count
+                stats["upload_bytes"] += upload
+                stats["download_bytes"] += download
+                stats["online_users"] += online
+            self._store_stats(conn, stats)
+        return stats
+
+    def put_server_stats(self, stats):
+        with self._write() as conn:
+            self._store_stats(conn, dict(stats, _id=SERVER_STATS_ID))
+
+    def get_server_stats(self):
+        row = self.connection.execute("SELECT doc FROM server_stats WHERE id = ?", (SERVER_STATS_ID,)).fetchone()
+        if row is None:
+            return self.rebuild_server_stats()
+        return json.loads(row[0])
+
+    def delete_user(self, username):
+        return self.delete_users([username.lower()])
+
+    def delete_users(self, usernames):
+        names = json.dumps(list(usernames))
+        with self._write() as conn:
+            users = self._select_users("id IN (SELECT value FROM json_each(?))", (names,), conn)
+            deleted = conn.execute("DELETE FROM users WHERE id IN (SELECT value FROM json_each(?))", (names,)).rowcount
+            if deleted:
+                self._adjust_server_stats(conn, _membership_increments(users, -1))
+        notify(self.cache, USER_DELETED, usernames)
+        return WriteResult(deleted_count=deleted)
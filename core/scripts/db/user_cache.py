@@ -0,0 +1,95 @@
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+
+class UserCache:
+    '''
+    Bounded LRU of user documents with a time-to-live, keyed by username and
+    reachable by password.
+
+    Writes made through the owning Database invalidate their users at once;
+    writes from other processes (the CLI scripts) become visible within `ttl`
+    seconds. Callers get copies, so mutating a returned document never
+    changes the cached one. A `maxsize` of 0 disables caching.
+    '''
+
+    def __init__(self, maxsize: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._users: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._by_password: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, username: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._users.get(username)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(username)
+                self.misses += 1
+                return None
+            self._users.move_to_end(username)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def get_by_password(self, password: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            username = self._by_password.get(password)
+        if username is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        return self.get(username)
+
+    def put(self, user: Dict[str, Any]):
+        if not self.maxsize:
+            return
+        username = user["_id"]
+        with self._lock:
+            self._remove(username)
+            self._users[username] = (time.monotonic() + self.ttl, copy.deepcopy(user))
+            if user.get("password"):
+                self._by_password[user["password"]] = username
+            while len(self._users) > self.maxsize:
+                self._remove(next(iter(self._users)))
+                self.evictions += 1
+
+    def invalidate(self, usernames: Iterable[str]):
+        with self._lock:
+            for username in usernames:
+                self._remove(username.lower())
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+            self._by_password.clear()
+
+    def _remove(self, username: str):
+        entry = self._users.pop(username, None)
+        if entry is not None:
+            password = entry[1].get("password")
+            if password and self._by_password.get(password) == username:
+                del self._by_password[password]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._users),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -7,7 +7,8 @@ import subprocess
 import re
 import argparse
 from datetime import datetime
-from db.database import db
+from db.database import db, connection_error, compute_expires_at
+import collector_client
 
 def add_user(
     username,
@@ -20,8 +21,9 @@ def add_user(
     max_ips=0,
     plan="standard",  # новый параметр тарифа
 ):
-    if db is None:
-        print("Error: Database connection failed. Please ensure MongoDB is running and configured.")
+    error = connection_error()
+    if error:
+        print(f"Error: {error}")
         return 1
 
     username_lower = username.lower()
@@ -63,6 +65,7 @@ def add_user(
             "unlimited_user": unlimited_user,
             "status": "On-hold",
             "max_ips": max_ips,
+            "total_bytes": 0,
             # тариф пользователя
             "plan": plan or "standard",
         }
@@ -77,12 +80,15 @@ def add_user(
             try:
                 datetime.strptime(creation_date, "%Y-%m-%d")
                 user_data["account_creation_date"] = creation_date
+                user_data["expires_at"] = compute_expires_at(creation_date, expiration_days)
             except ValueError:
                 print("Invalid date. Please provide a valid date in YYYY-MM-DD format.")
                 return 1
 
         result = db.add_user(user_data)
         if result:
+            if "expires_at" in user_data:
+                collector_client.reschedule_expiry(username_lower)
             print(f"User {username} added successfully.")
             return 0
         else:
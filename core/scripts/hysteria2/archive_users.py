@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+
+import init_paths
+import sys
+import argparse
+import datetime
+from db.database import db, connection_error, ARCHIVE_AFTER_DAYS
+from json_stream import dump_array
+import collector_client
+
+
+def archive_users(days):
+    if days <= 0:
+        return 1, "Error: --days must be a positive number."
+    older_than = datetime.datetime.now() - datetime.timedelta(days=days)
+    archived = db.archive_users(older_than)
+    return 0, f"{archived} user(s) blocked or expired for more than {days} days moved to the archive."
+
+
+def restore_users(usernames):
+    restored, missing = [], []
+    for username in usernames:
+        try:
+            user = db.restore_user(username)
+        except ValueError as e:
+            return 1, f"Error: {e}."
+        (restored if user else missing).append(username)
+
+    if restored:
+        collector_client.reschedule_expiry(*restored)
+    if missing:
+        return 1, f"Error: not in the archive: {', '.join(missing)}."
+    return 0, (f"{len(restored)} user(s) restored. They are still blocked; edit or reset them "
+               f"within {ARCHIVE_AFTER_DAYS} days to reactivate, or they will be archived again.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move long-inactive users to the archive and back.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    archive_parser = subparsers.add_parser('archive', help='Archive users blocked or expired for a while.')
+    archive_parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                                help=f'Minimum days since blocking or expiry (default: {ARCHIVE_AFTER_DAYS}).')
+
+    restore_parser = subparsers.add_parser('restore', help='Move archived users back to the live user list.')
+    restore_parser.add_argument('usernames', nargs='+')
+
+    subparsers.add_parser('list', help='Print archived users as JSON.')
+    args = parser.parse_args()
+
+    error = connection_error()
+    if error:
+        print(f"Error: {error}")
+        sys.exit(1)
+
+    try:
+        if args.command == 'list':
+            dump_array(db.iter_archived_users(), default=str)
+            sys.exit(0)
+        if args.command == 'archive':
+            exit_code, message = archive_users(args.days)
+        else:
+            exit_code, message = restore_users([username.lower() for username in args.usernames])
+    except Exception as e:
+        exit_code, message = 1, f"An error occurred: {e}"
+
+    print(message)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,74 +1,197 @@
 import json
 import os
+import time
 import asyncio
+import logging
 from datetime import datetime, timedelta
+from types import MappingProxyType
+from typing import NamedTuple
 from aiohttp import web
-import aiofiles
 from init_paths import *
-from paths import *
+from db.database import db, compute_expires_at
+from db import events
 
-users_data = {}
-users_lock = asyncio.Lock()
+REFRESH_INTERVAL = float(os.getenv("AUTH_REFRESH_SECONDS", "3"))
+FULL_RELOAD_INTERVAL = float(os.getenv("AUTH_FULL_RELOAD_SECONDS", "300"))
+# Writes stamped just before a refresh may commit just after it; re-reading this window catches them.
+WATERMARK_OVERLAP = timedelta(seconds=2)
+AUTH_FIELDS = [
+    "password",
+    "blocked",
+    "expiration_days",
+    "account_creation_date",
+    "max_download_bytes",
+    "upload_bytes",
+    "download_bytes",
+]
 
-async def load_users(app):
+logger = logging.getLogger(__name__)
+
+
+class Verdict(NamedTuple):
+    """
+    Everything /auth needs to judge a user, worked out when the record is
+    read rather than on every handshake. `allowed_until` is the epoch second
+    the account expires at (0: never); expiry needs no recomputation, since
+    each request compares it against the clock.
+    """
+    password: str
+    blocked: bool
+    allowed_until: int
+    quota_exhausted: bool
+
+
+def verdict(user):
+    expires_at = compute_expires_at(user.get("account_creation_date"), user.get("expiration_days"))
+    max_bytes = user.get("max_download_bytes") or 0
+    used = (user.get("upload_bytes") or 0) + (user.get("download_bytes") or 0)
+    return Verdict(
+        password=user.get("password"),
+        blocked=bool(user.get("blocked", False)),
+        allowed_until=int(expires_at.timestamp()) if expires_at else 0,
+        quota_exhausted=max_bytes > 0 and used >= max_bytes,
+    )
+
+
+# The live verdict table, copy-on-write: requests read whichever snapshot the name is
+# bound to, without a lock, and a refresh never changes a published snapshot
+# but builds the next one and rebinds the name.
+users_data = MappingProxyType({})
+
+
+def fetch_all_users():
+    """Reads every user into a fresh verdict table; the basis of a full index rebuild."""
+    return {user["_id"]: verdict(user) for user in db.iter_users(AUTH_FIELDS)}
+
+
+def fetch_changed_users(since, usernames):
+    """
+    Reads the users written after `since`, plus the named users, whose
+    deletion, rename or archiving leaves no `updated_at` to find.
+    Returns (verdicts of the changed users by name, names that no longer exist).
+    """
+    changed = {user["_id"]: verdict(user) for user in db.iter_users_updated_since(since, AUTH_FIELDS)}
+    wanted = set(usernames) - changed.keys()
+    if wanted:
+        projection = {field: 1 for field in AUTH_FIELDS}
+        changed.update((user["_id"], verdict(user)) for user in db.get_users_by_names(list(wanted), projection))
+    return changed, wanted - changed.keys()
+
+
+def swap_users(index):
+    """Publishes `index` as the new snapshot; requests already holding the old one finish on it."""
     global users_data
-    async with users_lock:
-        if os.path.exists(USERS_FILE):
-            try:
-                async with aiofiles.open(USERS_FILE, 'r') as f:
-                    content = await f.read()
-                    users_data = json.loads(content)
-            except (IOError, json.JSONDecodeError):
-                users_data = {}
-        else:
-            users_data = {}
-    app['users_data'] = users_data
+    users_data = MappingProxyType(index)
+
+
+async def refresh_users(app):
+    """
+    Keeps `users_data` in step with the database: every REFRESH_INTERVAL (or
+    as soon as another process announces a change) it fetches only the users
+    written since the last pass, builds the next index beside the live one
+    and swaps it in. A full rebuild every FULL_RELOAD_INTERVAL catches changes
+    whose announcement was missed. Failures keep the current index.
+    """
+    watermark = app['users_watermark']
+    last_full_reload = time.monotonic()
+    wake = app['users_wake']
+    while True:
+        try:
+            await asyncio.wait_for(wake.wait(), REFRESH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        wake.clear()
+        pending, app['users_pending'] = app['users_pending'], set()
+
+        started = datetime.now()
+        try:
+            if watermark is None or None in pending or time.monotonic() - last_full_reload >= FULL_RELOAD_INTERVAL:
+                index = await asyncio.to_thread(fetch_all_users)
+                last_full_reload = time.monotonic()
+            else:
+                changed, removed = await asyncio.to_thread(fetch_changed_users, watermark, pending)
+                if not changed and not removed:
+                    watermark = started - WATERMARK_OVERLAP
+                    continue
+                index = dict(users_data)
+                index.update(changed)
+                for username in removed:
+                    index.pop(username, None)
+        except Exception:
+            logger.exception("Refreshing the user index failed; keeping the current one")
+            app['users_pending'] |= pending
+            continue
+
+        swap_users(index)
+        watermark = started - WATERMARK_OVERLAP
+
+
+async def load_users(app):
+    started = datetime.now()
+    try:
+        swap_users(await asyncio.to_thread(fetch_all_users))
+        app['users_watermark'] = started - WATERMARK_OVERLAP
+    except Exception:
+        logger.exception("Loading users failed; retrying on the next refresh")
+        app['users_watermark'] = None
+
+
+async def follow_users(app):
+    """Loads the index, then refreshes it in the background, woken early by change events."""
+    loop = asyncio.get_running_loop()
+    app['users_wake'] = asyncio.Event()
+    app['users_pending'] = set()
+
+    def on_change(event):
+        if event.get("event") in events.USER_EVENTS:
+            app['users_pending'].update(event["usernames"] if event.get("usernames") is not None else [None])
+            app['users_wake'].set()
+
+    def on_event(event):
+        loop.call_soon_threadsafe(on_change, event)
+
+    await load_users(app)
+    subscription = events.Subscription(on_event, "auth").start()
+    events.start_change_stream(db, on_event)
+    task = asyncio.create_task(refresh_users(app))
+    yield
+    task.cancel()
+    subscription.close()
+
 
 async def authenticate(request):
-    global users_data
     try:
         data = await request.json()
         auth_str = data.get("auth")
         if not auth_str:
             return web.json_response({"ok": False, "msg": "Auth field missing"}, status=400)
-        
+
         username, password = auth_str.split(":", 1)
     except (json.JSONDecodeError, ValueError, TypeError):
         return web.json_response({"ok": False, "msg": "Invalid request format"}, status=400)
 
-    async with users_lock:
-        user = users_data.get(username)
-
-        if not user:
-            return web.json_response({"ok": False, "msg": "User not found"}, status=401)
-
-        if user.get("blocked", False):
-            return web.json_response({"ok": False, "msg": "User is blocked"}, status=401)
-
-        if user.get("password") != password:
-            return web.json_response({"ok": False, "msg": "Invalid password"}, status=401)
-        
-        expiration_days = user.get("expiration_days", 0)
-        if expiration_days > 0:
-            creation_date_str = user.get("account_creation_date")
-            if creation_date_str:
-                creation_date = datetime.strptime(creation_date_str, "%Y-%m-%d")
-                expiration_date = creation_date + timedelta(days=expiration_days)
-                if datetime.now() >= expiration_date:
-                    return web.json_response({"ok": False, "msg": "Account expired"}, status=401)
-
-        max_bytes = user.get("max_download_bytes", 0)
-        if max_bytes > 0:
-            current_up = user.get("upload_bytes", 0)
-            current_down = user.get("download_bytes", 0)
-            if (current_up + current_down) >= max_bytes:
-                return web.json_response({"ok": False, "msg": "Data limit exceeded"}, status=401)
+    user = users_data.get(username)
+
+    if not user:
+        return web.json_response({"ok": False, "msg": "User not found"}, status=401)
+
+    if user.blocked:
+        return web.json_response({"ok": False, "msg": "User is blocked"}, status=401)
+
+    if user.password != password:
+        return web.json_response({"ok": False, "msg": "Invalid password"}, status=401)
+
+    if user.allowed_until and time.time() >= user.allowed_until:
+        return web.json_response({"ok": False, "msg": "Account expired"}, status=401)
+
+    if user.quota_exhausted:
+        return web.json_response({"ok": False, "msg": "Data limit exceeded"}, status=401)
 
     return web.json_response({"ok": True, "id": username})
 
 app = web.Application()
 app.router.add_post("/auth", authenticate)
-app.on_startup.append(load_users)
+app.cleanup_ctx.append(follow_users)
 
 if __name__ == "__main__":
-    web.run_app(app, host="0.0.0.0", port=28262)
\ No newline at end of file
+    web.run_app(app, host="0.0.0.0", port=28262)
@@ -6,7 +6,7 @@ import os
 import subprocess
 import argparse
 import re
-from db.database import db
+from db.database import db, connection_error
 
 def add_bulk_users(
     traffic_gb,
@@ -18,8 +18,9 @@ def add_bulk_users(
     max_ips=0,
     plan="standard",  # новый параметр тарифа
 ):
-    if db is None:
-        print("Ошибка: Подключение к базе данных не удалось. Убедитесь, что MongoDB запущен.")
+    error = connection_error()
+    if error:
+        print(f"Ошибка: {error}")
         return 1
         
     try:
@@ -37,7 +38,7 @@ def add_bulk_users(
         potential_usernames.append(username.lower())
 
     try:
-        existing_docs = db.collection.find({"_id": {"$in": potential_usernames}}, {"_id": 1})
+        existing_docs = db.get_users_by_names(potential_usernames, {"_id": 1})
         existing_users_set = {doc['_id'] for doc in existing_docs}
     except Exception as e:
         print(f"Ошибка запроса к базе данных: {e}")
@@ -75,13 +76,14 @@ def add_bulk_users(
             "unlimited_user": unlimited_user,
             "status": "On-hold",
             "max_ips": int(max_ips),
+            "total_bytes": 0,
             # тариф пользователя
             "plan": plan or "standard",
         }
         users_to_insert.append(user_doc)
 
     try:
-        db.collection.insert_many(users_to_insert, ordered=False)
+        db.add_users(users_to_insert)
         print(f"\nУспешно добавлено {len(users_to_insert)} новых пользователей.")
         return 0
     except Exception as e:
@@ -6,7 +6,8 @@ import os
 import argparse
 import re
 from datetime import datetime
-from db.database import db
+from db.database import db, connection_error, compute_expires_at
+import collector_client
 
 def edit_user(
     username,
@@ -21,8 +22,9 @@ def edit_user(
     max_ips=None,
     new_plan=None,  # новый параметр тарифа
 ):
-    if db is None:
-        print("Error: Database connection failed.", file=sys.stderr)
+    error = connection_error()
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
         return 1
 
     username_lower = username.lower()
@@ -54,6 +56,7 @@ def edit_user(
             
     if blocked is not None:
         updates['blocked'] = blocked
+        updates['blocked_at'] = datetime.now() if blocked else None
 
     if unlimited_user is not None:
         updates['unlimited_user'] = unlimited_user
@@ -67,10 +70,18 @@ def edit_user(
     # смена тарифа пользователя
     if new_plan is not None:
         updates['plan'] = new_plan
+
+    if 'expiration_days' in updates or 'account_creation_date' in updates:
+        updates['expires_at'] = compute_expires_at(
+            updates.get('account_creation_date', user_data.get('account_creation_date')),
+            updates.get('expiration_days', user_data.get('expiration_days', 0)),
+        )
         
     try:
         if updates:
             db.update_user(username_lower, updates)
+            if 'expires_at' in updates or 'blocked' in updates:
+                collector_client.reschedule_expiry(username_lower)
             print(f"User '{username}' attributes updated successfully.")
 
         if new_username and new_username.lower() != username_lower:
@@ -79,13 +90,8 @@ def edit_user(
                 print(f"Error: Target username '{new_username}' already exists.", file=sys.stderr)
                 return 1
             
-            updated_user_data = db.get_user(username_lower)
-            
-            updated_user_data.pop('_id')
-            updated_user_data['_id'] = new_username_lower
-
-            db.collection.insert_one(updated_user_data)
-            db.delete_user(username_lower)
+            db.rename_user(username_lower, new_username_lower)
+            collector_client.reschedule_expiry(username_lower, new_username_lower)
             print(f"User '{username}' successfully renamed to '{new_username}'.")
 
         elif not updates and not (new_username and new_username.lower() != username_lower):
@@ -5,7 +5,7 @@ import json
 import sys
 import os
 import getopt
-from db.database import db
+from db.database import db, connection_error
 
 def get_user_info(username):
     """
@@ -17,14 +17,15 @@ def get_user_info(username):
     Returns:
         int: 0 on success, 1 on failure.
     """
-    if db is None:
-        print("Error: Database connection failed. Please ensure MongoDB is running.")
+    error = connection_error()
+    if error:
+        print(f"Error: {error}")
         return 1
         
     try:
         user_info = db.get_user(username)
         if user_info:
-            print(json.dumps(user_info, indent=4))
+            print(json.dumps(user_info, indent=4, default=str))
             return 0
         else:
             print(f"User '{username}' not found in the database.")
@@ -98,6 +98,10 @@ install_hysteria() {
     if ! check_scheduler_service; then
         setup_hysteria_scheduler
     fi
+
+    if ! check_traffic_collector_service; then
+        setup_hysteria_traffic_collector
+    fi
 }
 
 if systemctl is-active --quiet hysteria-server.service; then
@@ -7,9 +7,8 @@ import json
 import fcntl
 import datetime
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from db.database import db
-from hysteria2_api import Hysteria2Client
+from db.database import db, connection_error
+from hysteria2_client import Hysteria2Client
 from paths import CONFIG_FILE
 
 logging.basicConfig(
@@ -21,8 +20,8 @@ logging.basicConfig(
 logger = logging.getLogger()
 
 LOCKFILE = "/tmp/kick.lock"
-MAX_WORKERS = 8
 API_BASE_URL = 'http://127.0.0.1:25413'
+KICK_BATCH_SIZE = 50
 
 def acquire_lock():
     try:
@@ -44,53 +43,33 @@ def get_secret():
 def kick_users_api(usernames, secret):
     try:
         client = Hysteria2Client(base_url=API_BASE_URL, secret=secret)
-        client.kick_clients(usernames)
+        client.kick_clients(usernames, batch_size=KICK_BATCH_SIZE)
         logger.info(f"Successfully sent kick command for users: {', '.join(usernames)}")
     except Exception as e:
         logger.error(f"Error kicking users via API: {e}")
 
-def process_user(user_doc):
-    username = user_doc.get('_id')
-    
-    if not username or user_doc.get('blocked', False):
-        return None
+def find_users_to_block():
+    now = datetime.datetime.now()
+    projection = {'_id': 1}
 
-    account_creation_date = user_doc.get('account_creation_date')
-    if not account_creation_date:
-        return None
+    users_to_block = {}
+    for user_doc in db.find_expired_users(now, projection):
+        logger.info(f"User {user_doc['_id']} is expired.")
+        users_to_block[user_doc['_id']] = True
 
-    should_block = False
+    for user_doc in db.find_over_quota_users(projection):
+        if user_doc['_id'] not in users_to_block:
+            logger.info(f"User {user_doc['_id']} has exceeded their traffic limit.")
+            users_to_block[user_doc['_id']] = True
 
-    try:
-        expiration_days = user_doc.get('expiration_days', 0)
-        if expiration_days > 0:
-            creation_date = datetime.datetime.strptime(account_creation_date, "%Y-%m-%d")
-            expiration_date = creation_date + datetime.timedelta(days=expiration_days)
-            if datetime.datetime.now() >= expiration_date:
-                should_block = True
-                logger.info(f"User {username} is expired.")
-
-        if not should_block:
-            max_download_bytes = user_doc.get('max_download_bytes', 0)
-            if max_download_bytes > 0:
-                total_bytes = user_doc.get('download_bytes', 0) + user_doc.get('upload_bytes', 0)
-                if total_bytes >= max_download_bytes:
-                    should_block = True
-                    logger.info(f"User {username} has exceeded their traffic limit.")
-
-        if should_block:
-            return username
-            
-    except (ValueError, TypeError) as e:
-        logger.error(f"Error processing user {username} due to invalid data: {e}")
-    
-    return None
+    return list(users_to_block)
 
 def main():
     lock_file = acquire_lock()
     try:
-        if db is None:
-            logger.error("Database connection failed. Exiting.")
+        error = connection_error()
+        if error:
+            logger.error(f"{error} Exiting.")
             sys.exit(1)
 
         secret = get_secret()
@@ -98,16 +77,7 @@ def main():
             logger.error(f"Could not find secret in {CONFIG_FILE}. Exiting.")
             sys.exit(1)
             
-        all_users = db.get_all_users()
-        logger.info(f"Loaded {len(all_users)} users from the database for processing.")
-            
-        users_to_block = []
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            future_to_user = {executor.submit(process_user, user_doc): user_doc for user_doc in all_users}
-            for future in future_to_user:
-                result = future.result()
-                if result:
-                    users_to_block.append(result)
+        users_to_block = find_users_to_block()
         
         if not users_to_block:
             logger.info("No users to block or kick.")
@@ -115,14 +85,10 @@ def main():
 
         logger.info(f"Found {len(users_to_block)} users to block: {', '.join(users_to_block)}")
         
-        for username in users_to_block:
-            db.update_user(username, {'blocked': True})
-        logger.info("Successfully updated user statuses to 'blocked' in the database.")
-
-        batch_size = 50 
-        for i in range(0, len(users_to_block), batch_size):
-            batch = users_to_block[i:i + batch_size]
-            kick_users_api(batch, secret)
+        result = db.block_users(users_to_block)
+        logger.info(f"Blocked {result.modified_count} users in the database ({result.chunks} batches).")
+
+        kick_users_api(users_to_block, secret)
                         
     except Exception as e:
         logger.error(f"An unexpected error occurred in main execution: {e}", exc_info=True)
@@ -4,10 +4,11 @@ import argparse
 import json
 import sys
 import os
-from hysteria2_api import Hysteria2Client, Hysteria2Error
+from hysteria2_api import Hysteria2Error
 
 from init_paths import *
 from paths import *
+from hysteria2_client import Hysteria2Client
 
 
 def get_api_secret(config_path: str) -> str:
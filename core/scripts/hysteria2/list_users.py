@@ -3,9 +3,10 @@
 import init_paths
 import sys
 import json
-from pathlib import Path
-from hysteria2_api import Hysteria2Client
-from db.database import db
+from hysteria2_client import Hysteria2Client
+from db.database import db, connection_error
+import presence
+from json_stream import dump_array
 from paths import CONFIG_FILE, API_BASE_URL
 
 def get_secret() -> str | None:
@@ -18,47 +19,51 @@ def get_secret() -> str | None:
     except (json.JSONDecodeError, IOError):
         return None
 
-def get_users_from_db() -> list:
-    if db is None:
-        print("Error: Database connection failed.", file=sys.stderr)
-        return []
+def iter_users_from_db():
+    for user in db.iter_users():
+        user['username'] = user.pop('_id')
+        yield user
+
+def get_online_counts() -> dict[str, int] | None:
+    """Returns {username: connections} for online users, or None if no live source is available."""
+    online_clients = presence.online_clients()
+    if online_clients is not None:
+        return online_clients
+
+    secret = get_secret()
+    if not secret:
+        return None
     try:
-        users = db.get_all_users()
-        for user in users:
-            user['username'] = user.pop('_id')
-        return users
+        client = Hysteria2Client(base_url=API_BASE_URL, secret=secret)
+        return {
+            username: status.connections
+            for username, status in client.get_online_clients().items()
+            if status.is_online
+        }
     except Exception as e:
-        print(f"Error retrieving users from database: {e}", file=sys.stderr)
-        return []
+        print(f"Warning: Could not connect to Hysteria2 API to get online status. {e}", file=sys.stderr)
+        return None
+
+def with_online_counts(users, online_counts: dict[str, int] | None):
+    for user in users:
+        if online_counts is not None:
+            user['online_count'] = online_counts.get(user['username'], 0)
+        else:
+            user.setdefault('online_count', 0)
+        yield user
 
 def main():
-    users_list = get_users_from_db()
-    if not users_list:
+    error = connection_error()
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
         print(json.dumps([], indent=2))
         return
 
-    secret = get_secret()
-
-    if secret:
-        try:
-            client = Hysteria2Client(base_url=API_BASE_URL, secret=secret)
-            online_clients = client.get_online_clients()
-
-            users_dict = {user['username']: user for user in users_list}
-            for username, status in online_clients.items():
-                if status.is_online and username in users_dict:
-                    users_dict[username]['online_count'] = status.connections
-
-            users_list = list(users_dict.values())
-
-        except Exception as e:
-            print(f"Warning: Could not connect to Hysteria2 API to get online status. {e}", file=sys.stderr)
-            pass
-
-    for user in users_list:
-        user.setdefault('online_count', 0)
-
-    print(json.dumps(users_list, indent=2))
+    try:
+        dump_array(with_online_counts(iter_users_from_db(), get_online_counts()), default=str)
+    except Exception as e:
+        print(f"Error retrieving users from database: {e}", file=sys.stderr)
+        sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
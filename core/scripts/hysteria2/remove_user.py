@@ -3,11 +3,13 @@
 import init_paths
 import sys
 import os
-from db.database import db
+from db.database import db, connection_error
+import collector_client
 
 def remove_users(usernames):
-    if db is None:
-        return 1, "Error: Database connection failed. Please ensure MongoDB is running."
+    error = connection_error()
+    if error:
+        return 1, f"Error: {error}"
 
     if not usernames:
         return 1, "Error: No usernames provided for removal."
@@ -16,6 +18,7 @@ def remove_users(usernames):
         result = db.delete_users(usernames)
         
         if result.deleted_count > 0:
+            collector_client.reschedule_expiry(*usernames)
             return 0, f"{result.deleted_count} user(s) removed successfully."
         else:
             return 1, "Error: No matching users found for removal."
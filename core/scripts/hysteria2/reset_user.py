@@ -2,7 +2,8 @@
 
 import init_paths
 import sys
-from db.database import db
+from db.database import db, connection_error
+import collector_client
 
 def reset_user(username):
     """
@@ -14,8 +15,9 @@ def reset_user(username):
     Returns:
         int: 0 on success, 1 on failure.
     """
-    if db is None:
-        print("Error: Database connection failed. Please ensure MongoDB is running.")
+    error = connection_error()
+    if error:
+        print(f"Error: {error}")
         return 1
 
     try:
@@ -24,22 +26,10 @@ def reset_user(username):
             print(f"Error: User '{username}' not found in the database.")
             return 1
 
-        result = db.collection.update_one(
-            {'_id': username},
-            {
-                '$set': {
-                    'status': 'On-hold',
-                    'blocked': False
-                },
-                '$unset': {
-                    'account_creation_date': "",
-                    'download_bytes': "",
-                    'upload_bytes': ""
-                }
-            }
-        )
+        result = db.reset_user(username)
 
         if result.modified_count > 0:
+            collector_client.reschedule_expiry(username)
             print(f"User '{username}' has been reset successfully.")
             return 0
         else:
@@ -10,7 +10,8 @@ import re
 from concurrent.futures import ThreadPoolExecutor
 from functools import lru_cache
 import init_paths
-from db.database import db
+from db.database import db, connection_error
+import presence
 
 
 def convert_bytes(bytes_val: int) -> str:
@@ -172,43 +173,22 @@ async def get_connection_counts() -> tuple[int, int]:
     return parse_connection_counts(tcp_content, udp_content)
 
 
-def get_online_user_count_sync() -> int:
-    if db is None:
-        print("Error: Database connection failed.", file=sys.stderr)
-        return 0
+def get_user_stats_sync() -> dict:
+    error = connection_error()
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        return {}
     try:
-        users = db.get_all_users()
-        total_online = sum(int(user.get("online_count", 0) or 0) for user in users)
-        return total_online
+        return db.get_server_stats()
     except Exception as e:
-        print(f"Error retrieving online user count from database: {e}", file=sys.stderr)
-        return 0
+        print(f"Error retrieving server stats from database: {e}", file=sys.stderr)
+        return {}
 
 
-async def get_online_user_count() -> int:
+async def get_user_stats() -> dict:
     loop = asyncio.get_event_loop()
     with ThreadPoolExecutor() as executor:
-        return await loop.run_in_executor(executor, get_online_user_count_sync)
-
-
-def get_user_traffic_sync() -> tuple[int, int]:
-    if db is None:
-        print("Error: Database connection failed.", file=sys.stderr)
-        return 0, 0
-    try:
-        users = db.get_all_users()
-        total_upload = sum(int(user.get("upload_bytes", 0) or 0) for user in users)
-        total_download = sum(int(user.get("download_bytes", 0) or 0) for user in users)
-        return total_upload, total_download
-    except Exception as e:
-        print(f"Error retrieving user traffic from database: {e}", file=sys.stderr)
-        return 0, 0
-
-
-async def get_user_traffic() -> tuple[int, int]:
-    loop = asyncio.get_event_loop()
-    with ThreadPoolExecutor() as executor:
-        return await loop.run_in_executor(executor, get_user_traffic_sync)
+        return await loop.run_in_executor(executor, get_user_stats_sync)
 
 
 def get_interface_addresses():
@@ -264,8 +244,7 @@ async def main():
         get_uptime_and_boottime(),
         get_memory_usage(),
         get_connection_counts(),
-        get_online_user_count(),
-        get_user_traffic(),
+        get_user_stats(),
         get_cpu_usage(0.1),
         get_network_speed(0.3),
         get_network_stats(),
@@ -277,12 +256,20 @@ async def main():
     uptime_str, boot_time_str = results[0]
     mem_total, mem_used = results[1]
     tcp_connections, udp_connections = results[2]
-    online_users = results[3]
-    user_upload, user_download = results[4]
-    cpu_usage = results[5]
-    download_speed, upload_speed = results[6]
-    reboot_rx, reboot_tx = results[7]
-    ipv4_address, ipv6_address = results[8]
+    user_stats = results[3]
+    cpu_usage = results[4]
+    download_speed, upload_speed = results[5]
+    reboot_rx, reboot_tx = results[6]
+    ipv4_address, ipv6_address = results[7]
+
+    online_clients = presence.online_clients()
+    if online_clients is not None:
+        online_users = sum(online_clients.values())
+    else:
+        online_users = int(user_stats.get("online_users", 0) or 0)
+    user_upload = int(user_stats.get("upload_bytes", 0) or 0)
+    user_download = int(user_stats.get("download_bytes", 0) or 0)
+    plans = user_stats.get("plans") or {}
 
     print(f"🕒 Uptime: {uptime_str} (since {boot_time_str})")
     print(f"🖥️ Server IPv4: {ipv4_address if ipv4_address else 'Not Found'}")
@@ -290,6 +277,7 @@ async def main():
     print(f"📈 CPU Usage: {cpu_usage}%")
     print(f"💻 Used RAM: {mem_used}MB / {mem_total}MB")
     print(f"👥 Online Users: {online_users}")
+    print(f"📋 Users by Plan: {', '.join(f'{plan} {count}' for plan, count in sorted(plans.items())) or 'N/A'}")
     print()
     print(f"🔼 Upload Speed: {convert_speed(upload_speed)}")
     print(f"🔽 Download Speed: {convert_speed(download_speed)}")
@@ -10,7 +10,7 @@ import re
 import qrcode
 from io import StringIO
 from typing import Tuple, Optional, Dict, List, Any
-from db.database import db
+from db.database import db, connection_error
 from paths import *
 
 
@@ -154,8 +154,9 @@ def display_uri_and_qr(uri: str, label: str, args: argparse.Namespace, terminal_
 
 
 def show_uri(args: argparse.Namespace) -> None:
-    if db is None:
-        print("\033[0;31mError:\033[0m Database connection failed.")
+    error = connection_error()
+    if error:
+        print(f"\033[0;31mError:\033[0m {error}")
         return
 
     if not is_service_active("hysteria-server.service"):
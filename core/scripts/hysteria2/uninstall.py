@@ -18,6 +18,7 @@ SERVICES = [
     "hysteria-singbox.service",
     "hysteria-ip-limit.service",
     "hysteria-scheduler.service",
+    "hysteria-traffic-collector.service",
 ]
 
 DB_NAME = "blitz_panel"
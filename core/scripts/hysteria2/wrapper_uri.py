@@ -6,10 +6,13 @@ import sys
 import json
 import argparse
 from functools import lru_cache
-from typing import Dict, List, Any
-from db.database import db
+from typing import Dict, Iterable, Iterator, List, Any
+from db.database import db, connection_error
+from json_stream import dump_array
 from paths import *
 
+USER_FIELDS = ["password"]
+
 
 @lru_cache(maxsize=None)
 def load_json_file(file_path: str) -> Any:
@@ -53,14 +56,16 @@ def generate_uri(username: str, auth_password: str, ip: str, port: str,
     return f"{uri_base}?{query_string}#{fragment_tag}"
 
 
-def process_users(target_usernames: List[str]) -> List[Dict[str, Any]]:
+def process_users(users: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Yields the URIs of each user document (`_id` and `password`) as it is generated."""
     config = load_json_file(CONFIG_FILE)
     if not config:
         print("Error: Could not load Hysteria2 configuration file.", file=sys.stderr)
         sys.exit(1)
 
-    if db is None:
-        print("Error: Database connection failed.", file=sys.stderr)
+    error = connection_error()
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
         sys.exit(1)
 
     nodes = load_json_file(NODES_JSON_PATH) or []
@@ -93,11 +98,10 @@ def process_users(target_usernames: List[str]) -> List[Dict[str, Any]]:
 
     main_label = get_main_node_label()
 
-    results = []
-    for username in target_usernames:
-        user_data = db.get_user(username)
-        if not user_data or "password" not in user_data:
-            results.append({"username": username, "error": "User not found or password not set"})
+    for user_data in users:
+        username = user_data["_id"]
+        if "password" not in user_data:
+            yield {"username": username, "error": "User not found or password not set"}
             continue
 
         auth_password = user_data["password"]
@@ -175,9 +179,7 @@ def process_users(target_usernames: List[str]) -> List[Dict[str, Any]]:
                 f"https://{ns_domain}:{ns_port}/{ns_subpath}/sub/normal/{auth_password}#{username}"
             )
 
-        results.append(user_output)
-
-    return results
+        yield user_output
 
 
 def main():
@@ -188,23 +190,26 @@ def main():
     args = parser.parse_args()
     target_usernames = args.usernames
 
-    if args.all:
-        if db is None:
-            print("Error: Database connection failed.", file=sys.stderr)
-            sys.exit(1)
-        try:
-            all_users_docs = db.get_all_users()
-            target_usernames = [user['_id'] for user in all_users_docs]
-        except Exception as e:
-            print(f"Error retrieving all users from database: {e}", file=sys.stderr)
-            sys.exit(1)
-
-    if not target_usernames:
+    if not args.all and not target_usernames:
         parser.print_help()
         sys.exit(1)
 
-    output_list = process_users(target_usernames)
-    print(json.dumps(output_list, indent=2))
+    error = connection_error()
+    if error:
+        print(f"Error: {error}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.all:
+        users = db.iter_users(USER_FIELDS)
+    else:
+        found = {user["_id"]: user for user in db.get_users_by_names(target_usernames, {"password": 1})}
+        users = (found.get(username.lower(), {"_id": username}) for username in target_usernames)
+
+    try:
+        dump_array(process_users(users))
+    except Exception as e:
+        print(f"Error retrieving users from database: {e}", file=sys.stderr)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from hysteria2_api import Hysteria2Error, Hysteria2AuthError, Hysteria2ConnectionError
+from hysteria2_api.models import TrafficStats, OnlineStatus
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_RETRIES = 2
+RETRY_BACKOFF = 0.2
+POOL_SIZE = 20
+KEEPALIVE_TIMEOUT = 30.0
+KICK_BATCH_SIZE = 50
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHysteria2Client:
+    '''
+    Pooled asyncio client for the Hysteria2 traffic stats API.
+
+    One keep-alive aiohttp session is reused for every call. Each call has a
+    timeout, and failed calls are retried a bounded number of times. Draining
+    the counters (`get_traffic_stats(clear=True)`) is not idempotent, so it is
+    only retried when the connection could not be opened at all.
+    '''
+
+    def __init__(self, base_url: str, secret: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT,
+                 retries: int = DEFAULT_RETRIES, pool_size: int = POOL_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.secret = secret
+        self.timeout = timeout
+        self.retries = retries
+        self.pool_size = pool_size
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            headers = {'Authorization': self.secret} if self.secret else None
+            self._session = aiohttp.ClientSession(
+                headers=headers,
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=KEEPALIVE_TIMEOUT),
+            )
+        return self._session
+
+    async def _request(self, method: str, endpoint: str, *, params: Optional[dict] = None,
+                       json_data=None, idempotent: bool = True, timeout: Optional[float] = None):
+        url = f"{self.base_url}{endpoint}"
+        client_timeout = aiohttp.ClientTimeout(total=timeout or self.timeout)
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._get_session().request(
+                    method, url, params=params, json=json_data, timeout=client_timeout
+                ) as response:
+                    if response.status == 401:
+                        raise Hysteria2AuthError(f"Authentication failed: {await response.text()}")
+                    if response.status >= 500 and idempotent and attempt < self.retries:
+                        raise aiohttp.ServerConnectionError(f"Server error {response.status}")
+                    response.raise_for_status()
+                    body = await response.text()
+                    return await response.json(content_type=None) if body else {}
+            except Hysteria2AuthError:
+                raise
+            except aiohttp.ClientConnectorError as e:
+                error = Hysteria2ConnectionError(f"Connection error: {e}")
+            except (aiohttp.ServerConnectionError, asyncio.TimeoutError) as e:
+                error = Hysteria2ConnectionError(f"Request to {url} failed: {e!r}")
+                if not idempotent:
+                    raise error
+            except aiohttp.ClientError as e:
+                raise Hysteria2Error(f"Request error: {e}")
+            except ValueError as e:
+                raise Hysteria2Error(f"Invalid JSON response: {e}")
+            if attempt < self.retries:
+                await asyncio.sleep(RETRY_BACKOFF * (2 ** attempt))
+        raise error
+
+    async def get_traffic_stats(self, clear: bool = False, timeout: Optional[float] = None) -> Dict[str, TrafficStats]:
+        response = await self._request(
+            'GET', '/traffic', params={'clear': '1'} if clear else None, idempotent=not clear, timeout=timeout
+        )
+        return {client_id: TrafficStats.from_dict(stats) for client_id, stats in response.items()}
+
+    async def get_online_clients(self, timeout: Optional[float] = None) -> Dict[str, OnlineStatus]:
+        response = await self._request('GET', '/online', timeout=timeout)
+        return {client_id: OnlineStatus.from_int(connections) for client_id, connections in response.items()}
+
+    async def kick_clients(self, client_ids: Iterable[str], batch_size: int = KICK_BATCH_SIZE,
+                           timeout: Optional[float] = None) -> bool:
+        """Kicks clients in batches of `batch_size`, sending every batch concurrently."""
+        client_ids = list(client_ids)
+        if not client_ids:
+            return True
+        batches = [client_ids[i:i + batch_size] for i in range(0, len(client_ids), batch_size)]
+        results = await asyncio.gather(
+            *(self._request('POST', '/kick', json_data=batch, timeout=timeout) for batch in batches),
+            return_exceptions=True,
+        )
+        failed = [(batch, result) for batch, result in zip(batches, results) if isinstance(result, BaseException)]
+        if failed:
+            failed_ids = [client_id for batch, _ in failed for client_id in batch]
+            raise Hysteria2Error(f"Failed to kick {len(failed_ids)} clients ({', '.join(failed_ids)}): {failed[0][1]}")
+        return True
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_clients: Dict[Tuple[str, Optional[str], float], AsyncHysteria2Client] = {}
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="hysteria2-client", daemon=True).start()
+        return _loop
+
+
+def run(coro, timeout: Optional[float] = None):
+    """
+    Runs `coro` on the shared client event loop and waits for its result.
+    Lets sync code use the pooled clients; must not be called from that loop.
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result(timeout)
+
+
+def get_client(base_url: str, secret: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT) -> AsyncHysteria2Client:
+    """Returns the process-wide pooled client for a stats API endpoint."""
+    key = (base_url.rstrip('/'), secret, timeout)
+    with _loop_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = AsyncHysteria2Client(base_url, secret, timeout=timeout)
+        return client
+
+
+class Hysteria2Client:
+    '''
+    Blocking facade over the shared pooled client, with the same interface as
+    `hysteria2_api.Hysteria2Client`. Calls run on the shared client loop, so
+    every facade for the same endpoint reuses one keep-alive connection pool.
+    '''
+
+    def __init__(self, base_url: str, secret: Optional[str] = None, timeout: float = DEFAULT_TIMEOUT):
+        self.aio = get_client(base_url, secret, timeout)
+
+    def get_traffic_stats(self, clear: bool = False) -> Dict[str, TrafficStats]:
+        return run(self.aio.get_traffic_stats(clear))
+
+    def get_online_clients(self) -> Dict[str, OnlineStatus]:
+        return run(self.aio.get_online_clients())
+
+    def kick_clients(self, client_ids: List[str], batch_size: int = KICK_BATCH_SIZE) -> bool:
+        return run(self.aio.kick_clients(client_ids, batch_size))
@@ -0,0 +1,21 @@
+import sys
+import json
+import textwrap
+from typing import Any, Callable, Iterable, Optional, TextIO
+
+
+def dump_array(items: Iterable[Any], stream: Optional[TextIO] = None, indent: int = 2,
+               default: Optional[Callable[[Any], Any]] = None):
+    '''
+    Writes `items` as a JSON array one element at a time, so the whole list
+    never has to be built in memory. The output is identical to
+    `json.dumps(list(items), indent=indent)`.
+    '''
+    stream = stream or sys.stdout
+    pad = " " * indent
+    empty = True
+    for item in items:
+        stream.write("[\n" if empty else ",\n")
+        stream.write(textwrap.indent(json.dumps(item, indent=indent, default=default), pad))
+        empty = False
+    stream.write("[]\n" if empty else "\n]\n")
@@ -11,6 +11,9 @@ from datetime import datetime, timedelta
 from init_paths import *
 from paths import NODES_JSON_PATH
 
+# The traffic collector reports this server's own traffic under this node name.
+RESERVED_NODE_NAMES = ("local",)
+
 
 def is_valid_ip_or_domain(value: str) -> bool:
     if not value or not value.strip():
@@ -87,7 +90,13 @@ def add_node(
     obfs: str | None = None,
     insecure: bool = False,
     node_type: str = "standard",
+    stats_url: str | None = None,
+    stats_secret: str | None = None,
 ):
+    if name.strip().lower() in RESERVED_NODE_NAMES:
+        print(f"Error: The node name '{name}' is reserved for this server.", file=sys.stderr)
+        sys.exit(1)
+
     if not is_valid_ip_or_domain(ip):
         print(f"Error: '{ip}' is not a valid IP address or domain name.", file=sys.stderr)
         sys.exit(1)
@@ -104,6 +113,10 @@ def add_node(
         print(f"Error: Port '{port}' must be between 1 and 65535.", file=sys.stderr)
         sys.exit(1)
 
+    if stats_url and not stats_url.strip().startswith(("http://", "https://")):
+        print(f"Error: Stats URL '{stats_url}' must start with http:// or https://.", file=sys.stderr)
+        sys.exit(1)
+
     # нормализуем тип ноды
     node_type = (node_type or "standard").strip().lower()
     if node_type not in ("standard", "premium"):
@@ -134,6 +147,10 @@ def add_node(
         new_node["obfs"] = obfs.strip()
     if insecure:
         new_node["insecure"] = insecure
+    if stats_url:
+        new_node["stats_url"] = stats_url.strip().rstrip("/")
+    if stats_secret:
+        new_node["stats_secret"] = stats_secret.strip()
 
     nodes.append(new_node)
     write_nodes(nodes)
@@ -242,6 +259,8 @@ def main():
         default='standard',
         help='Optional: Node type (standard or premium). Default: standard.'
     )
+    add_parser.add_argument('--stats-url', type=str, help="Optional: Base URL of the node's Hysteria2 traffic stats API.")
+    add_parser.add_argument('--stats-secret', type=str, help="Optional: Secret of the node's traffic stats API.")
 
     delete_parser = subparsers.add_parser('delete', help='Delete a node by name.')
     delete_parser.add_argument('--name', type=str, required=True, help='The name of the node to delete.')
@@ -262,6 +281,8 @@ def main():
             args.obfs,
             args.insecure,
             args.node_type,
+            args.stats_url,
+            args.stats_secret,
         )
         
     elif args.command == 'delete':
@@ -6,6 +6,7 @@ import time
 import shlex
 import base64
 import sys
+import asyncio
 from typing import Dict, List, Optional, Tuple, Any
 from dataclasses import dataclass, field
 from io import BytesIO
@@ -18,10 +19,14 @@ import qrcode
 from jinja2 import Environment, FileSystemLoader
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from db.async_database import async_db
 from db.database import db
+from db import events
 
 load_dotenv()
 
+CACHE_STATS_INTERVAL = int(os.getenv('CACHE_STATS_INTERVAL', '600'))
+
 
 @dataclass
 class AppConfig:
@@ -215,16 +220,12 @@ class HysteriaCLI:
             print(f"Hysteria CLI error: {e}")
             raise
 
-    def get_username_by_password(self, password_token: str) -> Optional[str]:
-        if not db:
-            return None
-        user_doc = db.collection.find_one({"password": password_token}, {"_id": 1})
+    async def get_username_by_password(self, password_token: str) -> Optional[str]:
+        user_doc = await async_db.get_user_by_password(password_token, {"_id": 1})
         return user_doc['_id'] if user_doc else None
 
-    def get_user_info(self, username: str) -> Optional[UserInfo]:
-        if not db:
-            return None
-        user_doc = db.get_user(username)
+    async def get_user_info(self, username: str) -> Optional[UserInfo]:
+        user_doc = await async_db.get_user(username)
         if not user_doc:
             return None
 
@@ -454,11 +455,7 @@ class SubscriptionManager:
     def _get_extra_uris_for_user(self, user_plan: str) -> List[str]:
         return [str(x.get("uri")).strip() for x in self._filter_extra_configs_for_user(user_plan)]
 
-    def get_normal_subscription(self, username: str, user_agent: str) -> str:
-        user_info = self.hysteria_cli.get_user_info(username)
-        if user_info is None:
-            return "User not found"
-
+    def get_normal_subscription(self, username: str, user_agent: str, user_info: UserInfo) -> str:
         user_plan = Utils.normalize_plan(getattr(user_info, "plan", "standard"))
         is_premium_user = (user_plan == "premium")
 
@@ -545,6 +542,8 @@ class HysteriaServer:
         self.app.router.add_get(f'{base_path}/sub/normal/{{password_token}}', self.handle)
         self.app.router.add_get(f'{base_path}/robots.txt', self.robots_handler)
         self.app.router.add_route('*', f'{base_path}/{{tail:.*}}', self.handle_404_subpath)
+        self.app.cleanup_ctx.append(self._report_cache_stats)
+        self.app.cleanup_ctx.append(self._follow_changes)
 
     def _load_config(self) -> AppConfig:
         domain = os.getenv('HYSTERIA_DOMAIN', 'localhost')
@@ -635,11 +634,11 @@ class HysteriaServer:
 
             password_token = Utils.sanitize_input(password_token_raw, r'^[a-zA-Z0-9]+$')
 
-            username = self.hysteria_cli.get_username_by_password(password_token)
+            username = await self.hysteria_cli.get_username_by_password(password_token)
             if username is None:
                 return web.Response(status=404, text="User not found for the provided token.")
 
-            user_info = self.hysteria_cli.get_user_info(username)
+            user_info = await self.hysteria_cli.get_user_info(username)
             if user_info is None:
                 return web.Response(status=404, text=f"User '{username}' details not found.")
 
@@ -707,9 +706,7 @@ class HysteriaServer:
 
     async def _handle_normalsub(self, request: web.Request, username: str, user_info: UserInfo) -> web.Response:
         user_agent = request.headers.get('User-Agent', '').lower()
-        subscription = self.subscription_manager.get_normal_subscription(username, user_agent)
-        if subscription == "User not found":
-            return web.Response(status=404, text=f"User '{username}' not found.")
+        subscription = self.subscription_manager.get_normal_subscription(username, user_agent, user_info)
         return web.Response(text=subscription, content_type='text/plain')
 
     async def _get_template_context(self, username: str, user_info: UserInfo) -> TemplateContext:
@@ -818,6 +815,32 @@ class HysteriaServer:
     async def handle_script(self, request: web.Request) -> web.Response:
         return web.FileResponse(os.path.join(self.config.template_dir, 'script.js'))
 
+    async def _follow_changes(self, app: web.Application):
+        """Evicts users edited by other processes and reloads the SNI and templates when the config changes."""
+        def on_event(event):
+            if event.get("event") == events.CONFIG_CHANGED:
+                self.config.sni = self._load_sni_from_env(self.config.sni_file)
+                self.singbox_generator.default_sni = self.config.sni
+                self.singbox_generator.set_template_path(self.config.singbox_template_path)
+
+        subscription = events.follow(async_db.cache, "normalsub", on_event, change_stream=db)
+        yield
+        subscription.close()
+
+    async def _report_cache_stats(self, app: web.Application):
+        """Prints the user cache counters periodically, to help size USER_CACHE_SIZE/USER_CACHE_TTL."""
+        async def report():
+            while True:
+                await asyncio.sleep(CACHE_STATS_INTERVAL)
+                stats = async_db.cache_stats()
+                if stats['hits'] or stats['misses']:
+                    print(f"User cache: {stats['size']}/{stats['maxsize']} entries, {stats['hits']} hits, "
+                          f"{stats['misses']} misses ({stats['hit_ratio']:.1%}), {stats['evictions']} evictions")
+
+        task = asyncio.create_task(report())
+        yield
+        task.cancel()
+
     def run(self):
         print(f"Starting Hysteria Normalsub server on {self.config.aiohttp_listen_address}:{self.config.aiohttp_listen_port}")
         print(f"External access via Caddy should be at https://{self.config.domain}:{self.config.external_port}/{self.config.subpath}/sub/normal/<USER_PASSWORD>")
@@ -21,3 +21,6 @@ LASTESTCHANGE = "https://raw.githubusercontent.com/Asgaroth-SG/AsgarothGate/main
 CONNECTIONS_FILE = BASE_DIR / "hysteria_connections.json"
 BLOCK_LIST = Path("/tmp/hysteria_blocked_ips.txt")
 SCRIPT_PATH = BASE_DIR / "core/scripts/hysteria2/limit.sh"
+COLLECTOR_SOCKET = Path("/tmp/hysteria_traffic_collector.sock")
+RUN_DIR = Path("/run/hysteria")
+PRESENCE_FILE = RUN_DIR / "presence.json"
@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from paths import PRESENCE_FILE
+
+SNAPSHOT_FORMAT = 1
+DEFAULT_MAX_AGE = 45.0
+
+
+def write_snapshot(online: Dict[str, int], nodes: Dict[str, List[str]], version: int,
+                   path=PRESENCE_FILE, ts: Optional[float] = None):
+    '''
+    Atomically replaces the shared presence snapshot. Readers never see a
+    partial file: the snapshot is written to a temporary file in the same
+    directory and renamed over the old one. The file is readable by this
+    user only, since it lists who is online.
+    '''
+    snapshot = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "ts": time.time() if ts is None else ts,
+        "online": {user: count for user, count in online.items() if count > 0},
+        "nodes": nodes,
+    }
+    directory = os.path.dirname(str(path)) or '.'
+    os.makedirs(directory, mode=0o755, exist_ok=True)
+    # mkstemp creates the file with mode 0o600.
+    fd, tmp_path = tempfile.mkstemp(prefix='.presence-', dir=directory)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def read_snapshot(max_age: float = DEFAULT_MAX_AGE, path=PRESENCE_FILE) -> Optional[Dict[str, Any]]:
+    '''
+    Returns the presence snapshot published by the traffic collector, or None
+    if it is missing, unreadable, of an unknown format or older than
+    `max_age` seconds. Callers fall back to their own source on None, as they
+    do for a file another user could have written.
+    '''
+    try:
+        with open(path, 'r') as f:
+            st = os.fstat(f.fileno())
+            if st.st_uid not in (0, os.geteuid()) or st.st_mode & 0o022:
+                return None
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("format") != SNAPSHOT_FORMAT:
+        return None
+    if time.time() - float(snapshot.get("ts", 0)) > max_age:
+        return None
+    return snapshot
+
+
+def online_clients(max_age: float = DEFAULT_MAX_AGE) -> Optional[Dict[str, int]]:
+    '''Returns {username: connections} for online users from a fresh snapshot, or None.'''
+    snapshot = read_snapshot(max_age)
+    return snapshot["online"] if snapshot else None
@@ -6,6 +6,7 @@ import subprocess
 import fcntl
 from pathlib import Path
 from paths import *
+import collector_client
 
 logging.basicConfig(
     level=logging.WARNING,
@@ -61,6 +62,10 @@ def run_command(command, log_success=False):
         return False
 
 def check_traffic_status():
+    if collector_client.is_running():
+        # The resident traffic collector owns the traffic cycle; only fork as a fallback.
+        return
+
     lock_fd = acquire_lock()
     if not lock_fd:
         return
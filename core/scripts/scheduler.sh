@@ -38,6 +38,42 @@ check_scheduler_service() {
     fi
 }
 
+setup_hysteria_traffic_collector() {
+    chmod +x /etc/hysteria/core/traffic_collector.py
+
+    cat > /etc/systemd/system/hysteria-traffic-collector.service << 'EOF'
+[Unit]
+Description=Сборщик трафика Hysteria
+After=network.target mongod.service hysteria-server.service
+
+[Service]
+Type=simple
+User=root
+WorkingDirectory=/etc/hysteria
+ExecStart=/etc/hysteria/hysteria2_venv/bin/python3 /etc/hysteria/core/traffic_collector.py
+Restart=always
+RestartSec=5
+StandardOutput=journal
+StandardError=journal
+SyslogIdentifier=hysteria-traffic-collector
+
+[Install]
+WantedBy=multi-user.target
+EOF
+
+    systemctl daemon-reload
+    systemctl enable hysteria-traffic-collector.service
+    systemctl start hysteria-traffic-collector.service
+}
+
+check_traffic_collector_service() {
+    if systemctl is-active --quiet hysteria-traffic-collector.service; then
+        return 0
+    else
+        return 1
+    fi
+}
+
 setup_hysteria_auth_server() {
     # chmod +x /etc/hysteria/core/scripts/auth/user_auth
 
@@ -3,6 +3,7 @@
 declare -a services=(
     "hysteria-server.service"
     "hysteria-scheduler.service"
+    "hysteria-traffic-collector.service"
     "hysteria-auth.service"
     "hysteria-webpanel.service"
     "hysteria-caddy.service"
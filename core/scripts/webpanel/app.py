@@ -2,6 +2,7 @@
 
 import sys
 import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from starlette.staticfiles import StaticFiles
 
@@ -16,6 +17,20 @@ HYSTERIA_CORE_DIR = '/etc/hysteria/core/'
 sys.path.append(HYSTERIA_CORE_DIR)
 
 import routers
+from scripts.db import events
+from scripts.db.database import db
+from scripts.db.async_database import async_db
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    '''
+    Keep the user cache in step with edits made by the CLI, the bot and other services.
+    '''
+
+    subscription = events.follow(async_db.cache, 'webpanel', change_stream=db)
+    yield
+    subscription.close()
 
 
 def create_app() -> FastAPI:
@@ -32,6 +47,7 @@ def create_app() -> FastAPI:
         },
         debug=CONFIGS.DEBUG,
         root_path=f'/{CONFIGS.ROOT_PATH}',
+        lifespan=lifespan,
     )
 
     app.mount('/assets', StaticFiles(directory='assets'), name='assets')
@@ -2,7 +2,9 @@ from fastapi import APIRouter, HTTPException
 from ..schema.response import DetailResponse
 import json
 import os
-from scripts.db.database import db
+import asyncio
+from scripts.db.database import compute_expires_at
+from scripts.db.async_database import async_db
 
 from ..schema.config.ip import (
     EditInputBody,
@@ -13,6 +15,7 @@ from ..schema.config.ip import (
     NodesTrafficPayload,
 )
 import cli_api
+import collector_client
 
 router = APIRouter()
 
@@ -126,6 +129,8 @@ async def add_node(body: AddNodeBody):
             obfs=body.obfs,
             insecure=body.insecure,
             node_type=node_type,  # ← ВАЖНО: пробрасываем тип до CLI/скрипта node.py
+            stats_url=body.stats_url,
+            stats_secret=body.stats_secret,
         )
         return DetailResponse(detail=f"Node '{body.name}' added successfully.")
     except Exception as e:
@@ -153,33 +158,46 @@ async def receive_node_traffic(body: NodesTrafficPayload):
     Receives traffic delta from a node and adds it to the user's total in the database.
     Authentication is handled by the AuthMiddleware.
     """
-    if db is None:
-        raise HTTPException(status_code=500, detail="Database connection is not available.")
-
-    updated_count = 0
-    for user_traffic in body.users:
-        try:
-            db_user = db.get_user(user_traffic.username)
-            if not db_user:
-                continue
-
-            new_upload = db_user.get('upload_bytes', 0) + user_traffic.upload_bytes
-            new_download = db_user.get('download_bytes', 0) + user_traffic.download_bytes
-
-            update_data = {
-                'upload_bytes': new_upload,
-                'download_bytes': new_download,
-                'status': user_traffic.status,
-                'online_count': user_traffic.online_count,
-            }
-
-            if not db_user.get('account_creation_date') and user_traffic.account_creation_date:
-                update_data['account_creation_date'] = user_traffic.account_creation_date
-
-            db.update_user(user_traffic.username, update_data)
-            updated_count += 1
-
-        except Exception as e:
-            print(f"Error updating traffic for user {user_traffic.username}: {e}")
+    reported = {user_traffic.username.lower(): user_traffic for user_traffic in body.users}
+    try:
+        db_users = {u['_id']: u for u in await async_db.get_users_by_names(list(reported), {'account_creation_date': 1, 'expiration_days': 1})}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load users: {e}")
+
+    changes = []
+    for username, user_traffic in reported.items():
+        db_user = db_users.get(username)
+        if not db_user:
+            continue
+
+        set_fields = {
+            'status': user_traffic.status,
+            'online_count': user_traffic.online_count,
+        }
+        if not db_user.get('account_creation_date') and user_traffic.account_creation_date:
+            set_fields['account_creation_date'] = user_traffic.account_creation_date
+            set_fields['expires_at'] = compute_expires_at(
+                user_traffic.account_creation_date, db_user.get('expiration_days', 0)
+            )
+
+        inc_fields = {
+            'upload_bytes': user_traffic.upload_bytes,
+            'download_bytes': user_traffic.download_bytes,
+            'total_bytes': user_traffic.upload_bytes + user_traffic.download_bytes,
+        }
+        changes.append((username, set_fields, inc_fields))
+
+    try:
+        await async_db.bulk_apply(changes)
+        await asyncio.to_thread(
+            collector_client.reschedule_expiry, *(u for u, set_fields, _ in changes if 'expires_at' in set_fields)
+        )
+        await async_db.update_server_stats(
+            sum(inc['upload_bytes'] for _, _, inc in changes),
+            sum(inc['download_bytes'] for _, _, inc in changes),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to store node traffic: {e}")
+    updated_count = len(changes)
 
     return DetailResponse(detail=f"Successfully processed and aggregated traffic for {updated_count} users.")
@@ -47,6 +47,16 @@ class Node(BaseModel):
     insecure: Optional[bool] = False
     # Тип ноды, который уходит на фронт и читается из nodes.json
     type: str | None = "standard"
+    stats_url: Optional[str] = None
+
+    @field_validator('stats_url', mode='before')
+    def check_stats_url(cls, v: str | None):
+        if v is None or not v.strip():
+            return None
+        v = v.strip()
+        if not v.startswith(("http://", "https://")):
+            raise ValueError("Stats URL must start with http:// or https://.")
+        return v.rstrip('/')
 
     @field_validator('ip', mode='before')
     def check_node_ip(cls, v: str | None):
@@ -104,6 +114,14 @@ class Node(BaseModel):
 class AddNodeBody(Node):
     # Отдельное поле для запроса от фронта: settings.js шлёт node_type
     node_type: Optional[str] = "standard"
+    stats_secret: Optional[str] = None
+
+    @field_validator('name')
+    def check_name(cls, v: str):
+        # The traffic collector reports this server's own traffic as node 'local'.
+        if v.strip().lower() == 'local':
+            raise ValueError("The node name 'local' is reserved for this server.")
+        return v
 
     @field_validator('node_type', mode='before')
     def normalize_node_type(cls, v: str | None):
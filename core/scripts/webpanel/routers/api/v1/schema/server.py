@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, RootModel
 from typing import Optional
 
 
@@ -49,4 +49,15 @@ class VersionCheckResponse(BaseModel):
     is_latest: bool
     current_version: str
     latest_version: str
-    changelog: str
\ No newline at end of file
+    changelog: str
+
+
+class TopTalker(BaseModel):
+    username: str
+    upload_rate: float
+    download_rate: float
+    total_rate: float
+
+
+class TopTalkersResponse(RootModel):
+    root: list[TopTalker]
@@ -1,5 +1,5 @@
 import re
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, RootModel, Field, field_validator
 
 
@@ -98,6 +98,40 @@ class EditUserInputBody(BaseModel):
         return v
 
 
+class HourlyTraffic(BaseModel):
+    hour: int
+    upload_bytes: int
+    download_bytes: int
+
+
+class NodeTraffic(BaseModel):
+    upload_bytes: int
+    download_bytes: int
+
+
+class DailyTraffic(BaseModel):
+    date: str
+    upload_bytes: int
+    download_bytes: int
+    hours: Optional[List[HourlyTraffic]] = None
+    peak_hour: Optional[int] = None
+    nodes: Optional[Dict[str, NodeTraffic]] = None
+
+
+class PeakHourTraffic(BaseModel):
+    date: str
+    hour: int
+    bytes: int
+
+
+class UserTrafficHistoryResponse(BaseModel):
+    username: str
+    days: List[DailyTraffic]
+    upload_bytes: int
+    download_bytes: int
+    peak_hour: Optional[PeakHourTraffic] = None
+
+
 class NodeUri(BaseModel):
     name: str
     uri: str
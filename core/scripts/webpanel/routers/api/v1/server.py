@@ -1,6 +1,9 @@
-from fastapi import APIRouter, HTTPException
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
 import cli_api
-from .schema.server import ServerStatusResponse, ServerServicesStatusResponse, VersionCheckResponse, VersionInfoResponse
+from .schema.server import (
+    ServerStatusResponse, ServerServicesStatusResponse, VersionCheckResponse, VersionInfoResponse, TopTalkersResponse
+)
 
 router = APIRouter()
 
@@ -135,6 +138,29 @@ def __parse_server_status(server_info: str) -> ServerStatusResponse:
         raise ValueError(f'Invalid or incomplete server info: {e}')
 
 
+@router.get('/top-talkers', response_model=TopTalkersResponse)
+async def top_talkers_api(limit: int = Query(10, ge=1, le=100), window: Optional[float] = Query(None, gt=0)):
+    """
+    Get the users currently using the most bandwidth.
+
+    Args:
+        limit: How many users to return.
+        window: Average rates over the last N seconds instead of the whole in-memory buffer.
+
+    Returns:
+        TopTalkersResponse with rates in bytes per second, fastest first.
+
+    Raises:
+        HTTPException: 503 if the traffic collector is not running, 400 on other errors.
+    """
+    try:
+        return cli_api.get_top_talkers(limit, window)
+    except cli_api.CommandExecutionError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
+
+
 @router.get('/services/status', response_model=ServerServicesStatusResponse)
 async def server_services_status_api():
     """
@@ -1,17 +1,22 @@
 import json
+import asyncio
 from typing import List
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from .schema.user import (
     UserListResponse,
     UserInfoResponse,
     AddUserInputBody,
     EditUserInputBody,
     UserUriResponse,
+    UserTrafficHistoryResponse,
     AddBulkUsersInputBody,
     UsernamesRequest
 )
 from .schema.response import DetailResponse
+from scripts.db.async_database import async_db
 import cli_api
+# cli_api puts core/scripts on sys.path, which collector_client is imported from.
+import collector_client
 
 router = APIRouter()
 
@@ -168,10 +173,12 @@ async def bulk_remove_users_api(body: UsernamesRequest):
     if not body.usernames:
         raise HTTPException(status_code=400, detail="No usernames provided.")
     try:
-        cli_api.kick_users_by_name(body.usernames)
-        cli_api.traffic_status(display_output=False)
-        cli_api.remove_users(body.usernames)
-        return DetailResponse(detail='Users have been removed.')
+        usernames = [username.lower() for username in body.usernames]
+        cli_api.kick_users_by_name(usernames)
+        cli_api.flush_traffic()
+        result = await async_db.delete_users(usernames)
+        await asyncio.to_thread(collector_client.reschedule_expiry, *usernames)
+        return DetailResponse(detail=f'{result.deleted_count} user(s) have been removed.')
     except Exception as e:
         raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
 
@@ -232,7 +239,7 @@ async def edit_user_api(username: str, body: EditUserInputBody):
     """
     try:
         cli_api.kick_users_by_name([username])
-        cli_api.traffic_status(display_output=False)
+        cli_api.flush_traffic()
 
         # Передаем max_ips и новый план пользователя в функцию редактирования
         cli_api.edit_user(
@@ -278,7 +285,7 @@ async def remove_user_api(username: str):
             )
 
         cli_api.kick_users_by_name([username])
-        cli_api.traffic_status(display_output=False)
+        cli_api.flush_traffic()
         cli_api.remove_users([username])
         return DetailResponse(detail=f'User {username} has been removed.')
     except HTTPException:
@@ -317,6 +324,27 @@ async def reset_user_api(username: str):
         raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
 
 
+@router.get('/{username}/traffic', response_model=UserTrafficHistoryResponse)
+async def user_traffic_history_api(username: str, days: int = Query(7, ge=1, le=400)):
+    """
+    Get the daily and hourly traffic history of a user.
+
+    Args:
+        username: The username of the user.
+        days: How many days back to include, today included.
+
+    Returns:
+        UserTrafficHistoryResponse built from the pre-aggregated history buckets.
+
+    Raises:
+        HTTPException: 400 if an error occurs.
+    """
+    try:
+        return cli_api.get_user_traffic_history(username, days)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f'Error: {str(e)}')
+
+
 @router.get('/{username}/uri', response_model=UserUriResponse)
 async def show_user_uri_api(username: str):
     """
@@ -0,0 +1,70 @@
+import heapq
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+DEFAULT_WINDOW_POLLS = 240
+DEFAULT_PER_POLL = 200
+
+
+class TopTalkers:
+    '''
+    Recent per-user bandwidth, kept in a fixed-size ring buffer of polls.
+
+    Each poll's byte deltas are turned into rates over the time since the
+    previous poll. Only the `per_poll` fastest users of a poll are kept, and
+    only the last `window_polls` polls, so memory is bounded by
+    window_polls * per_poll entries no matter how many users exist.
+
+    `record` runs on the collector's poll thread while `top` serves requests
+    on the event loop, so the buffer is only touched under a lock and `top`
+    works on a snapshot of it.
+    '''
+
+    def __init__(self, window_polls: int = DEFAULT_WINDOW_POLLS, per_poll: int = DEFAULT_PER_POLL):
+        self.per_poll = per_poll
+        self._polls: deque = deque(maxlen=window_polls)
+        self._last_ts: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, ts: float, traffic: Dict[str, List[int]]):
+        """Adds one poll of {username: [upload_bytes, download_bytes]} deltas drained at `ts`."""
+        fastest = heapq.nlargest(self.per_poll, traffic.items(), key=lambda item: item[1][0] + item[1][1])
+        with self._lock:
+            previous, self._last_ts = self._last_ts, ts
+            if previous is None or ts <= previous:
+                return
+            self._polls.append((ts, ts - previous, {user: (tx, rx) for user, (tx, rx) in fastest}))
+
+    def top(self, limit: int = 10, window: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the `limit` users with the highest average rate over the last
+        `window` seconds (the whole buffer when None), fastest first.
+        """
+        with self._lock:
+            polls = list(self._polls)
+        if not polls:
+            return []
+        newest = polls[-1][0]
+        totals: Dict[str, List[int]] = {}
+        covered = 0.0
+        for ts, elapsed, users in reversed(polls):
+            if window is not None and newest - ts >= window:
+                break
+            covered += elapsed
+            for user, (tx, rx) in users.items():
+                sums = totals.setdefault(user, [0, 0])
+                sums[0] += tx
+                sums[1] += rx
+        if not covered:
+            return []
+        busiest = heapq.nlargest(limit, totals.items(), key=lambda item: item[1][0] + item[1][1])
+        return [
+            {
+                "username": user,
+                "upload_rate": tx / covered,
+                "download_rate": rx / covered,
+                "total_rate": (tx + rx) / covered,
+            }
+            for user, (tx, rx) in busiest
+        ]
@@ -6,17 +6,32 @@ import sys
 import fcntl
 import datetime
 import logging
-from typing import Dict, Any, Optional, List, Tuple
+import time
+import asyncio
+import itertools
+from typing import Dict, Any, Optional, List, Tuple, Callable, Iterable
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.join(SCRIPT_DIR, 'scripts'))
 
-from hysteria2_api import Hysteria2Client
-from db.database import db
+from hysteria2_client import Hysteria2Client, run as run_on_client_loop
+from db.database import db, HOURLY_RETENTION_DAYS, compute_expires_at
+from traffic_spool import TrafficSpool
+from top_talkers import TopTalkers
+import presence
+from traffic_nodes import LOCAL_NODE, NodeRegistry, NODES_FILE, poll_nodes, kick_on_nodes, merge_node_samples
 
 CONFIG_FILE = '/etc/hysteria/config.json'
 API_BASE_URL = 'http://127.0.0.1:25413'
 LOCKFILE = "/tmp/hysteria_traffic.lock"
+SPOOL_FILE = '/etc/hysteria/traffic_spool.jsonl'
+PRESENCE_FILE = str(presence.PRESENCE_FILE)
+
+# The only user fields a traffic cycle reads; passwords, notes and the like stay in MongoDB.
+TRAFFIC_FIELDS = [
+    'online_count', 'status', 'account_creation_date', 'expiration_days', 'last_traffic_seq',
+    'max_download_bytes', 'blocked', 'total_bytes', 'upload_bytes', 'download_bytes',
+]
 
 STATUS_ONLINE = "Online"
 STATUS_OFFLINE = "Offline"
@@ -32,8 +47,10 @@ def format_bytes(bytes_val: int) -> str:
     if bytes_val < 1024**4: return f"{bytes_val / 1024**3:.2f}GB"
     return f"{bytes_val / 1024**4:.2f}TB"
 
-def display_traffic_data(data: Dict[str, Dict[str, Any]]):
-    if not data:
+def display_traffic_data(users: Iterable[Dict[str, Any]]):
+    users = iter(users)
+    first = next(users, None)
+    if first is None:
         print("No traffic data to display.")
         return
 
@@ -47,7 +64,8 @@ def display_traffic_data(data: Dict[str, Dict[str, Any]]):
     print(header_line)
     print(separator)
 
-    for user, entry in data.items():
+    for entry in itertools.chain([first], users):
+        user = entry["_id"]
         formatted_tx = format_bytes(entry.get("upload_bytes", 0))
         formatted_rx = format_bytes(entry.get("download_bytes", 0))
         status = entry.get("status", STATUS_ON_HOLD)
@@ -57,13 +75,17 @@ def display_traffic_data(data: Dict[str, Dict[str, Any]]):
 class TrafficManager:
     def __init__(self, db_conn, api_base_url: str):
         self.db = db_conn
-        if self.db is None:
-            raise ValueError("Database connection is not available.")
         self.secret = self._get_secret()
         if not self.secret:
             raise ValueError(f"Secret not found or failed to read {CONFIG_FILE}.")
         self.client = Hysteria2Client(base_url=api_base_url, secret=self.secret)
+        self.spool = TrafficSpool(SPOOL_FILE)
+        self.nodes = NodeRegistry(NODES_FILE)
+        self.presence: Dict[str, List[str]] = {}
+        self.top_talkers = TopTalkers()
+        self.expiry_listener: Optional[Callable[[str, Optional[datetime.datetime]], None]] = None
         self.today_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        self.last_cycle: Dict[str, Any] = {}
 
     @staticmethod
     def _get_secret() -> Optional[str]:
@@ -88,45 +110,201 @@ class TrafficManager:
             return int(connections_attr) if isinstance(connections_attr, int) else 1
 
     def process_and_update_traffic(self) -> Dict[str, Any]:
+        """Drains the live counters into the spool, then applies everything pending to MongoDB."""
+        self.poll()
+        return self.flush_spool()
+
+    def poll(self) -> Optional[int]:
+        """
+        Drains the local and every configured remote node's counters concurrently
+        and durably appends them to the spool as one entry. Returns the spool
+        sequence number, or None if no node could be reached.
+        """
+        remote_nodes = self.nodes.nodes()
+        samples = run_on_client_loop(self._drain_all(remote_nodes))
+        if not samples:
+            return None
+
+        self.presence = {}
+        for node_name, sample in samples.items():
+            for username, count in sample['online'].items():
+                if count > 0:
+                    self.presence.setdefault(username, []).append(node_name)
+
+        entry = {"ts": time.time(), **merge_node_samples(samples)}
+        self.top_talkers.record(entry["ts"], entry["traffic"])
+        if remote_nodes:
+            entry["nodes"] = samples
+        seq = self.spool.append(entry)
+        self._publish_presence(entry["online"], seq, entry["ts"])
+        return seq
+
+    def _publish_presence(self, online: Dict[str, int], version: int, ts: float):
+        """Shares this poll's online users so readers need not query every node themselves."""
         try:
-            live_traffic = self.client.get_traffic_stats(clear=True)
-            live_status = self.client.get_online_clients()
-            db_users = {u['_id']: u for u in self.db.get_all_users()}
+            presence.write_snapshot(online, self.presence, version, path=PRESENCE_FILE, ts=ts)
+        except OSError as e:
+            logging.warning(f"Could not write presence snapshot {PRESENCE_FILE}: {e}")
+
+    async def _drain_all(self, remote_nodes) -> Dict[str, Dict[str, Any]]:
+        local, samples = await asyncio.gather(self._drain_local(), poll_nodes(remote_nodes))
+        if local is not None:
+            samples[LOCAL_NODE] = local
+        return samples
+
+    async def _drain_local(self) -> Optional[Dict[str, Any]]:
+        try:
+            live_status = await self.client.aio.get_online_clients()
+            live_traffic = await self.client.aio.get_traffic_stats(clear=True)
         except Exception as e:
-            logging.error(f"Error communicating with Hysteria2 API or DB: {e}")
-            return {}
+            logging.error(f"Error communicating with Hysteria2 API: {e}")
+            return None
 
-        users_to_update: List[Tuple[str, Dict[str, Any]]] = []
-        for username, user_data in db_users.items():
-            updates = self._calculate_user_updates(username, user_data, live_traffic, live_status)
-            if updates:
-                users_to_update.append((username, updates))
-
-        if users_to_update:
-            for username, update_data in users_to_update:
-                try:
-                    self.db.update_user(username, update_data)
-                    db_users[username].update(update_data)
-                except Exception as e:
-                    logging.error(f"Failed to update user {username} in DB: {e}")
+        return {
+            "traffic": {
+                username: [stats.upload_bytes, stats.download_bytes]
+                for username, stats in live_traffic.items()
+                if stats.upload_bytes or stats.download_bytes
+            },
+            "online": {username: self._get_online_connection_count(status) for username, status in live_status.items()},
+        }
+
+    def flush_spool(self) -> Dict[str, Any]:
+        """
+        Replays pending spool entries into MongoDB in sequence order. Stops at the
+        first failure and leaves that entry for the next flush; every write is
+        guarded by the entry's sequence number, so a partial apply is safe to retry.
+        """
+        started = time.monotonic()
+        db_users: Dict[str, Any] = {}
+        applied, users_read, touched = 0, 0, 0
+        for entry in self.spool.pending():
+            try:
+                db_users, entry_touched = self.apply_entry(entry)
+                self.spool.commit(entry['seq'])
+            except Exception as e:
+                logging.error(f"Failed to apply traffic spool entry {entry['seq']}, will retry: {e}")
+                break
+            applied += 1
+            users_read += len(db_users)
+            touched += entry_touched
+
+        self.last_cycle = {
+            "users_read": users_read,
+            "users_touched": touched,
+            "entries_applied": applied,
+            "spool_pending": self.spool.backlog(),
+            "duration": time.monotonic() - started,
+        }
+        logging.info(
+            f"Traffic cycle: applied {applied}/{applied + self.last_cycle['spool_pending']} spool entries, "
+            f"read {users_read} users, touched {touched} documents in {self.last_cycle['duration']:.3f}s"
+        )
         return db_users
 
-    def _calculate_user_updates(self, username: str, user_data: Dict, live_traffic: Dict, live_status: Dict) -> Dict[str, Any]:
-        updates = {}
-        online_count = self._get_online_connection_count(live_status.get(username))
+    def apply_entry(self, entry: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+        seq = entry['seq']
+        when = datetime.datetime.fromtimestamp(entry['ts'])
+        self.today_date = when.strftime("%Y-%m-%d")
+        live_traffic, live_status = entry['traffic'], entry['online']
+        db_users = {u['_id']: u for u in self.db.get_users_for_traffic(set(live_traffic) | set(live_status), TRAFFIC_FIELDS)}
+
+        changes: List[Tuple[str, Dict[str, Any], Dict[str, int]]] = []
+        over_quota: List[str] = []
+        for username, user_data in db_users.items():
+            if user_data.get('last_traffic_seq', 0) >= seq:
+                continue
+            set_fields, inc_fields = self._calculate_user_updates(username, user_data, live_traffic, live_status)
+            if self._crosses_quota(user_data, inc_fields):
+                set_fields['blocked'] = True
+                set_fields['blocked_at'] = when
+                over_quota.append(username)
+            if set_fields or inc_fields:
+                changes.append((username, set_fields, inc_fields))
+
+        touched = 0
+        if changes:
+            touched = self.db.bulk_apply(changes, seq=seq).modified_count
+
+            for username, set_fields, inc_fields in changes:
+                user_data = db_users[username]
+                user_data.update(set_fields)
+                for field, delta in inc_fields.items():
+                    user_data[field] = user_data.get(field, 0) + delta
+                if self.expiry_listener and ('expires_at' in set_fields or set_fields.get('blocked')):
+                    self.expiry_listener(username, None if set_fields.get('blocked') else set_fields['expires_at'])
+
+        if over_quota:
+            logging.info(f"Blocking {len(over_quota)} users over their traffic limit: {', '.join(over_quota)}")
+            self._kick_api_call(over_quota)
+
+        # History and totals come from the whole entry, not from `changes`: on a replay
+        # after a partial apply, users already carry this seq and are absent from
+        # `changes`, while the bucket and stats writes have their own seq guards.
+        samples = {
+            username: (traffic[0], traffic[1])
+            for username, traffic in live_traffic.items()
+            if username in db_users and (traffic[0] or traffic[1])
+        }
+        self._record_history(samples, when, seq, entry.get('nodes'))
+        self._update_server_stats(samples, db_users, seq)
+        return db_users, touched
+
+    @staticmethod
+    def _crosses_quota(user_data: Dict[str, Any], inc_fields: Dict[str, int]) -> bool:
+        limit = user_data.get('max_download_bytes', 0)
+        if not inc_fields or user_data.get('blocked') or not limit or limit <= 0:
+            return False
+        used = user_data.get('total_bytes')
+        if used is None:
+            used = user_data.get('upload_bytes', 0) + user_data.get('download_bytes', 0)
+        return used + inc_fields['total_bytes'] >= limit
+
+    def _record_history(self, samples: Dict[str, Tuple[int, int]], when: datetime.datetime,
+                        seq: int, node_samples: Optional[Dict[str, Dict[str, Any]]] = None):
+        per_node = None
+        if node_samples:
+            per_node = {}
+            for node_name, sample in node_samples.items():
+                for username, (tx, rx) in sample['traffic'].items():
+                    if username in samples:
+                        per_node.setdefault(username, {})[node_name] = (tx, rx)
+        self.db.record_traffic_buckets(samples, when, seq=seq, per_node=per_node)
+
+    def _update_server_stats(self, samples: Dict[str, Tuple[int, int]], db_users: Dict[str, Dict[str, Any]], seq: int):
+        upload = sum(upload for upload, _ in samples.values())
+        download = sum(download for _, download in samples.values())
+        online_users = sum(int(user.get('online_count', 0) or 0) for user in db_users.values())
+        self.db.update_server_stats(upload, download, online_users, seq=seq)
+
+    def rollup_traffic_history(self):
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=HOURLY_RETENTION_DAYS)
+        try:
+            result = self.db.downsample_traffic_history(cutoff)
+            if result.modified_count:
+                logging.info(f"Downsampled {result.modified_count} traffic history buckets older than {cutoff:%Y-%m-%d}")
+        except Exception as e:
+            logging.error(f"Failed to downsample traffic history: {e}")
+
+    def _calculate_user_updates(self, username: str, user_data: Dict, live_traffic: Dict[str, List[int]], live_status: Dict[str, int]) -> Tuple[Dict[str, Any], Dict[str, int]]:
+        updates, increments = {}, {}
+        online_count = live_status.get(username, 0)
         is_online = online_count > 0
         if user_data.get('online_count') != online_count:
             updates['online_count'] = online_count
 
-        if username in live_traffic:
-            updates['upload_bytes'] = user_data.get('upload_bytes', 0) + live_traffic[username].upload_bytes
-            updates['download_bytes'] = user_data.get('download_bytes', 0) + live_traffic[username].download_bytes
+        traffic = live_traffic.get(username)
+        if traffic and (traffic[0] or traffic[1]):
+            increments['upload_bytes'] = traffic[0]
+            increments['download_bytes'] = traffic[1]
+            increments['total_bytes'] = traffic[0] + traffic[1]
 
         is_activated = "account_creation_date" in user_data
-        has_activity = is_online or (username in live_traffic and (live_traffic[username].upload_bytes > 0 or live_traffic[username].download_bytes > 0))
+        has_activity = is_online or bool(increments)
 
         if not is_activated and has_activity:
             updates["account_creation_date"] = self.today_date
+            updates["expires_at"] = compute_expires_at(self.today_date, user_data.get("expiration_days", 0))
             updates["status"] = STATUS_ONLINE if is_online else STATUS_OFFLINE
         elif is_activated:
             new_status = STATUS_ONLINE if is_online else STATUS_OFFLINE
@@ -135,47 +313,71 @@ class TrafficManager:
         elif not is_activated and not has_activity and user_data.get("status") != STATUS_ON_HOLD:
             updates["status"] = STATUS_ON_HOLD
             
-        return updates
+        return updates, increments
 
     def kick_expired_users(self):
+        projection = {'online_count': 1, 'status': 1}
         try:
-            all_users = self.db.get_all_users()
+            violators = self.db.find_expired_users(datetime.datetime.now(), projection)
+            violators += self.db.find_over_quota_users(projection)
         except Exception as e:
             logging.error(f"Failed to fetch users for expiration check: {e}")
             return
 
-        now = datetime.datetime.now()
-        users_to_kick, users_to_block = [], []
-        
-        for user in all_users:
-            username = user.get('_id')
-            if not username or user.get('blocked') or not user.get('account_creation_date'): continue
+        users_to_block = {user['_id']: user for user in violators}
+        if not users_to_block:
+            return
 
-            try:
-                total_bytes = user.get('download_bytes', 0) + user.get('upload_bytes', 0)
-                expired_by_date = (user.get('expiration_days', 0) > 0 and now >= datetime.datetime.strptime(user['account_creation_date'], "%Y-%m-%d") + datetime.timedelta(days=user['expiration_days']))
-                expired_by_traffic = (user.get('max_download_bytes', 0) > 0 and total_bytes >= user['max_download_bytes'])
-
-                if expired_by_date or expired_by_traffic:
-                    users_to_block.append(username)
-                    if user.get("online_count", 0) > 0 or user.get("status") == STATUS_ONLINE:
-                        users_to_kick.append(username)
-            except (ValueError, TypeError): continue
-        
-        if users_to_block:
-            for username in users_to_block:
-                self.db.update_user(username, {'blocked': True, 'status': STATUS_OFFLINE, 'online_count': 0})
-        
-        if users_to_kick:
-            for i in range(0, len(users_to_kick), 50):
-                self._kick_api_call(users_to_kick[i:i+50])
+        users_to_kick = [
+            username for username, user in users_to_block.items()
+            if user.get("online_count", 0) > 0 or user.get("status") == STATUS_ONLINE
+        ]
 
-    def _kick_api_call(self, usernames: List[str]):
         try:
-            self.client.kick_clients(usernames)
-            logging.info(f"Successfully kicked users: {', '.join(usernames)}")
+            self.db.block_users(list(users_to_block))
         except Exception as e:
-            logging.error(f"Failed to kick users via API: {e}")
+            logging.error(f"Failed to block expired users: {e}")
+            return
+
+        if users_to_kick:
+            self._kick_api_call(users_to_kick)
+
+    def expire_user(self, username: str) -> bool:
+        """Blocks and kicks a user whose expiry instant has arrived, if the DB still agrees."""
+        if not self.db.block_if_expired(username, datetime.datetime.now()):
+            return False
+        logging.info(f"User {username} expired; blocked and kicked.")
+        self._kick_api_call([username])
+        return True
+
+    def _kick_api_call(self, usernames: List[str]):
+        """
+        Kicks users on every node they were last seen online on, all nodes and
+        batches concurrently. Users with no known presence are kicked everywhere.
+        """
+        remote_nodes = {node.name: node for node in self.nodes.nodes()}
+        local_targets: List[str] = []
+        remote_targets: Dict[Any, List[str]] = {}
+        for username in usernames:
+            seen_on = self.presence.get(username) or [LOCAL_NODE, *remote_nodes]
+            for node_name in seen_on:
+                if node_name == LOCAL_NODE:
+                    local_targets.append(username)
+                elif node_name in remote_nodes:
+                    remote_targets.setdefault(remote_nodes[node_name], []).append(username)
+        run_on_client_loop(self._kick_everywhere(local_targets, remote_targets))
+
+    async def _kick_everywhere(self, local_targets: List[str], remote_targets: Dict[Any, List[str]]):
+        async def kick_local():
+            if not local_targets:
+                return
+            try:
+                await self.client.aio.kick_clients(local_targets)
+                logging.info(f"Successfully kicked users: {', '.join(local_targets)}")
+            except Exception as e:
+                logging.error(f"Failed to kick users via API: {e}")
+
+        await asyncio.gather(kick_local(), kick_on_nodes(remote_targets))
 
 
 def traffic_status(no_gui=False) -> Optional[Dict[str, Any]]:
@@ -187,12 +389,57 @@ def traffic_status(no_gui=False) -> Optional[Dict[str, Any]]:
         manager = TrafficManager(db_conn=db, api_base_url=API_BASE_URL)
         final_data = manager.process_and_update_traffic()
         if not no_gui:
-            display_traffic_data(final_data)
+            display_traffic_data(db.iter_users(['upload_bytes', 'download_bytes', 'status']))
         return final_data
     except ValueError as e:
         logging.critical(str(e))
         return None
 
+def get_traffic_history(username: str, days: int = 7) -> Dict[str, Any]:
+    """
+    Returns daily (and, for recent days, hourly) usage of a user from the
+    pre-aggregated history buckets, oldest day first.
+    """
+    today = datetime.datetime.now()
+    end_day = datetime.datetime(today.year, today.month, today.day)
+    start_day = end_day - datetime.timedelta(days=max(days, 1) - 1)
+
+    history = []
+    peak = None
+    for bucket in db.get_traffic_history(username, start_day, end_day):
+        day_entry = {
+            "date": bucket["day"].strftime("%Y-%m-%d"),
+            "upload_bytes": bucket.get("tx", 0),
+            "download_bytes": bucket.get("rx", 0),
+            "hours": None,
+            "peak_hour": bucket.get("peak_hour"),
+            "nodes": {
+                node: {"upload_bytes": slot.get("tx", 0), "download_bytes": slot.get("rx", 0)}
+                for node, slot in bucket.get("nodes", {}).items()
+            } or None,
+        }
+        if "hours" in bucket:
+            hours = [
+                {"hour": int(hour), "upload_bytes": slot.get("tx", 0), "download_bytes": slot.get("rx", 0)}
+                for hour, slot in sorted(bucket["hours"].items(), key=lambda item: int(item[0]))
+            ]
+            day_entry["hours"] = hours
+            busiest = max(hours, key=lambda h: h["upload_bytes"] + h["download_bytes"], default=None)
+            if busiest:
+                day_entry["peak_hour"] = busiest["hour"]
+                busiest_bytes = busiest["upload_bytes"] + busiest["download_bytes"]
+                if peak is None or busiest_bytes > peak["bytes"]:
+                    peak = {"date": day_entry["date"], "hour": busiest["hour"], "bytes": busiest_bytes}
+        history.append(day_entry)
+
+    return {
+        "username": username.lower(),
+        "days": history,
+        "upload_bytes": sum(d["upload_bytes"] for d in history),
+        "download_bytes": sum(d["download_bytes"] for d in history),
+        "peak_hour": peak,
+    }
+
 def kick_expired_users():
     """
     Finds and kicks users who have expired by date or traffic limit.
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import logging
+from typing import Any, Dict
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_DIR, 'scripts'))
+
+import traffic
+from expiry_scheduler import ExpiryScheduler
+from db.database import db, ARCHIVE_AFTER_DAYS
+from paths import COLLECTOR_SOCKET
+
+DEFAULT_POLL_INTERVAL = 15
+DEFAULT_KICK_INTERVAL = 60
+DEFAULT_FLUSH_INTERVAL = 15
+ROLLUP_INTERVAL = 3600
+ARCHIVE_INTERVAL = 86400
+
+logger = logging.getLogger("TrafficCollector")
+
+
+class TrafficCollector:
+    '''
+    Resident replacement for the per-minute `cli.py traffic-status --no-gui` fork.
+
+    One TrafficManager (and therefore one DB client and one HTTP session to the
+    Hysteria2 stats API) lives for the whole process. The API is drained into
+    the write-ahead spool at a fixed cadence, independently of MongoDB; the
+    spool is flushed to the DB on its own interval, and both can also be
+    triggered on demand over a local Unix socket.
+    '''
+
+    def __init__(self, manager: traffic.TrafficManager, poll_interval: float, flush_interval: float,
+                 kick_interval: float, socket_path: str, archive_after_days: int = ARCHIVE_AFTER_DAYS):
+        self.manager = manager
+        self.poll_interval = poll_interval
+        self.flush_interval = flush_interval
+        self.kick_interval = kick_interval
+        self.socket_path = socket_path
+        self.archive_after_days = archive_after_days
+        self._cycle_lock = asyncio.Lock()
+        self._last_kick = 0.0
+        self.expiry = ExpiryScheduler(self.expire_user)
+        manager.expiry_listener = self.expiry.update
+
+    async def run_cycle(self, force_kick: bool = False) -> Dict[str, Any]:
+        await asyncio.to_thread(self.manager.poll)
+        return await self.flush(force_kick)
+
+    async def flush(self, force_kick: bool = False) -> Dict[str, Any]:
+        async with self._cycle_lock:
+            await asyncio.to_thread(self.manager.flush_spool)
+            now = time.monotonic()
+            if force_kick or now - self._last_kick >= self.kick_interval:
+                await asyncio.to_thread(self.manager.kick_expired_users)
+                self._last_kick = now
+            return dict(self.manager.last_cycle)
+
+    async def rollup_forever(self):
+        try:
+            await asyncio.to_thread(self.manager.db.ensure_traffic_history_indexes)
+            await asyncio.to_thread(self.manager.db.ensure_user_indexes)
+        except Exception:
+            logger.exception("Failed to create traffic indexes")
+        while True:
+            await asyncio.to_thread(self.manager.rollup_traffic_history)
+            await asyncio.sleep(ROLLUP_INTERVAL)
+
+    async def archive_forever(self):
+        """Once a day, moves users blocked or expired for more than archive_after_days to the archive."""
+        if self.archive_after_days <= 0:
+            return
+        while True:
+            older_than = datetime.datetime.now() - datetime.timedelta(days=self.archive_after_days)
+            try:
+                archived = await asyncio.to_thread(self.manager.db.archive_users, older_than)
+                if archived:
+                    logger.info(f"Archived {archived} users inactive for more than {self.archive_after_days} days")
+            except Exception:
+                logger.exception("Failed to archive inactive users")
+            await asyncio.sleep(ARCHIVE_INTERVAL)
+
+    async def expire_user(self, username: str):
+        await asyncio.to_thread(self.manager.expire_user, username)
+
+    async def expiry_forever(self):
+        while True:
+            try:
+                schedule = await asyncio.to_thread(self.manager.db.get_expiry_schedule)
+                break
+            except Exception:
+                logger.exception("Failed to load the expiry schedule, retrying")
+                await asyncio.sleep(self.kick_interval)
+        self.expiry.rebuild(schedule)
+        logger.info(f"Expiry scheduler tracking {len(self.expiry)} users")
+        await self.expiry.run()
+
+    async def reschedule(self, usernames) -> Dict[str, Any]:
+        scheduled = {}
+        for username in usernames:
+            expires_at = await asyncio.to_thread(self.manager.db.get_user_expiry, username)
+            self.expiry.update(username, expires_at)
+            scheduled[username] = expires_at.isoformat() if expires_at else None
+        return scheduled
+
+    async def poll_forever(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.manager.poll)
+            except Exception:
+                logger.exception("Traffic poll failed")
+            await asyncio.sleep(self.poll_interval)
+
+    async def flush_forever(self):
+        while True:
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Traffic flush failed")
+            await asyncio.sleep(self.flush_interval)
+
+    async def handle_command(self, request: Dict[str, Any]) -> Any:
+        command = request.get('command')
+        if command == 'ping':
+            return 'pong'
+        if command == 'flush':
+            return await self.run_cycle()
+        if command == 'stats':
+            return dict(self.manager.last_cycle)
+        if command == 'reschedule':
+            return await self.reschedule(request.get('usernames') or [])
+        if command == 'top':
+            window = request.get('window')
+            return self.manager.top_talkers.top(int(request.get('limit', 10)), float(window) if window else None)
+        raise ValueError(f"Unknown command: {command}")
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            line = await reader.readline()
+            try:
+                result = await self.handle_command(json.loads(line))
+                response = {'ok': True, 'result': result}
+            except Exception as e:
+                response = {'ok': False, 'error': str(e)}
+            writer.write(json.dumps(response).encode() + b"\n")
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        logger.info(f"Traffic collector listening on {self.socket_path}, polling every {self.poll_interval}s")
+        async with server:
+            await asyncio.gather(
+                server.serve_forever(),
+                self.poll_forever(),
+                self.flush_forever(),
+                self.rollup_forever(),
+                self.expiry_forever(),
+                self.archive_forever(),
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resident Hysteria2 traffic collector.")
+    parser.add_argument("--interval", type=float, default=float(os.getenv("TRAFFIC_POLL_INTERVAL", DEFAULT_POLL_INTERVAL)),
+                        help=f"Seconds between traffic polls (default: {DEFAULT_POLL_INTERVAL}).")
+    parser.add_argument("--flush-interval", type=float, default=float(os.getenv("TRAFFIC_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)),
+                        help=f"Seconds between spool flushes to MongoDB (default: {DEFAULT_FLUSH_INTERVAL}).")
+    parser.add_argument("--kick-interval", type=float, default=float(os.getenv("TRAFFIC_KICK_INTERVAL", DEFAULT_KICK_INTERVAL)),
+                        help=f"Seconds between expiry/quota enforcement passes (default: {DEFAULT_KICK_INTERVAL}).")
+    parser.add_argument("--socket", default=str(COLLECTOR_SOCKET), help="Path of the local control socket.")
+    parser.add_argument("--archive-after-days", type=int, default=ARCHIVE_AFTER_DAYS,
+                        help=f"Archive users blocked or expired this many days ago; 0 disables (default: {ARCHIVE_AFTER_DAYS}).")
+    args = parser.parse_args()
+
+    try:
+        manager = traffic.TrafficManager(db_conn=db, api_base_url=traffic.API_BASE_URL)
+    except ValueError as e:
+        logger.critical(str(e))
+        sys.exit(1)
+
+    collector = TrafficCollector(manager, args.interval, args.flush_interval, args.kick_interval, args.socket,
+                                 args.archive_after_days)
+    try:
+        asyncio.run(collector.serve())
+    except KeyboardInterrupt:
+        logger.info("Shutting down traffic collector")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import os
+import json
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from hysteria2_client import get_client
+
+NODES_FILE = '/etc/hysteria/nodes.json'
+DEFAULT_NODE_TIMEOUT = 5.0
+# The collector's name for this server's own samples; no remote node may use it.
+LOCAL_NODE = 'local'
+
+
+@dataclass(frozen=True)
+class StatsNode:
+    name: str
+    url: str
+    secret: str
+    timeout: float = DEFAULT_NODE_TIMEOUT
+
+
+class NodeRegistry:
+    '''
+    Remote Hysteria2 nodes whose traffic stats API the collector polls.
+
+    Only entries of nodes.json that carry a `stats_url` take part; the file is
+    re-read whenever its mtime changes, so adding or removing a node does not
+    need a collector restart.
+    '''
+
+    def __init__(self, path: str = NODES_FILE):
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._nodes: List[StatsNode] = []
+
+    def nodes(self) -> List[StatsNode]:
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            self._mtime, self._nodes = None, []
+            return self._nodes
+        if mtime != self._mtime:
+            self._nodes = self._load()
+            self._mtime = mtime
+        return self._nodes
+
+    def _load(self) -> List[StatsNode]:
+        try:
+            with open(self.path, 'r') as f:
+                content = f.read()
+            entries = json.loads(content) if content.strip() else []
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Failed to read nodes from {self.path}: {e}")
+            return []
+        nodes = []
+        for entry in entries:
+            if not entry.get('stats_url'):
+                continue
+            if entry['name'] == LOCAL_NODE:
+                logging.error(f"Ignoring node '{LOCAL_NODE}' in {self.path}: the name is reserved for this server")
+                continue
+            nodes.append(StatsNode(
+                name=entry['name'],
+                url=entry['stats_url'].rstrip('/'),
+                secret=entry.get('stats_secret', ''),
+                timeout=float(entry.get('stats_timeout', DEFAULT_NODE_TIMEOUT)),
+            ))
+        return nodes
+
+
+async def _fetch_node(node: StatsNode) -> Dict[str, Any]:
+    client = get_client(node.url, node.secret, node.timeout)
+    # Read presence before draining so a failed drain never loses counters.
+    online = await client.get_online_clients()
+    traffic = await client.get_traffic_stats(clear=True)
+    return {
+        'traffic': {
+            user: [stats.upload_bytes, stats.download_bytes]
+            for user, stats in traffic.items()
+            if stats.upload_bytes or stats.download_bytes
+        },
+        'online': {user: status.connections for user, status in online.items()},
+    }
+
+
+async def poll_nodes(nodes: List[StatsNode]) -> Dict[str, Dict[str, Any]]:
+    """
+    Drains every node concurrently. Returns {node name: {'traffic', 'online'}}
+    for the nodes that answered; unreachable nodes are logged and left out.
+    """
+    results = await asyncio.gather(*(_fetch_node(node) for node in nodes), return_exceptions=True)
+    drained = {}
+    for node, result in zip(nodes, results):
+        if isinstance(result, BaseException):
+            logging.error(f"Failed to poll traffic from node '{node.name}': {result!r}")
+            continue
+        drained[node.name] = result
+    return drained
+
+
+async def kick_on_nodes(targets: Dict[StatsNode, List[str]]):
+    """Sends each node the usernames to kick on it, all nodes concurrently."""
+    targets = {node: users for node, users in targets.items() if users}
+    results = await asyncio.gather(
+        *(get_client(node.url, node.secret, node.timeout).kick_clients(users) for node, users in targets.items()),
+        return_exceptions=True,
+    )
+    for (node, users), result in zip(targets.items(), results):
+        if isinstance(result, BaseException):
+            logging.error(f"Failed to kick {', '.join(users)} on node '{node.name}': {result!r}")
+        else:
+            logging.info(f"Kicked users on node '{node.name}': {', '.join(users)}")
+
+
+def merge_node_samples(samples: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Sums per-node traffic and connection counts into one {'traffic', 'online'} sample."""
+    traffic: Dict[str, List[int]] = {}
+    online: Dict[str, int] = {}
+    for sample in samples.values():
+        for user, (tx, rx) in sample['traffic'].items():
+            totals = traffic.setdefault(user, [0, 0])
+            totals[0] += tx
+            totals[1] += rx
+        for user, count in sample['online'].items():
+            online[user] = online.get(user, 0) + count
+    return {'traffic': traffic, 'online': online}
@@ -0,0 +1,128 @@
+import os
+import json
+import fcntl
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+class TrafficSpool:
+    '''
+    Append-only, fsync'd log of traffic drained from the Hysteria2 stats API.
+
+    Every drain is written here before any MongoDB write is attempted, so bytes
+    removed from the server by `get_traffic_stats(clear=True)` survive DB
+    outages and process crashes. Entries carry a monotonically increasing
+    sequence number; the highest sequence fully applied to MongoDB is kept in a
+    checkpoint file next to the spool, and the spool is truncated once every
+    entry in it has been applied. The highest sequence issued is recorded in a
+    third file before each truncation, so losing the checkpoint never restarts
+    the count below what MongoDB has already absorbed.
+
+    The last sequence is kept in memory; the spool is only re-read when it or
+    the checkpoint changed in a way this instance did not cause, i.e. another
+    process appended or committed.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.checkpoint_path = f"{path}.committed"
+        self.high_water_path = f"{path}.seq"
+        self.lock_path = f"{path}.lock"
+        self._last_seq: Optional[int] = None
+        self._fingerprint: Optional[Tuple[int, ...]] = None
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _iter_entries(self) -> Iterator[Dict[str, Any]]:
+        try:
+            with open(self.path, 'r') as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        # A torn final line from a crash mid-append; it was never fsync'd.
+                        logging.warning(f"Skipping unreadable line in traffic spool {self.path}")
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _read_seq(path: str) -> int:
+        try:
+            with open(path, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    @staticmethod
+    def _write_seq(path: str, seq: int):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(str(seq))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _fingerprint_now(self) -> Tuple[int, ...]:
+        fingerprint = []
+        for path in (self.path, self.checkpoint_path):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                fingerprint += [0, 0, 0]
+                continue
+            fingerprint += [stat.st_ino, stat.st_size, stat.st_mtime_ns]
+        return tuple(fingerprint)
+
+    def _last_issued(self) -> int:
+        """The highest sequence handed out so far. Call with the lock held."""
+        fingerprint = self._fingerprint_now()
+        if self._last_seq is None or fingerprint != self._fingerprint:
+            self._last_seq = max([self._read_seq(self.checkpoint_path), self._read_seq(self.high_water_path)]
+                                 + [e.get('seq', 0) for e in self._iter_entries()])
+            self._fingerprint = fingerprint
+        return self._last_seq
+
+    def append(self, entry: Dict[str, Any]) -> int:
+        """Durably appends `entry` under the next sequence number and returns it."""
+        with self.locked():
+            record = dict(entry, seq=self._last_issued() + 1)
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(record, separators=(',', ':')) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._last_seq = record['seq']
+            self._fingerprint = self._fingerprint_now()
+            return record['seq']
+
+    def pending(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yields entries not yet applied to MongoDB, oldest first, reading the
+        spool only as far as the caller gets. Safe to use without the lock: a
+        line still being appended is skipped until complete.
+        """
+        committed = self._read_seq(self.checkpoint_path)
+        return (e for e in self._iter_entries() if e.get('seq', 0) > committed)
+
+    def backlog(self) -> int:
+        """The number of entries appended but not yet applied."""
+        with self.locked():
+            return max(0, self._last_issued() - self._read_seq(self.checkpoint_path))
+
+    def commit(self, seq: int):
+        """Marks every entry up to `seq` as applied and drops the spool once it is fully applied."""
+        with self.locked():
+            last_seq = self._last_issued()
+            self._write_seq(self.checkpoint_path, seq)
+            if seq >= last_seq:
+                self._write_seq(self.high_water_path, last_seq)
+                with open(self.path, 'w') as f:
+                    os.fsync(f.fileno())
+            self._fingerprint = self._fingerprint_now()
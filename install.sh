@@ -246,6 +246,15 @@ setup_python_env() {
     fi
 }
 
+run_db_migrations() {
+    log_info "Создание индексов и схемы MongoDB..."
+    if python3 /etc/hysteria/core/scripts/db/migrations.py &> /dev/null; then
+        log_success "Схема базы данных готова"
+    else
+        log_warning "Не удалось применить миграции базы данных. Их можно повторить командой: python3 /etc/hysteria/core/scripts/db/migrations.py"
+    fi
+}
+
 add_alias() {
     log_info "Добавление алиаса 'hys2' в .bashrc..."
     
@@ -296,6 +305,7 @@ main() {
     install_packages
     download_and_extract_release
     setup_python_env
+    run_db_migrations
     add_alias
     setup_main_node_label
     
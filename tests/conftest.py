@@ -0,0 +1,25 @@
+import sys
+from pathlib import Path
+
+import mongomock
+import pytest
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT_DIR / "benchmarks"))
+
+# Puts the panel's modules on sys.path and swaps MongoClient for mongomock, as the
+# benchmarks' in-memory backend does, before any test imports db.database.
+import backend  # noqa: E402
+
+backend._use_mongomock()
+
+from db.database import Database  # noqa: E402
+from db.sqlite_database import SQLiteDatabase  # noqa: E402
+
+
+@pytest.fixture(params=["mongo", "sqlite"])
+def database(request, tmp_path):
+    """A fresh, empty database on each storage backend."""
+    if request.param == "sqlite":
+        return SQLiteDatabase(tmp_path / "panel.db")
+    return Database(client=mongomock.MongoClient())
@@ -0,0 +1,25 @@
+import datetime
+
+
+def add(database, username, **fields):
+    database.add_user(dict({"username": username, "password": username, "max_download_bytes": 0,
+                            "expiration_days": 0, "account_creation_date": "2026-01-01"}, **fields))
+
+
+def test_restored_users_get_a_fresh_grace_period(database):
+    add(database, "bob")
+    add(database, "erin", expiration_days=30, account_creation_date="2020-01-01",
+        expires_at=datetime.datetime(2020, 1, 31))
+    database.block_users(["bob"])
+    soon = datetime.datetime.now() + datetime.timedelta(seconds=1)
+    assert database.archive_users(soon) == 2
+
+    assert database.restore_user("bob")["blocked"] is True
+    assert database.restore_user("erin")["_id"] == "erin"
+
+    # The archive pass that follows a restore leaves both users alone...
+    assert database.archive_users(datetime.datetime.now() - datetime.timedelta(seconds=1)) == 0
+    assert {user["_id"] for user in database.iter_users(["_id"])} == {"bob", "erin"}
+
+    # ...until the restarted clock runs out.
+    assert database.archive_users(datetime.datetime.now() + datetime.timedelta(seconds=1)) == 2
@@ -0,0 +1,147 @@
+import asyncio
+import datetime
+import time
+
+import mongomock
+import pytest
+
+import auth_server
+from db.database import Database
+
+
+def add(database, username, **fields):
+    database.add_user(dict({"username": username, "password": f"{username}-pw", "max_download_bytes": 0,
+                            "expiration_days": 0, "account_creation_date": "2026-01-01"}, **fields))
+
+
+@pytest.fixture
+def auth_db(database, monkeypatch):
+    monkeypatch.setattr(auth_server, "db", database)
+    monkeypatch.setattr(auth_server, "users_data", auth_server.users_data)
+    return database
+
+
+def test_fetch_changed_users_reads_only_newer_writes_and_named_users(auth_db):
+    add(auth_db, "alice")
+    add(auth_db, "bob")
+    since = datetime.datetime.now()
+    time.sleep(0.01)  # MongoDB keeps milliseconds
+    auth_db.update_user("bob", {"password": "new-pw"})
+
+    changed, removed = auth_server.fetch_changed_users(since, {"alice", "ghost"})
+
+    assert set(changed) == {"alice", "bob"}
+    assert changed["bob"].password == "new-pw"
+    assert removed == {"ghost"}
+
+
+async def refresh_until(app, condition):
+    task = asyncio.create_task(auth_server.refresh_users(app))
+    try:
+        for _ in range(200):
+            app['users_wake'].set()
+            await asyncio.sleep(0.01)
+            if condition():
+                return True
+        return False
+    finally:
+        task.cancel()
+
+
+def test_refresh_applies_edits_and_deletes(auth_db, monkeypatch):
+    monkeypatch.setattr(auth_server, "REFRESH_INTERVAL", 0.01)
+    add(auth_db, "alice")
+    add(auth_db, "bob")
+
+    async def scenario():
+        app = {'users_wake': asyncio.Event(), 'users_pending': set()}
+        await auth_server.load_users(app)
+        assert set(auth_server.users_data) == {"alice", "bob"}
+
+        auth_db.update_user("alice", {"blocked": True})
+        assert await refresh_until(app, lambda: auth_server.users_data["alice"].blocked)
+
+        # A delete leaves no updated_at behind; the change event names the user instead.
+        auth_db.delete_user("bob")
+        app['users_pending'].add("bob")
+        assert await refresh_until(app, lambda: "bob" not in auth_server.users_data)
+
+    asyncio.run(scenario())
+
+
+def test_refresh_rereads_writes_stamped_just_before_the_watermark(monkeypatch):
+    auth_db = Database(client=mongomock.MongoClient())
+    monkeypatch.setattr(auth_server, "db", auth_db)
+    monkeypatch.setattr(auth_server, "users_data", auth_server.users_data)
+    monkeypatch.setattr(auth_server, "REFRESH_INTERVAL", 0.01)
+    add(auth_db, "alice")
+
+    async def scenario():
+        app = {'users_wake': asyncio.Event(), 'users_pending': set()}
+        await auth_server.load_users(app)
+        # A write stamped before the load started but committed after it.
+        late = app['users_watermark'] + auth_server.WATERMARK_OVERLAP / 2
+        auth_db.collection.update_one({"_id": "alice"}, {"$set": {"password": "late-pw", "updated_at": late}})
+        assert await refresh_until(app, lambda: auth_server.users_data["alice"].password == "late-pw")
+
+    asyncio.run(scenario())
+
+
+class Handshake:
+    def __init__(self, auth):
+        self._payload = {"auth": auth}
+
+    async def json(self):
+        return self._payload
+
+
+def handshake(username, password):
+    response = asyncio.run(auth_server.authenticate(Handshake(f"{username}:{password}")))
+    return response.status, response.text
+
+
+def test_verdict_expiry_and_quota():
+    today = datetime.date.today()
+    user = {"password": "pw", "account_creation_date": today.strftime("%Y-%m-%d"), "expiration_days": 30,
+            "max_download_bytes": 100, "upload_bytes": 40, "download_bytes": 59}
+
+    verdict = auth_server.verdict(user)
+    assert verdict.allowed_until == int(datetime.datetime.combine(today + datetime.timedelta(days=30),
+                                                                  datetime.time()).timestamp())
+    assert not verdict.quota_exhausted
+    assert auth_server.verdict(dict(user, download_bytes=60)).quota_exhausted
+    assert auth_server.verdict(dict(user, max_download_bytes=0, download_bytes=10**12)).quota_exhausted is False
+    assert auth_server.verdict(dict(user, expiration_days=0)).allowed_until == 0
+
+
+def test_authenticate_judges_the_precomputed_verdict(monkeypatch):
+    long_ago = "2020-01-01"
+    users = {
+        "ok": {"password": "pw", "expiration_days": 0},
+        "expired": {"password": "pw", "account_creation_date": long_ago, "expiration_days": 30},
+        "over": {"password": "pw", "max_download_bytes": 10, "upload_bytes": 4, "download_bytes": 6},
+        "blocked": {"password": "pw", "blocked": True},
+    }
+    monkeypatch.setattr(auth_server, "users_data", auth_server.users_data)
+    auth_server.swap_users({name: auth_server.verdict(user) for name, user in users.items()})
+
+    assert handshake("ok", "pw")[0] == 200
+    assert handshake("ok", "wrong") == (401, '{"ok": false, "msg": "Invalid password"}')
+    assert handshake("expired", "pw") == (401, '{"ok": false, "msg": "Account expired"}')
+    assert handshake("over", "pw") == (401, '{"ok": false, "msg": "Data limit exceeded"}')
+    assert handshake("blocked", "pw") == (401, '{"ok": false, "msg": "User is blocked"}')
+    assert handshake("nobody", "pw") == (401, '{"ok": false, "msg": "User not found"}')
+
+
+def test_swap_publishes_a_new_read_only_snapshot(monkeypatch):
+    monkeypatch.setattr(auth_server, "users_data", auth_server.users_data)
+    auth_server.swap_users({"alice": auth_server.verdict({"password": "a"})})
+    held = auth_server.users_data
+
+    index = dict(held)
+    index["bob"] = auth_server.verdict({"password": "b"})
+    auth_server.swap_users(index)
+
+    assert set(held) == {"alice"} and set(auth_server.users_data) == {"alice", "bob"}
+    with pytest.raises(TypeError):
+        auth_server.users_data["carol"] = auth_server.verdict({"password": "c"})
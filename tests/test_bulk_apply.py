@@ -0,0 +1,32 @@
+import datetime
+import time
+
+import mongomock
+
+from db.database import Database
+
+
+def test_each_chunk_is_stamped_when_it_is_written():
+    database = Database(client=mongomock.MongoClient())
+    for name in ("alice", "bob", "carol"):
+        database.add_user({"username": name, "password": name, "max_download_bytes": 0, "expiration_days": 0,
+                           "account_creation_date": "2026-01-01"})
+
+    bulk_write = database.collection.bulk_write
+    written_at = []
+
+    def slow_bulk_write(operations, **kwargs):
+        result = bulk_write(operations, **kwargs)
+        written_at.append(datetime.datetime.now())
+        time.sleep(0.05)
+        return result
+
+    database.collection.bulk_write = slow_bulk_write
+    result = database.bulk_apply([(name, None, {"upload_bytes": 1}) for name in ("alice", "bob", "carol")]
+                                 + [("dave", {}, None)], chunk_size=1)
+
+    assert result.modified_count == 3
+    assert len(written_at) == 3
+    stamps = [database.get_user(name)["updated_at"] for name in ("alice", "bob", "carol")]
+    for previous_write, stamp in zip(written_at, stamps[1:]):
+        assert stamp > previous_write
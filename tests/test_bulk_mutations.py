@@ -0,0 +1,44 @@
+def add(database, username, **fields):
+    database.add_user(dict({"username": username, "password": f"{username}-pw", "max_download_bytes": 0,
+                            "expiration_days": 0, "account_creation_date": "2026-01-01"}, **fields))
+
+
+NAMES = ["user0", "user1", "user2", "user3", "user4"]
+
+
+def test_bulk_apply_across_chunks_is_idempotent_per_seq(database):
+    for name in NAMES:
+        add(database, name)
+    assert database.get_user("user4").get("upload_bytes") is None  # now cached
+
+    changes = [(name, {"status": "Online"}, {"upload_bytes": 5}) for name in NAMES] + [("user0", None, None)]
+    assert database.bulk_apply(changes, seq=1, chunk_size=2).modified_count == 5
+    assert database.bulk_apply(changes, seq=1, chunk_size=2).modified_count == 0
+
+    assert {database.get_user(name)["upload_bytes"] for name in NAMES} == {5}
+    assert database.get_user("user4")["status"] == "Online"
+
+
+def test_block_users_skips_those_already_blocked(database):
+    for name in NAMES:
+        add(database, name, status="Online", online_count=2)
+    database.block_users(["user0"])
+    blocked_at = database.get_user("user0")["blocked_at"]
+
+    result = database.block_users([name.upper() for name in NAMES], chunk_size=2)
+
+    assert result.modified_count == 4
+    assert database.get_user("user0")["blocked_at"] == blocked_at
+    assert all(user["blocked"] and user["status"] == "Offline" and user["online_count"] == 0
+               for user in database.iter_users())
+
+
+def test_update_users_many_and_delete_users(database):
+    for name in NAMES:
+        add(database, name)
+
+    assert database.update_users_many({"_id": {"$in": ["user1", "user2"]}}, {"note": "x"}).modified_count == 2
+    assert sorted(u["_id"] for u in database.iter_users(["note"]) if u.get("note") == "x") == ["user1", "user2"]
+
+    database.delete_users(["user1", "user3"])
+    assert sorted(u["_id"] for u in database.iter_users(["_id"])) == ["user0", "user2", "user4"]
@@ -0,0 +1,12 @@
+from db.database import connection_error
+from db.sqlite_database import SQLiteDatabase
+
+
+def test_connection_error_is_none_when_the_database_answers(database):
+    assert connection_error(database) is None
+
+
+def test_connection_error_names_the_sqlite_file_it_cannot_open(tmp_path):
+    path = tmp_path / "missing" / "panel.db"
+    error = connection_error(SQLiteDatabase(path))
+    assert error.startswith("Database connection failed.") and str(path) in error
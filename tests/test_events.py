@@ -0,0 +1,72 @@
+import os
+import threading
+
+import mongomock
+
+from db import events
+from db.user_cache import UserCache
+
+
+def change(operation, updated=None, removed=()):
+    doc = {"operationType": operation, "documentKey": {"_id": f"{operation}-{sorted(updated or {})}"}}
+    if operation == "update":
+        doc["updateDescription"] = {"updatedFields": updated or {}, "removedFields": list(removed)}
+    return doc
+
+
+def test_change_stream_skips_traffic_cycle_updates():
+    changes = mongomock.MongoClient().db.changes
+    changes.insert_many([
+        change("update", {"upload_bytes": 10, "download_bytes": 20, "total_bytes": 30, "updated_at": 1,
+                          "last_traffic_seq": 7, "status": "Online", "online_count": 2}),
+        change("update", {"online_count": 0}),
+        change("update", {"blocked": True, "updated_at": 1}),
+        change("update", {"updated_at": 1}, removed=["expires_at"]),
+        change("insert"),
+        change("delete"),
+    ])
+
+    kept = [(doc["operationType"], sorted(doc.get("updateDescription", {}).get("updatedFields", {})))
+            for doc in changes.aggregate(events.change_stream_pipeline())]
+
+    assert kept == [("update", ["blocked", "updated_at"]), ("update", ["updated_at"]), ("insert", []), ("delete", [])]
+
+
+def test_events_reach_subscribers_in_a_private_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_DIR", str(tmp_path / "events"))
+    received = threading.Event()
+    subscription = events.Subscription(lambda event: received.set(), "test").start()
+    try:
+        assert oct(os.stat(events.EVENTS_DIR).st_mode & 0o777) == oct(0o700)
+        assert events.publish(events.USER_CHANGED, ["alice"]) == 1
+        assert received.wait(5)
+    finally:
+        subscription.close()
+
+
+def test_a_directory_other_users_can_write_is_not_used(tmp_path, monkeypatch):
+    shared = tmp_path / "events"
+    shared.mkdir()
+    shared.chmod(0o777)
+    monkeypatch.setattr(events, "EVENTS_DIR", str(shared))
+    (shared / "planted.sock").touch()
+
+    subscription = events.Subscription(lambda event: None, "test").start()
+    assert not os.path.exists(subscription.path)
+    assert events.publish(events.USER_CHANGED, ["alice"]) == 0
+    subscription.close()
+
+
+def test_follow_evicts_users_another_process_changed(tmp_path, monkeypatch):
+    monkeypatch.setattr(events, "EVENTS_DIR", str(tmp_path / "events"))
+    cache = UserCache()
+    cache.put({"_id": "alice", "password": "a"})
+    cache.put({"_id": "bob", "password": "b"})
+    seen = threading.Event()
+    subscription = events.follow(cache, "test", on_event=lambda event: seen.set())
+    try:
+        events.publish(events.USER_CHANGED, ["alice"])
+        assert seen.wait(5)
+        assert cache.get("alice") is None and cache.get("bob") is not None
+    finally:
+        subscription.close()
@@ -0,0 +1,34 @@
+import datetime
+
+import mongomock
+
+from db import migrate_backend
+from db.database import Database
+from db.sqlite_database import SQLiteDatabase
+
+
+def test_copy_round_trip_keeps_archived_users(tmp_path):
+    mongo = Database(client=mongomock.MongoClient())
+    for username in ("alice", "bob"):
+        mongo.add_user({"username": username, "password": username, "max_download_bytes": 0, "expiration_days": 0})
+    mongo.record_traffic_buckets({"alice": (1, 2)}, datetime.datetime.now())
+    mongo.block_users(["bob"])
+    assert mongo.archive_users(datetime.datetime.now() + datetime.timedelta(seconds=1)) == 1
+
+    sqlite = SQLiteDatabase(tmp_path / "panel.db")
+    assert migrate_backend.copy_database(mongo, sqlite) == (1, 1, 1)
+    assert migrate_backend.verify_copy(mongo, sqlite) == []
+    assert sqlite.get_archived_user("bob")["blocked"] is True
+
+    back = Database(client=mongomock.MongoClient())
+    assert migrate_backend.copy_database(sqlite, back) == (1, 1, 1)
+    assert migrate_backend.verify_copy(sqlite, back) == []
+    assert back.restore_user("bob")["_id"] == "bob"
+
+
+def test_verify_reports_missing_archived_users(tmp_path):
+    mongo = Database(client=mongomock.MongoClient())
+    mongo.put_archived_users([{"_id": "carol", "blocked": True}])
+    assert migrate_backend.verify_copy(mongo, SQLiteDatabase(tmp_path / "panel.db")) == [
+        "1 archived users missing from the target"
+    ]
@@ -0,0 +1,23 @@
+import mongomock
+
+from db import migrations
+from db.database import Database
+
+
+def index_keys(collection):
+    return {tuple(key for key, _ in spec["key"]) for spec in collection.index_information().values()}
+
+
+def test_early_migrations_build_only_their_own_indexes():
+    database = Database(client=mongomock.MongoClient())
+    migrations.migrate(database, target=2)
+
+    assert index_keys(database.collection) == {("_id",), ("expires_at",), ("total_bytes",)}
+    assert {("username", "day"), ("expire_at",)} <= index_keys(database.traffic_history)
+
+
+def test_later_migrations_add_the_remaining_user_indexes():
+    database = Database(client=mongomock.MongoClient())
+    migrations.migrate(database)
+
+    assert {("password",), ("blocked_at",), ("updated_at",)} <= index_keys(database.collection)
@@ -0,0 +1,20 @@
+import os
+
+import presence
+
+
+def test_snapshot_is_private_and_round_trips(tmp_path):
+    path = tmp_path / "run" / "presence.json"
+    presence.write_snapshot({"alice": 2, "bob": 0}, {"alice": ["local"]}, version=3, path=path)
+
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    snapshot = presence.read_snapshot(path=path)
+    assert (snapshot["version"], snapshot["online"]) == (3, {"alice": 2})
+
+
+def test_a_snapshot_others_could_have_written_is_ignored(tmp_path):
+    path = tmp_path / "presence.json"
+    presence.write_snapshot({"alice": 1}, {}, version=1, path=path)
+    os.chmod(path, 0o666)
+
+    assert presence.read_snapshot(path=path) is None
@@ -0,0 +1,63 @@
+import datetime
+
+import mongomock
+
+from db import migrations
+from db.database import Database
+
+
+def add(database, username, plan="standard"):
+    database.add_user({"username": username, "password": username, "plan": plan, "max_download_bytes": 0,
+                       "expiration_days": 0, "account_creation_date": "2026-01-01"})
+
+
+def totals_over_users(database):
+    users = list(database.iter_users())
+    plans = {}
+    for user in users:
+        plans[user.get("plan") or "standard"] = plans.get(user.get("plan") or "standard", 0) + 1
+    return (sum(u.get("upload_bytes") or 0 for u in users), sum(u.get("download_bytes") or 0 for u in users), plans)
+
+
+def reported(database):
+    stats = database.get_server_stats()
+    plans = {plan: count for plan, count in stats.get("plans", {}).items() if count}
+    return stats.get("upload_bytes", 0), stats.get("download_bytes", 0), plans
+
+
+def test_totals_stay_the_sum_over_users(database):
+    for username, plan in (("alice", "standard"), ("bob", "premium"), ("carol", "standard"), ("dave", "premium")):
+        add(database, username, plan)
+    database.bulk_apply([(name, None, {"upload_bytes": up, "download_bytes": down})
+                         for name, up, down in (("alice", 10, 20), ("bob", 30, 40), ("carol", 5, 6), ("dave", 7, 8))])
+    database.update_server_stats(52, 74)
+    assert reported(database) == totals_over_users(database)
+
+    database.reset_user("alice")
+    assert reported(database) == totals_over_users(database)
+
+    database.delete_user("bob")
+    assert reported(database) == totals_over_users(database)
+
+    database.block_users(["carol"])
+    assert database.archive_users(datetime.datetime.now() + datetime.timedelta(seconds=1)) == 1
+    assert reported(database) == totals_over_users(database)
+
+    database.restore_user("carol")
+    assert reported(database) == totals_over_users(database)
+
+
+def test_migration_rebuilds_partial_totals():
+    database = Database(client=mongomock.MongoClient())
+    database.collection.insert_many([
+        {"_id": "alice", "plan": "premium", "upload_bytes": 10, "download_bytes": 20},
+        {"_id": "bob", "upload_bytes": 1, "download_bytes": 2},
+    ])
+    database.meta.insert_one({"_id": migrations.SCHEMA_VERSION_ID, "version": 6})
+    # What the first traffic cycle after an upgrade leaves behind.
+    database.update_server_stats(3, 4)
+
+    migrations.migrate(database)
+
+    stats = database.get_server_stats()
+    assert (stats["upload_bytes"], stats["download_bytes"], stats["plans"]) == (11, 22, {"premium": 1, "standard": 1})
@@ -0,0 +1,66 @@
+import datetime
+import time
+
+
+def add(database, username, **fields):
+    return database.add_user(dict({"username": username, "password": f"{username}-pw", "max_download_bytes": 0,
+                                   "expiration_days": 0, "account_creation_date": "2026-01-01"}, **fields))
+
+
+def names(users):
+    return sorted(user["_id"] for user in users)
+
+
+def test_users_round_trip(database):
+    assert add(database, "Alice", plan="premium") is not None
+    assert add(database, "alice") is None
+
+    user = database.get_user("ALICE")
+    assert (user["_id"], user["password"], user["plan"]) == ("alice", "Alice-pw", "premium")
+    assert isinstance(user["updated_at"], datetime.datetime)
+    assert database.get_user_by_password("Alice-pw")["_id"] == "alice"
+
+    database.update_user("alice", {"note": "vip"})
+    assert database.get_user("alice")["note"] == "vip"
+    assert list(database.iter_users(["note"])) == [{"_id": "alice", "note": "vip"}]
+
+    database.rename_user("alice", "alicia")
+    assert database.get_user("alice") is None and database.get_user("alicia")["note"] == "vip"
+
+
+def test_enforcement_queries(database):
+    now = datetime.datetime.now()
+    add(database, "expired", expires_at=now - datetime.timedelta(days=1))
+    add(database, "current", expires_at=now + datetime.timedelta(days=1))
+    add(database, "over", max_download_bytes=100, total_bytes=100)
+    add(database, "under", max_download_bytes=100, total_bytes=99)
+
+    assert names(database.find_expired_users(now)) == ["expired"]
+    assert names(database.find_over_quota_users()) == ["over"]
+    assert sorted(name for name, _ in database.get_expiry_schedule()) == ["current", "expired"]
+
+    assert database.block_if_expired("current", now) is False
+    assert database.block_if_expired("expired", now) is True
+    assert database.get_user("expired")["blocked"] is True
+    assert database.find_expired_users(now) == []
+
+
+def test_updated_since_sees_only_later_writes(database):
+    add(database, "alice")
+    add(database, "bob")
+    since = max(user["updated_at"] for user in database.iter_users(["updated_at"]))
+    time.sleep(0.01)  # MongoDB keeps milliseconds
+    database.update_user("bob", {"blocked": True})
+    assert names(database.iter_users_updated_since(since)) == ["bob"]
+
+
+def test_traffic_history_buckets(database):
+    add(database, "alice")
+    when = datetime.datetime(2026, 3, 1, 13, 30)
+    database.record_traffic_buckets({"alice": (10, 20)}, when, seq=1)
+    database.record_traffic_buckets({"alice": (10, 20)}, when, seq=1)  # a replay adds nothing
+    database.record_traffic_buckets({"alice": (1, 2)}, when, seq=2)
+
+    day = datetime.datetime(2026, 3, 1)
+    [bucket] = database.get_traffic_history("alice", day, day)
+    assert (bucket["day"], bucket["tx"], bucket["rx"]) == (day, 11, 22)
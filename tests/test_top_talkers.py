@@ -0,0 +1,28 @@
+import threading
+
+from top_talkers import TopTalkers
+
+
+def test_top_while_polls_are_recorded_concurrently():
+    talkers = TopTalkers(window_polls=50, per_poll=50)
+    traffic = {f"user{i}": [i, i] for i in range(200)}
+    talkers.record(0.0, traffic)
+    talkers.record(1.0, traffic)
+    stop = threading.Event()
+
+    def poll():
+        ts = 1.0
+        while not stop.is_set():
+            ts += 1.0
+            talkers.record(ts, traffic)
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    try:
+        for _ in range(2000):
+            talkers.top(limit=5)
+    finally:
+        stop.set()
+        poller.join()
+
+    assert [entry["username"] for entry in talkers.top(limit=2)] == ["user199", "user198"]
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from fake_stats_server import FakeStatsServer, DEFAULT_SECRET
+from hysteria2_client import run as run_on_client_loop
+from traffic_nodes import LOCAL_NODE, NodeRegistry, StatsNode, kick_on_nodes, merge_node_samples, poll_nodes
+
+
+@pytest.fixture
+def servers():
+    started = [FakeStatsServer([f"user{i}" for i in range(20)], online_ratio=0.5, seed=seed) for seed in (1, 2)]
+    for server in started:
+        server.start()
+    yield started
+    for server in started:
+        server.stop()
+
+
+def test_poll_nodes_drains_every_reachable_node(servers):
+    east, west = servers
+    nodes = [StatsNode("east", east.base_url, DEFAULT_SECRET), StatsNode("west", west.base_url, DEFAULT_SECRET),
+             StatsNode("wrong-secret", east.base_url, "nope", timeout=1.0)]
+
+    drained = run_on_client_loop(poll_nodes(nodes))
+
+    assert set(drained) == {"east", "west"}
+    assert drained["east"]["online"] == east.online
+    assert set(drained["west"]["traffic"]) <= set(west.online)
+    merged = merge_node_samples(drained)
+    assert merged["online"] == {user: east.online.get(user, 0) + west.online.get(user, 0)
+                                for user in set(east.online) | set(west.online)}
+
+
+def test_kick_on_nodes_sends_each_node_its_own_users(servers):
+    east, west = servers
+    east_user, west_user = next(iter(east.online)), next(iter(west.online))
+
+    run_on_client_loop(kick_on_nodes({StatsNode("east", east.base_url, DEFAULT_SECRET): [east_user],
+                                      StatsNode("west", west.base_url, DEFAULT_SECRET): [west_user]}))
+
+    assert east.kicked == [east_user] and west.kicked == [west_user]
+
+
+def test_registry_ignores_a_node_named_like_the_local_server(tmp_path):
+    path = tmp_path / "nodes.json"
+    path.write_text(json.dumps([
+        {"name": LOCAL_NODE, "ip": "10.0.0.1", "stats_url": "http://10.0.0.1:25413"},
+        {"name": "east", "ip": "10.0.0.2", "stats_url": "http://10.0.0.2:25413/", "stats_secret": "s"},
+    ]))
+
+    assert NodeRegistry(str(path)).nodes() == [StatsNode("east", "http://10.0.0.2:25413", "s")]
@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+import traffic
+
+
+@pytest.fixture
+def manager(database, tmp_path, monkeypatch):
+    config_file = tmp_path / "config.json"
+    config_file.write_text('{"trafficStats": {"secret": "test"}}')
+    monkeypatch.setattr(traffic, "CONFIG_FILE", str(config_file))
+    monkeypatch.setattr(traffic, "SPOOL_FILE", str(tmp_path / "traffic_spool.jsonl"))
+    monkeypatch.setattr(traffic, "NODES_FILE", str(tmp_path / "nodes.json"))
+    return traffic.TrafficManager(db_conn=database, api_base_url="http://127.0.0.1:1")
+
+
+def test_replay_records_history_and_totals_after_user_update_committed(manager, database, monkeypatch):
+    database.add_user({"username": "alice", "password": "p", "max_download_bytes": 0, "expiration_days": 0,
+                       "account_creation_date": "2026-01-01", "status": "Offline"})
+    entry = {"seq": 1, "ts": time.time(), "traffic": {"alice": [100, 200]}, "online": {}}
+
+    record_traffic_buckets = database.record_traffic_buckets
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("history write failed")
+
+    monkeypatch.setattr(database, "record_traffic_buckets", fail)
+    with pytest.raises(RuntimeError):
+        manager.apply_entry(entry)
+
+    user = database.get_user("alice")
+    assert (user["upload_bytes"], user["download_bytes"], user["last_traffic_seq"]) == (100, 200, 1)
+
+    monkeypatch.setattr(database, "record_traffic_buckets", record_traffic_buckets)
+    manager.apply_entry(entry)
+    manager.apply_entry(entry)
+
+    database.cache.clear()
+    user = database.get_user("alice")
+    assert (user["upload_bytes"], user["download_bytes"]) == (100, 200)
+    history = database.get_traffic_history("alice", traffic.datetime.datetime(2000, 1, 1),
+                                           traffic.datetime.datetime(2100, 1, 1))
+    assert [(bucket["tx"], bucket["rx"]) for bucket in history] == [(100, 200)]
+    stats = database.get_server_stats()
+    assert (stats["upload_bytes"], stats["download_bytes"]) == (100, 200)
@@ -0,0 +1,41 @@
+import os
+
+from traffic_spool import TrafficSpool
+
+
+def test_appends_do_not_reread_the_spool(tmp_path, monkeypatch):
+    spool = TrafficSpool(str(tmp_path / "spool.jsonl"))
+    reads = []
+    iter_entries = spool._iter_entries
+    monkeypatch.setattr(spool, "_iter_entries", lambda: reads.append(1) or iter_entries())
+
+    assert [spool.append({"n": n}) for n in range(50)] == list(range(1, 51))
+    assert len(reads) == 1
+    assert spool.backlog() == 50
+
+    for entry in spool.pending():
+        spool.commit(entry["seq"])
+    assert len(reads) == 2  # the one pass over the spool that pending() makes
+    assert os.path.getsize(spool.path) == 0 and spool.backlog() == 0
+
+
+def test_sequence_survives_a_lost_checkpoint(tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    spool = TrafficSpool(path)
+    for n in range(3):
+        spool.append({"n": n})
+    spool.commit(3)
+    os.unlink(spool.checkpoint_path)
+
+    assert TrafficSpool(path).append({"n": 3}) == 4
+
+
+def test_instances_sharing_a_spool_never_reuse_a_sequence(tmp_path):
+    path = str(tmp_path / "spool.jsonl")
+    collector, cli = TrafficSpool(path), TrafficSpool(path)
+
+    assert collector.append({}) == 1
+    assert cli.append({}) == 2
+    cli.commit(2)
+    assert collector.append({}) == 3
+    assert [entry["seq"] for entry in cli.pending()] == [3]
@@ -9,6 +9,7 @@ HYSTERIA_VENV_DIR="$HYSTERIA_INSTALL_DIR/hysteria2_venv"
 GEOSITE_URL="https://raw.githubusercontent.com/Chocolate4U/Iran-v2ray-rules/release/geosite.dat"
 GEOIP_URL="https://raw.githubusercontent.com/Chocolate4U/Iran-v2ray-rules/release/geoip.dat"
 MIGRATE_SCRIPT_PATH="$HYSTERIA_INSTALL_DIR/core/scripts/db/migrate_users.py"
+DB_MIGRATIONS_SCRIPT_PATH="$HYSTERIA_INSTALL_DIR/core/scripts/db/migrations.py"
 
 # ========== Настройка цветов ==========
 GREEN=$(tput setaf 2)
@@ -129,6 +130,15 @@ migrate_json_to_mongo() {
     fi
 }
 
+run_db_migrations() {
+    info "Применение миграций схемы и индексов MongoDB..."
+    if python3 "$DB_MIGRATIONS_SCRIPT_PATH"; then
+        success "Схема базы данных обновлена."
+    else
+        warn "Не удалось применить миграции базы данных. Проверьте вывод выше."
+    fi
+}
+
 download_and_extract_latest_release() {
     local arch
     case $(uname -m) in
@@ -174,6 +184,7 @@ ALL_SERVICES=(
     hysteria-server.service
     hysteria-auth.service
     hysteria-scheduler.service
+    hysteria-traffic-collector.service
     hysteria-telegram-bot.service
     hysteria-normal-sub.service
     hysteria-caddy-normalsub.service
@@ -280,6 +291,7 @@ success "Среда Python готова."
 
 # ========== Миграция данных ==========
 migrate_json_to_mongo
+run_db_migrations
 
 # ========== Сервисы Systemd ==========
 info "Обеспечение конфигурации сервисов systemd..."
@@ -295,6 +307,12 @@ if source "$HYSTERIA_INSTALL_DIR/core/scripts/scheduler.sh"; then
     else
         success "Сервис планировщика уже настроен."
     fi
+
+    if ! check_traffic_collector_service; then
+        setup_hysteria_traffic_collector && success "Сервис сборщика трафика настроен." || warn "Настройка сборщика трафика не удалась."
+    else
+        success "Сервис сборщика трафика уже настроен."
+    fi
 else
     warn "Не удалось загрузить scheduler.sh, продолжаем без настройки сервисов..."
 fi